@@ -3,16 +3,24 @@ import importlib.metadata
 import logging
 import os
 import sys
+import tempfile
 from datetime import datetime, timedelta, timezone
 
 import azure.functions as func
 from dotenv import load_dotenv
+from lna_aggregators.response_cache import SqliteCache
 from lna_aggregators.time_based_aggregator import TimeBasedAggregator
 
 app = func.FunctionApp()
 
 is_local = os.environ.get("AZURE_FUNCTIONS_ENVIRONMENT") == "Development"
 
+# kept across timer runs on the instance, so reruns do not call Gemini again
+response_cache = SqliteCache(
+    os.environ.get("summary_cache_path")
+    or os.path.join(tempfile.gettempdir(), "lna_llm_responses.sqlite3")
+)
+
 
 @app.timer_trigger(
     schedule="0 */30 * * * *",
@@ -35,6 +43,7 @@ async def story_aggregator_function(myTimer: func.TimerRequest) -> None:
         database_username=str(os.environ.get("username_of_db")),
         database_password=str(os.environ.get("password_of_db")),
         mongo_uri_part2=str(os.environ.get("mongo_uri_part2")),
+        cache=response_cache,
     )
 
     end_time = datetime.now(timezone.utc)
@@ -44,6 +53,11 @@ async def story_aggregator_function(myTimer: func.TimerRequest) -> None:
         end_time=end_time,
     )
 
+    logging.info(
+        f"LLM response cache: {response_cache.hits} hits, "
+        f"{response_cache.misses} misses"
+    )
+
     execution_end_time = datetime.now(timezone.utc)
     duration_ms = (execution_end_time - execution_start_time).total_seconds() * 1000
     logging.info(
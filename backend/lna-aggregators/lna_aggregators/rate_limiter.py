@@ -0,0 +1,38 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Rate limiter shared by concurrent callers. The bucket holds up to
+    `capacity` tokens and refills at `rate` tokens per second; every call
+    takes its tokens, waiting in turn while the bucket is empty.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def per_minute(cls, requests: float, burst: float | None = None) -> "TokenBucket":
+        """A bucket allowing `requests` per minute, `burst` of them at once."""
+        return cls(rate=requests / 60, capacity=burst or max(requests / 10, 1))
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1) -> None:
+        # the lock is held while waiting, so callers are served in arrival order
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import timedelta
+from pathlib import Path
+
+from google.genai import types
+
+
+def cache_key(
+    model: str, contents: list[str], config: types.GenerateContentConfig
+) -> str:
+    """Hash of everything that decides the response: model, config and contents."""
+    request = {
+        "model": model,
+        # the system instruction is part of the config
+        "config": config.model_dump(mode="json", exclude_none=True),
+        "contents": contents,
+    }
+    payload = json.dumps(request, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseCache(ABC):
+    """
+    Responses of the LLM by request hash. Entries expire `ttl` after they were
+    stored, and the least recently used ones are evicted past `max_entries`.
+    """
+
+    def __init__(self, max_entries: int, ttl: timedelta) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> str | None:
+        value = self._get(key, time.time())
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self._set(key, value, time.time())
+
+    @abstractmethod
+    def _get(self, key: str, now: float) -> str | None: ...
+
+    @abstractmethod
+    def _set(self, key: str, value: str, now: float) -> None: ...
+
+
+class MemoryCache(ResponseCache):
+    """LRU cache kept in the memory of the process."""
+
+    def __init__(
+        self, max_entries: int = 1024, ttl: timedelta = timedelta(days=7)
+    ) -> None:
+        super().__init__(max_entries, ttl)
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    def _get(self, key: str, now: float) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if now - stored_at > self.ttl.total_seconds():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _set(self, key: str, value: str, now: float) -> None:
+        self._entries[key] = (now, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class SqliteCache(ResponseCache):
+    """LRU cache in a local SQLite file, kept across runs of the process."""
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_entries: int = 10_000,
+        ttl: timedelta = timedelta(days=7),
+    ) -> None:
+        super().__init__(max_entries, ttl)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                used_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at);
+            """
+        )
+
+    def _get(self, key: str, now: float) -> str | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM responses WHERE key = ? AND stored_at >= ?",
+                (key, now - self.ttl.total_seconds()),
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE responses SET used_at = ? WHERE key = ?", (now, key)
+            )
+            return row[0]
+
+    def _set(self, key: str, value: str, now: float) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            # expired entries go first, then the least recently used
+            self._db.execute(
+                "DELETE FROM responses WHERE stored_at < ?",
+                (now - self.ttl.total_seconds(),),
+            )
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+                "ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def close(self) -> None:
+        self._db.close()
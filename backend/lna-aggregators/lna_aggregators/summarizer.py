@@ -9,14 +9,93 @@ from google.api_core import exceptions
 from google.genai import types
 from google.genai.client import AsyncClient
 
+from lna_aggregators.rate_limiter import TokenBucket
+from lna_aggregators.response_cache import ResponseCache, cache_key
+
+# requests per minute allowed for gemini-2.0-flash on the free tier
+GEMINI_REQUESTS_PER_MINUTE = 15
+
+# tokens of articles sent in one summary prompt
+CHUNK_TOKENS = 8000
+
+
+def estimate_tokens(text: str) -> int:
+    # Gemini averages about four bytes of English text or two Arabic letters
+    # per token, a UTF-8 byte count over four errs on the long side for both
+    return len(text.encode()) // 4 + 1
+
+
+def _split_text(text: str, max_tokens: int) -> list[str]:
+    """Split `text` on whitespace into pieces of at most `max_tokens`."""
+    # the newline and the rounding of estimate_tokens take up one token
+    max_bytes = (max_tokens - 1) * 4
+    # words longer than a piece are cut, a character is four bytes at most
+    words_in_text = [
+        word[i : i + max_bytes // 4]
+        for word in text.split()
+        for i in range(0, len(word), max_bytes // 4)
+    ]
+    pieces: list[str] = []
+    words: list[str] = []
+    size = 0
+    for word in words_in_text:
+        cost = len(word.encode()) + 1
+        if words and size + cost > max_bytes:
+            pieces.append(" ".join(words) + "\n")
+            words, size = [], 0
+        words.append(word)
+        size += cost
+    if words:
+        pieces.append(" ".join(words) + "\n")
+    return pieces
+
+
+def chunk_texts(texts: list[str], max_tokens: int) -> list[str]:
+    """
+    Pack `texts` in order into chunks of at most `max_tokens`, splitting the
+    texts that do not fit in one chunk on their own.
+    """
+    chunks: list[str] = []
+    current: list[str] = []
+    size = 0
+    for text in texts:
+        pieces = (
+            [text]
+            if estimate_tokens(text) <= max_tokens
+            else _split_text(text, max_tokens)
+        )
+        for piece in pieces:
+            tokens = estimate_tokens(piece)
+            if current and size + tokens > max_tokens:
+                chunks.append("".join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += tokens
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
 
 class Summarizer:
-    def __init__(self, gemeni_client: AsyncClient | None = None):
+    def __init__(
+        self,
+        gemeni_client: AsyncClient | None = None,
+        rate_limiter: TokenBucket | None = None,
+        cache: ResponseCache | None = None,
+        chunk_tokens: int = CHUNK_TOKENS,
+    ):
         if gemeni_client is None:
             load_dotenv()
             gemeni_key = str(os.environ.get("gemeni_key"))
             gemeni_client = genai.Client(api_key=gemeni_key).aio
         self.gemeni_client: AsyncClient = gemeni_client
+        # shared by every concurrent call, retries included, to stay in the quota
+        self.rate_limiter = rate_limiter or TokenBucket.per_minute(
+            GEMINI_REQUESTS_PER_MINUTE
+        )
+        # identical requests, e.g. a rerun after a crash, are answered from here
+        self.cache = cache
+        self.chunk_tokens = chunk_tokens
         self.max_retries = 5
         self.initial_delay = 2  # seconds
         self.max_delay = 64  # seconds
@@ -29,16 +108,26 @@ class Summarizer:
         operation_name: str,
     ) -> str:
         """Make an API call with exponential backoff retry logic."""
+        if self.cache is not None:
+            key = cache_key(model, contents, config)
+            cached = self.cache.get(key)
+            if cached is not None:
+                logging.info(f"{operation_name} answered from the cache")
+                return cached
+
         delay = self.initial_delay
         last_exception: Optional[Exception] = None
 
         for attempt in range(self.max_retries):
             try:
+                await self.rate_limiter.acquire()
                 response = await self.gemeni_client.models.generate_content(
                     model=model,
                     contents=contents,
                     config=config,
                 )
+                if self.cache is not None and response.text:
+                    self.cache.set(key, response.text)
                 return response.text
 
             except exceptions.ResourceExhausted as e:
@@ -125,6 +214,63 @@ class Summarizer:
 
         return response_text
 
+    async def summarize_articles(
+        self,
+        previous_summary: str,
+        articles: list[str],
+        output_language: str = "arabic",
+    ) -> str:
+        """
+        Summary of `articles` on top of `previous_summary`, with no prompt over
+        `chunk_tokens`. Articles that do not fit in one prompt are split into
+        chunks summarized concurrently, and the partial summaries are reduced
+        the same way, level by level, until they fit in the final prompt.
+        Raises ValueError when the partial summaries cannot be made to fit.
+        """
+        budget = self.chunk_tokens - estimate_tokens(previous_summary)
+        if budget <= 0:
+            raise ValueError(
+                f"a previous summary of {estimate_tokens(previous_summary)} tokens "
+                f"leaves no room for articles in {self.chunk_tokens} tokens"
+            )
+        texts = articles
+        level = 0
+        while True:
+            if sum(estimate_tokens(text) for text in texts) <= budget:
+                return await self.generate_summary(
+                    previous_summary=previous_summary,
+                    new_articles_content="".join(texts),
+                    output_language=output_language,
+                )
+            if level > 0 and len(texts) == 1:
+                # summarizing a single summary again need not make it shorter
+                raise ValueError(
+                    f"a summary of {estimate_tokens(texts[0])} tokens does not fit "
+                    f"in the {budget} tokens left by the previous summary"
+                )
+
+            chunks = chunk_texts(texts, self.chunk_tokens)
+            if level > 0 and len(chunks) >= len(texts):
+                # partial summaries too long to share a chunk, merge them by two
+                # so that every level still halves their number
+                chunks = ["".join(texts[i : i + 2]) for i in range(0, len(texts), 2)]
+            logging.info(
+                f"summarizing {len(texts)} texts in {len(chunks)} chunks "
+                f"(level {level})"
+            )
+            partials = await asyncio.gather(
+                *(
+                    self.generate_summary(
+                        previous_summary="",
+                        new_articles_content=chunk,
+                        output_language=output_language,
+                    )
+                    for chunk in chunks
+                )
+            )
+            texts = [f"[partial summary]\n{partial}\n" for partial in partials]
+            level += 1
+
     async def generate_title(
         self,
         summary: str,
@@ -1,14 +1,52 @@
+import asyncio
 import logging
 from datetime import datetime, timedelta, timezone
 
+from beanie.odm.utils.encoder import Encoder
 from beanie.operators import In
 from lna_db.core.types import Language, UUIDstr
 from lna_db.db.mongo import init_database
-from lna_db.models.news import AggregatedStory, Article
+from lna_db.models.news import AggregatedStory, AggregatorState, Article
+from pydantic import BaseModel
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 
 from lna_aggregators.aggregator import AbstractAggregator
+from lna_aggregators.rate_limiter import TokenBucket
+from lna_aggregators.response_cache import ResponseCache
 from lna_aggregators.summarizer import Summarizer
 
+# articles being written while a run reads may be stored with an earlier
+# created_at than the newest one it saw, so each run reads back this far
+# before the watermark; the articles stories already have are then skipped
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+DUPLICATE_KEY = 11000
+
+# times a run summarizes a window again after another run changed its story
+STORY_WRITE_ATTEMPTS = 3
+
+# fields a run sets on the stories it updates, the others are only written
+# when the story is created
+UPDATED_FIELDS = ("title", "summary", "updated_at")
+INSERT_SKIPPED_FIELDS = {
+    "_id",
+    "aggregator",
+    "aggregation_key",
+    "article_ids",
+    "source_ids",
+    *UPDATED_FIELDS,
+}
+
+
+class StoryWriteResult(BaseModel):
+    """Counts of a bulk write of stories."""
+
+    upserted: int = 0
+    modified: int = 0
+    # indexes of the updates whose story was changed by another run meanwhile
+    conflicts: list[int] = []
+
 
 class TimeBasedAggregator(AbstractAggregator):
     """
@@ -17,12 +55,22 @@ class TimeBasedAggregator(AbstractAggregator):
     """
 
     def __init__(
-        self, database_username: str, database_password: str, mongo_uri_part2: str
+        self,
+        database_username: str,
+        database_password: str,
+        mongo_uri_part2: str,
+        max_concurrency: int = 8,
+        rate_limiter: TokenBucket | None = None,
+        cache: ResponseCache | None = None,
     ) -> None:
         self.aggregator = TimeBasedAggregator.__name__
         self.database_username = database_username
         self.database_password = database_password
         self.mongo_uri_part2 = mongo_uri_part2
+        # windows summarized at once
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = rate_limiter
+        self.cache = cache
 
     async def aggregate_stories(self, start_time: datetime, end_time: datetime) -> None:
         # prepare db
@@ -36,17 +84,38 @@ class TimeBasedAggregator(AbstractAggregator):
             f"started aggregating stories by time, between {start_time} and {end_time}"
         )
 
+        # only the articles stored since the last run can be new to a story
+        state = await AggregatorState.find_one(
+            AggregatorState.aggregator == self.aggregator
+        ) or AggregatorState(aggregator=self.aggregator)
+        filters = [
+            # near-duplicates of another article would only repeat it in the prompts
+            Article.duplicate_of == None,  # noqa: E711
+        ]
+        if state.watermark is not None:
+            filters.append(Article.created_at > state.watermark - WATERMARK_OVERLAP)
         articles_in_range = await Article.find(
-            Article.publish_date >= start_time, Article.publish_date <= end_time
+            Article.publish_date >= start_time,
+            Article.publish_date <= end_time,
+            *filters,
         ).to_list()
-
-        article_id_to_article = {article.uuid: article for article in articles_in_range}
+        # articles dated after the range, like the mtv ones whose dates read
+        # hours ahead, come into the range of a later run, which must still
+        # read them; those dated before it never will
+        first_ahead = (
+            await Article.find(Article.publish_date > end_time, *filters)
+            .sort(+Article.created_at)
+            .first_or_none()
+        )
 
         logging.info(
-            f"found {len(articles_in_range)} articles. {start_time=}, {end_time=}"
+            f"found {len(articles_in_range)} articles stored after {state.watermark}. "
+            f"{start_time=}, {end_time=}"
         )
 
-        summarizer = Summarizer()
+        article_id_to_article = {article.uuid: article for article in articles_in_range}
+
+        summarizer = Summarizer(rate_limiter=self.rate_limiter, cache=self.cache)
 
         # for each article find the key which it is associated with
         agg_keys_to_articles_to_add: dict[str, list[UUIDstr]] = {}
@@ -64,53 +133,203 @@ class TimeBasedAggregator(AbstractAggregator):
             story.aggregation_key: story for story in existing_stories
         }
 
-        for key, article_ids in agg_keys_to_articles_to_add.items():
-            # get the corresponding story
-            story = agg_keys_to_stories.setdefault(
-                key,
-                AggregatedStory(
-                    title=f"news for range {key}",
-                    summary=f"placeholder summary for range {key}",
-                    language=Language.UNKNOWN,
-                    publish_date=datetime.now(timezone.utc),
-                    aggregator=self.aggregator,
-                    article_ids=[],
-                    source_ids=[],
-                    aggregation_key=key,
-                ),
+        # the summarizer is only fed the articles a story does not have yet,
+        # windows with none are left alone
+        windows = len(agg_keys_to_articles_to_add)
+        for key, story in agg_keys_to_stories.items():
+            aggregated = set(story.article_ids)
+            agg_keys_to_articles_to_add[key] = [
+                article_id
+                for article_id in agg_keys_to_articles_to_add[key]
+                if article_id not in aggregated
+            ]
+        agg_keys_to_articles_to_add = {
+            key: article_ids
+            for key, article_ids in agg_keys_to_articles_to_add.items()
+            if article_ids
+        }
+
+        # windows are summarized concurrently, the summarizer's rate limiter
+        # keeps the calls of all of them within the Gemini quota
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def update(key: str, article_ids: list[UUIDstr]) -> UpdateOne:
+            async with semaphore:
+                story = agg_keys_to_stories.get(key) or self._new_story(key)
+                return await self._update_story(
+                    story,
+                    [article_id_to_article[article_id] for article_id in article_ids],
+                    summarizer,
+                )
+
+        written = StoryWriteResult()
+        failed_keys: list[str] = []
+        pending = agg_keys_to_articles_to_add
+        for _ in range(STORY_WRITE_ATTEMPTS):
+            keys = list(pending)
+            results = await asyncio.gather(
+                *(update(key, pending[key]) for key in keys),
+                return_exceptions=True,
             )
+            updates: dict[str, UpdateOne] = {}
+            for key, result in zip(keys, results, strict=True):
+                if isinstance(result, BaseException):
+                    failed_keys.append(key)
+                    logging.error(f"failed to aggregate the stories of {key}: {result}")
+                else:
+                    updates[key] = result
 
-            # add the article ids with no repetition
-            story.article_ids.extend(article_ids)
-            story.article_ids = list(set(story.article_ids))
+            saved = await self._save_stories(list(updates.values()))
+            written.upserted += saved.upserted
+            written.modified += saved.modified
+            conflicts = [list(updates)[index] for index in saved.conflicts]
+            if not conflicts:
+                pending = {}
+                break
 
-            # add source ids with no repetition
-            story.source_ids.extend(
-                [
-                    article_id_to_article[article_id].source_id
-                    for article_id in article_ids
+            # another run wrote these stories after they were read, their
+            # summaries are made again from what it wrote and the articles it
+            # did not add
+            logging.info(f"{len(conflicts)} stories were changed by another run")
+            for story in await AggregatedStory.find(
+                AggregatedStory.aggregator == self.aggregator,
+                In(AggregatedStory.aggregation_key, conflicts),
+            ).to_list():
+                agg_keys_to_stories[story.aggregation_key] = story
+            pending = {}
+            for key in conflicts:
+                aggregated = set(agg_keys_to_stories[key].article_ids)
+                article_ids = [
+                    article_id
+                    for article_id in agg_keys_to_articles_to_add[key]
+                    if article_id not in aggregated
                 ]
+                if article_ids:
+                    pending[key] = article_ids
+        for key in pending:
+            failed_keys.append(key)
+            logging.error(f"the story of {key} kept being changed by other runs")
+
+        # a failed window is left as it was and retried on the next run, so the
+        # watermark stops before the first article it did not aggregate
+        watermark = max(
+            (article.created_at for article in articles_in_range),
+            default=state.watermark,
+        )
+        if first_ahead is not None and (
+            watermark is None or first_ahead.created_at < watermark
+        ):
+            watermark = first_ahead.created_at
+        for key in failed_keys:
+            watermark = min(
+                watermark,
+                *(
+                    article_id_to_article[article_id].created_at
+                    for article_id in agg_keys_to_articles_to_add[key]
+                ),
             )
-            story.source_ids = list(set(story.source_ids))
-
-            # generate summary
-            previous_summary = story.summary
-            new_articles_content = ""
-            for article_id in article_ids:
-                article = article_id_to_article[article_id]
-                title = article.title
-                content = article.content
-                new_articles_content += f"[title]\n{title}\n\n[content]\n{content}\n"
-
-            story.summary = await summarizer.generate_summary(
-                previous_summary=previous_summary,
-                new_articles_content=new_articles_content,
-            )
+        aggregated = len(agg_keys_to_articles_to_add)
+        logging.info(
+            f"aggregated {aggregated - len(failed_keys)} windows, "
+            f"{len(failed_keys)} failed, {windows - aggregated} had no new articles. "
+            f"{start_time=}, {end_time=}"
+        )
+        logging.info(
+            f"saved the stories: {written.upserted} created, {written.modified} updated"
+        )
 
-            story.title = await summarizer.generate_title(summary=story.summary)
+        if watermark != state.watermark:
+            state.watermark = watermark
+            await state.save()
 
-            # save (beanie does not support bulk upsert)
-            await story.save()
+    def _new_story(self, key: str) -> AggregatedStory:
+        return AggregatedStory(
+            title=f"news for range {key}",
+            summary=f"placeholder summary for range {key}",
+            language=Language.UNKNOWN,
+            publish_date=datetime.now(timezone.utc),
+            aggregator=self.aggregator,
+            article_ids=[],
+            source_ids=[],
+            aggregation_key=key,
+        )
+
+    async def _update_story(
+        self, story: AggregatedStory, articles: list[Article], summarizer: Summarizer
+    ) -> UpdateOne:
+        # generate summary, in as many calls as the articles need
+        summary = await summarizer.summarize_articles(
+            previous_summary=story.summary,
+            articles=[
+                f"[title]\n{article.title}\n\n[content]\n{article.content}\n"
+                for article in articles
+            ],
+        )
+        title = await summarizer.generate_title(summary=summary)
+
+        # the story only changes once both calls succeeded
+        summarized_at = story.updated_at
+        story.summary = summary
+        story.title = title
+        story.updated_at = datetime.now(timezone.utc)
+
+        # upsert on the window, as long as the story is still the one the
+        # summary was made from: when another run created or updated it
+        # meanwhile, the upsert inserts a second story for the window instead,
+        # which the unique window index rejects as a conflict
+        document = Encoder().encode(story)
+        return UpdateOne(
+            {
+                "aggregator": story.aggregator,
+                "aggregation_key": story.aggregation_key,
+                "updated_at": Encoder().encode(summarized_at),
+            },
+            {
+                "$set": {field: document[field] for field in UPDATED_FIELDS},
+                "$addToSet": {
+                    "article_ids": {
+                        "$each": Encoder().encode(
+                            [article.uuid for article in articles]
+                        )
+                    },
+                    "source_ids": {
+                        "$each": Encoder().encode(
+                            list({article.source_id for article in articles})
+                        )
+                    },
+                },
+                "$setOnInsert": {
+                    field: value
+                    for field, value in document.items()
+                    if field not in INSERT_SKIPPED_FIELDS
+                },
+            },
+            upsert=True,
+        )
+
+    async def _save_stories(self, updates: list[UpdateOne]) -> StoryWriteResult:
+        """
+        Write the story upserts in one unordered bulk write. The updates of the
+        stories another run wrote meanwhile fail on the unique window index and
+        are returned as conflicts, the others are written.
+        """
+        if not updates:
+            return StoryWriteResult()
+        collection = AggregatedStory.get_motor_collection()
+        try:
+            written = await collection.bulk_write(updates, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details["writeErrors"]
+            if any(error["code"] != DUPLICATE_KEY for error in errors):
+                raise
+            return StoryWriteResult(
+                upserted=e.details["nUpserted"],
+                modified=e.details["nModified"],
+                conflicts=[error["index"] for error in errors],
+            )
+        return StoryWriteResult(
+            upserted=written.upserted_count, modified=written.modified_count
+        )
 
     def _get_aggregation_key(self, time: datetime) -> str:
         return self._get_aggregation_key_and_next_hour(time)[0]
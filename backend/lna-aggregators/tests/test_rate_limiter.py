@@ -0,0 +1,32 @@
+import asyncio
+import time
+import unittest
+
+from lna_aggregators.rate_limiter import TokenBucket
+
+
+class TestTokenBucket(unittest.IsolatedAsyncioTestCase):
+    """Test the token bucket shared by concurrent Gemini calls."""
+
+    async def test_burst_then_paced(self) -> None:
+        """A full bucket serves a burst at once, then one call per refill."""
+        bucket = TokenBucket(rate=50, capacity=3)
+        started = time.monotonic()
+        times: list[float] = []
+
+        async def call() -> None:
+            await bucket.acquire()
+            times.append(time.monotonic() - started)
+
+        await asyncio.gather(*(call() for _ in range(6)))
+        self.assertTrue(all(t < 0.015 for t in times[:3]))
+        # the next three wait 20 ms each for a token
+        self.assertGreaterEqual(times[-1], 0.055)
+        self.assertLess(times[-1], 0.2)
+
+    def test_per_minute(self) -> None:
+        """Quotas are given in requests per minute."""
+        bucket = TokenBucket.per_minute(15)
+        self.assertEqual(bucket.rate, 0.25)
+        self.assertEqual(bucket.capacity, 1.5)
+        self.assertEqual(TokenBucket.per_minute(60, burst=5).capacity, 5)
@@ -0,0 +1,97 @@
+import tempfile
+import unittest
+from datetime import timedelta
+from pathlib import Path
+from unittest.mock import patch
+
+from google.genai import types
+from lna_aggregators.response_cache import (
+    MemoryCache,
+    SqliteCache,
+    cache_key,
+)
+
+
+class CacheTests:
+    """Tests shared by every cache backend."""
+
+    def make_cache(self, max_entries: int = 2, ttl: timedelta = timedelta(hours=1)):
+        raise NotImplementedError
+
+    def test_hits_and_misses(self) -> None:
+        cache = self.make_cache()
+        self.assertIsNone(cache.get("a"))
+        cache.set("a", "summary")
+        self.assertEqual(cache.get("a"), "summary")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_least_recently_used_is_evicted(self) -> None:
+        cache = self.make_cache(max_entries=2)
+        with patch("lna_aggregators.response_cache.time.time", side_effect=range(10)):
+            cache.set("a", "1")
+            cache.set("b", "2")
+            cache.get("a")
+            cache.set("c", "3")
+            self.assertEqual(cache.get("a"), "1")
+            self.assertIsNone(cache.get("b"))
+            self.assertEqual(cache.get("c"), "3")
+
+    def test_entries_expire(self) -> None:
+        cache = self.make_cache(ttl=timedelta(seconds=60))
+        with patch("lna_aggregators.response_cache.time.time", return_value=1000):
+            cache.set("a", "1")
+        with patch("lna_aggregators.response_cache.time.time", return_value=1059):
+            self.assertEqual(cache.get("a"), "1")
+        with patch("lna_aggregators.response_cache.time.time", return_value=1061):
+            self.assertIsNone(cache.get("a"))
+
+
+class TestMemoryCache(CacheTests, unittest.TestCase):
+    """Test the in-memory LRU cache."""
+
+    def make_cache(self, max_entries: int = 2, ttl: timedelta = timedelta(hours=1)):
+        return MemoryCache(max_entries=max_entries, ttl=ttl)
+
+
+class TestSqliteCache(CacheTests, unittest.TestCase):
+    """Test the SQLite cache."""
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name) / "responses.sqlite3"
+        self.caches: list[SqliteCache] = []
+
+    def tearDown(self) -> None:
+        for cache in self.caches:
+            cache.close()
+        self.directory.cleanup()
+
+    def make_cache(self, max_entries: int = 2, ttl: timedelta = timedelta(hours=1)):
+        cache = SqliteCache(self.path, max_entries=max_entries, ttl=ttl)
+        self.caches.append(cache)
+        return cache
+
+    def test_kept_across_processes(self) -> None:
+        """A new cache on the same file answers what the previous one stored."""
+        self.make_cache().set("a", "summary")
+        self.assertEqual(self.make_cache().get("a"), "summary")
+
+
+class TestCacheKey(unittest.TestCase):
+    """Test the hash of the requests."""
+
+    def test_key_covers_the_request(self) -> None:
+        config = types.GenerateContentConfig(
+            system_instruction="summarize in arabic", max_output_tokens=1000
+        )
+        key = cache_key("gemini-2.0-flash", ["content"], config)
+        self.assertEqual(key, cache_key("gemini-2.0-flash", ["content"], config))
+
+        other_config = types.GenerateContentConfig(
+            system_instruction="summarize in english", max_output_tokens=1000
+        )
+        self.assertNotEqual(
+            key, cache_key("gemini-2.0-flash", ["content"], other_config)
+        )
+        self.assertNotEqual(key, cache_key("gemini-2.5-flash", ["content"], config))
+        self.assertNotEqual(key, cache_key("gemini-2.0-flash", ["other"], config))
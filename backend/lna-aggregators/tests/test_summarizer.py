@@ -1,8 +1,15 @@
+import asyncio
 import unittest
 from unittest.mock import AsyncMock, MagicMock, patch
 
 from google.genai.types import GenerateContentResponse
-from lna_aggregators.summarizer import Summarizer
+from lna_aggregators.rate_limiter import TokenBucket
+from lna_aggregators.response_cache import MemoryCache
+from lna_aggregators.summarizer import (
+    Summarizer,
+    chunk_texts,
+    estimate_tokens,
+)
 
 
 class TestSummarizer(unittest.IsolatedAsyncioTestCase):
@@ -93,3 +100,128 @@ class TestSummarizer(unittest.IsolatedAsyncioTestCase):
         # Assert
         self.assertEqual(result, "This is a test summary")
         self.mock_client_instance.models.generate_content.assert_called_once()
+
+    async def test_calls_take_from_rate_limiter(self) -> None:
+        """Every Gemini call waits for a token of the shared rate limiter."""
+        rate_limiter = MagicMock(acquire=AsyncMock())
+        summarizer = Summarizer(
+            gemeni_client=self.mock_client_instance, rate_limiter=rate_limiter
+        )
+
+        summary = await summarizer.generate_summary(
+            previous_summary="", new_articles_content="content"
+        )
+        await summarizer.generate_title(summary=summary)
+
+        self.assertEqual(rate_limiter.acquire.await_count, 2)
+
+    async def test_repeated_calls_answered_from_cache(self) -> None:
+        """Identical requests call Gemini once, the repeats hit the cache."""
+        cache = MemoryCache()
+        summarizer = Summarizer(
+            gemeni_client=self.mock_client_instance,
+            rate_limiter=TokenBucket(rate=100, capacity=10),
+            cache=cache,
+        )
+
+        for _ in range(3):
+            result = await summarizer.generate_summary(
+                previous_summary="", new_articles_content="content"
+            )
+            self.assertEqual(result, "This is a test summary")
+        await summarizer.generate_title(summary="This is a test summary")
+
+        self.assertEqual(
+            self.mock_client_instance.models.generate_content.call_count, 2
+        )
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+
+class TestMapReduce(unittest.IsolatedAsyncioTestCase):
+    """Test the summaries of articles that do not fit in one prompt."""
+
+    async def asyncSetUp(self) -> None:
+        self.prompts: list[str] = []
+        self.running = 0
+        self.max_running = 0
+
+        async def generate_content(
+            model: str, contents: list[str], config: object
+        ) -> MagicMock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            self.prompts.append(contents[0])
+            await asyncio.sleep(0.01)
+            self.running -= 1
+            return MagicMock(text=f"summary {len(self.prompts)}")
+
+        client = MagicMock()
+        client.models.generate_content = generate_content
+        self.summarizer = Summarizer(
+            gemeni_client=client,
+            rate_limiter=TokenBucket(rate=1000, capacity=100),
+            chunk_tokens=100,
+        )
+
+    def test_chunk_texts(self) -> None:
+        """Texts are packed in order, the ones too long on their own are split."""
+        texts = ["a" * 160, "b" * 160, "c" * 1000, "d" * 40]
+        chunks = chunk_texts(texts, max_tokens=100)
+        self.assertEqual("".join("".join(chunks).split()), "".join(texts))
+        self.assertTrue(all(estimate_tokens(chunk) <= 100 for chunk in chunks))
+        self.assertEqual(chunks[0], "a" * 160 + "b" * 160)
+
+        words = " ".join(["word"] * 200)
+        chunks = chunk_texts([words], max_tokens=100)
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(" ".join(chunks).split(), words.split())
+
+    async def test_articles_within_budget_take_one_call(self) -> None:
+        """Articles that fit in a prompt are summarized with the summary so far."""
+        summary = await self.summarizer.summarize_articles(
+            previous_summary="so far", articles=["[title]\nnews\n"] * 3
+        )
+        self.assertEqual(summary, "summary 1")
+        self.assertEqual(len(self.prompts), 1)
+        self.assertIn("so far", self.prompts[0])
+        self.assertEqual(self.prompts[0].count("[title]"), 3)
+
+    async def test_articles_over_budget_are_mapped_and_reduced(self) -> None:
+        """Chunks are summarized concurrently, then their summaries together."""
+        articles = [f"[title]\nnews {n}\n{'x' * 150}\n" for n in range(20)]
+        summary = await self.summarizer.summarize_articles(
+            previous_summary="so far", articles=articles
+        )
+
+        # ten chunks of two articles each, then the final prompt
+        self.assertEqual(len(self.prompts), 11)
+        self.assertGreater(self.max_running, 1)
+        self.assertEqual(summary, "summary 11")
+        for prompt in self.prompts[:-1]:
+            self.assertNotIn("so far", prompt)
+        self.assertIn("so far", self.prompts[-1])
+        self.assertEqual(self.prompts[-1].count("[partial summary]"), 10)
+        # every article made it into a prompt
+        for n in range(20):
+            self.assertTrue(any(f"news {n}\n" in prompt for prompt in self.prompts))
+
+    async def test_partial_summaries_are_reduced_by_levels(self) -> None:
+        """Partial summaries over the budget are reduced again."""
+        self.summarizer.chunk_tokens = 60
+        articles = [f"[title]\nnews {n}\n{'x' * 200}\n" for n in range(40)]
+        await self.summarizer.summarize_articles(previous_summary="", articles=articles)
+        final = self.prompts[-1]
+        self.assertLess(final.count("[partial summary]"), 40)
+        self.assertGreater(len(self.prompts), 41)
+
+    async def test_previous_summary_over_budget_is_rejected(self) -> None:
+        """A summary leaving no room for articles fails instead of looping."""
+        for previous_summary, articles in (
+            ("x" * 400, ["[title]\nnews\n"]),
+            # the partial summaries never fit next to the previous summary
+            ("x" * 390, [f"[title]\nnews {n}\n{'x' * 150}\n" for n in range(4)]),
+        ):
+            with self.assertRaises(ValueError):
+                await self.summarizer.summarize_articles(
+                    previous_summary=previous_summary, articles=articles
+                )
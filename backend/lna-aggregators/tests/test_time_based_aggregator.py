@@ -1,8 +1,21 @@
+import asyncio
+import time
 import unittest
-from datetime import datetime, timezone
+import uuid
+from datetime import datetime, timedelta, timezone
 from unittest.mock import AsyncMock, MagicMock, patch
 
-from lna_aggregators.time_based_aggregator import TimeBasedAggregator
+from lna_aggregators.time_based_aggregator import (
+    StoryWriteResult,
+    TimeBasedAggregator,
+)
+from lna_db.db.mock_db import init_test_db, make_article, mongomock_bulk_update
+from lna_db.models.news import AggregatedStory, AggregatorState, Article
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+SOURCE_ID = uuid.UUID(int=1)
+START = datetime(2024, 3, 15, 0, 0, tzinfo=timezone.utc)
 
 
 class TestTimeBasedAggregator(unittest.IsolatedAsyncioTestCase):
@@ -56,13 +69,14 @@ class TestTimeBasedAggregator(unittest.IsolatedAsyncioTestCase):
         mock_publish_date = MagicMock()
         mock_publish_date.__ge__ = MagicMock(return_value=True)
         mock_publish_date.__le__ = MagicMock(return_value=True)
+        mock_publish_date.__gt__ = MagicMock(return_value=True)
 
         # Mock Article class with the publish_date field
         mock_article = MagicMock()
         mock_article.publish_date = mock_publish_date
-        mock_article.find = MagicMock(
-            return_value=MagicMock(to_list=AsyncMock(return_value=[]))
-        )
+        found = MagicMock(to_list=AsyncMock(return_value=[]))
+        found.sort.return_value.first_or_none = AsyncMock(return_value=None)
+        mock_article.find = MagicMock(return_value=found)
 
         # Mock AggregatedStory class
         mock_story = MagicMock()
@@ -70,9 +84,14 @@ class TestTimeBasedAggregator(unittest.IsolatedAsyncioTestCase):
             return_value=MagicMock(to_list=AsyncMock(return_value=[]))
         )
 
+        # Mock AggregatorState class, as on the first run
+        mock_state = MagicMock()
+        mock_state.find_one = AsyncMock(return_value=MagicMock(watermark=None))
+
         with (
             patch("lna_aggregators.time_based_aggregator.Article", mock_article),
             patch("lna_aggregators.time_based_aggregator.AggregatedStory", mock_story),
+            patch("lna_aggregators.time_based_aggregator.AggregatorState", mock_state),
         ):
             # Act
             start_time = datetime(2024, 3, 15, 14, 0, tzinfo=timezone.utc)
@@ -80,6 +99,274 @@ class TestTimeBasedAggregator(unittest.IsolatedAsyncioTestCase):
             await self.aggregator.aggregate_stories(start_time, end_time)
 
             # Assert
-            mock_article.find.assert_called_once()
+            # the articles in the range, and the first one dated after it
+            self.assertEqual(mock_article.find.call_count, 2)
             mock_story.find.assert_called_once()
             self.mock_init_db.assert_called_once()
+
+
+class FakeSummarizer:
+    """Summarizes slowly, failing on the articles titled "fail"."""
+
+    def __init__(self, *args: object, **kwargs: object) -> None:
+        self.running = 0
+        self.max_running = 0
+        self.fail = True
+        self.prompts: list[str] = []
+
+    async def summarize_articles(
+        self, previous_summary: str, articles: list[str]
+    ) -> str:
+        new_articles_content = "".join(articles)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        self.prompts.append(new_articles_content)
+        try:
+            await asyncio.sleep(0.05)
+            if self.fail and "[title]\nfail" in new_articles_content:
+                raise RuntimeError("quota exceeded")
+            return f"summary of {new_articles_content.count('[title]')} articles"
+        finally:
+            self.running -= 1
+
+    async def generate_title(self, summary: str) -> str:
+        return "title"
+
+
+class TestAggregateStories(unittest.IsolatedAsyncioTestCase):
+    """Test aggregate_stories against a mock database."""
+
+    async def asyncSetUp(self) -> None:
+        await init_test_db(Article, AggregatedStory, AggregatorState)
+        patch("lna_aggregators.time_based_aggregator.init_database").start()
+        self.enterContext(mongomock_bulk_update())
+        self.summarizer = FakeSummarizer()
+        patch(
+            "lna_aggregators.time_based_aggregator.Summarizer",
+            return_value=self.summarizer,
+        ).start()
+
+        # two articles in each of 8 hours, the third hour fails to summarize
+        await Article.insert_many(
+            [
+                make_article(
+                    f"https://example.com/{hour}/{n}",
+                    source_id=SOURCE_ID,
+                    title="fail" if hour == 2 else f"news {hour}",
+                    publish_date=START + timedelta(hours=hour, minutes=10 * n),
+                )
+                for hour in range(8)
+                for n in range(2)
+            ]
+        )
+        self.aggregator = TimeBasedAggregator(
+            database_username="test_user",
+            database_password="test_pass",
+            mongo_uri_part2="test_uri",
+            max_concurrency=4,
+        )
+
+    async def asyncTearDown(self) -> None:
+        patch.stopall()
+
+    async def test_windows_run_concurrently(self) -> None:
+        """Up to max_concurrency windows are summarized at once."""
+        started = time.perf_counter()
+        await self.aggregator.aggregate_stories(START, START + timedelta(days=1))
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(self.summarizer.max_running, 4)
+        # two rounds of four windows, not eight windows one after the other
+        self.assertLess(elapsed, 0.3)
+
+    async def test_failed_window_does_not_abort_others(self) -> None:
+        """A window whose summary fails is skipped, the others are saved."""
+        await self.aggregator.aggregate_stories(START, START + timedelta(days=1))
+
+        stories = await AggregatedStory.find_all().to_list()
+        keys = {story.aggregation_key for story in stories}
+        self.assertEqual(len(stories), 7)
+        # mongo hands the publish dates back naive, the keys are built from them
+        failed_key = self.aggregator._get_aggregation_key(
+            START.replace(tzinfo=None) + timedelta(hours=2)
+        )
+        self.assertNotIn(failed_key, keys)
+        for story in stories:
+            self.assertEqual(story.summary, "summary of 2 articles")
+            self.assertEqual(len(story.article_ids), 2)
+            self.assertEqual(story.source_ids, [SOURCE_ID])
+
+    async def test_only_new_articles_are_summarized(self) -> None:
+        """Later runs summarize the new articles of the windows that have any."""
+        end = START + timedelta(days=1)
+        await self.aggregator.aggregate_stories(START, end)
+        self.summarizer.fail = False
+        self.summarizer.prompts.clear()
+
+        # the failed window is retried, the others have nothing new
+        await self.aggregator.aggregate_stories(START, end)
+        self.assertEqual(len(self.summarizer.prompts), 1)
+        self.assertEqual(self.summarizer.prompts[0].count("[title]\nfail"), 2)
+        self.assertEqual(await AggregatedStory.count(), 8)
+
+        self.summarizer.prompts.clear()
+        await self.aggregator.aggregate_stories(START, end)
+        self.assertEqual(self.summarizer.prompts, [])
+
+        await make_article(
+            "https://example.com/late",
+            source_id=SOURCE_ID,
+            title="late news",
+            publish_date=START + timedelta(minutes=50),
+        ).insert()
+        await self.aggregator.aggregate_stories(START, end)
+        self.assertEqual(len(self.summarizer.prompts), 1)
+        self.assertEqual(self.summarizer.prompts[0].count("[title]"), 1)
+        self.assertIn("late news", self.summarizer.prompts[0])
+        key = self.aggregator._get_aggregation_key(START.replace(tzinfo=None))
+        story = await AggregatedStory.find_one(AggregatedStory.aggregation_key == key)
+        self.assertEqual(len(story.article_ids), 3)  # type: ignore
+
+    async def test_watermark_stops_before_failed_window(self) -> None:
+        """The watermark is not moved past articles that failed to aggregate."""
+        failed_at = datetime.now(timezone.utc) - timedelta(hours=1)
+        await Article.find_one(Article.title == "fail").update(
+            {"$set": {"created_at": failed_at}}
+        )
+
+        await self.aggregator.aggregate_stories(START, START + timedelta(days=1))
+        state = await AggregatorState.find_one(
+            AggregatorState.aggregator == self.aggregator.aggregator
+        )
+        self.assertEqual(
+            state.watermark.replace(tzinfo=timezone.utc),  # type: ignore
+            failed_at.replace(microsecond=failed_at.microsecond // 1000 * 1000),
+        )
+
+    async def test_watermark_stops_before_article_dated_ahead(self) -> None:
+        """An article dated after the range is read once the range reaches it."""
+        end = START + timedelta(hours=8)
+        ahead = make_article(
+            "https://example.com/ahead",
+            source_id=SOURCE_ID,
+            title="news ahead",
+            publish_date=end + timedelta(hours=3),
+            created_at=datetime.now(timezone.utc) - timedelta(hours=1),
+        )
+        await ahead.insert()
+        self.summarizer.fail = False
+
+        await self.aggregator.aggregate_stories(START, end)
+        self.summarizer.prompts.clear()
+        await self.aggregator.aggregate_stories(START, end + timedelta(hours=4))
+
+        self.assertEqual(len(self.summarizer.prompts), 1)
+        self.assertIn("news ahead", self.summarizer.prompts[0])
+
+    async def test_stories_are_upserted_in_one_bulk_write(self) -> None:
+        """Stories are written together and read back as beanie documents."""
+        collection = AggregatedStory.get_motor_collection()
+        with patch.object(
+            collection, "bulk_write", wraps=collection.bulk_write
+        ) as bulk_write:
+            await self.aggregator.aggregate_stories(START, START + timedelta(days=1))
+        bulk_write.assert_called_once()
+
+        stories = await AggregatedStory.find_all().to_list()
+        self.assertEqual(len(stories), 7)
+        story = stories[0]
+        self.assertEqual(story.title, "title")
+        self.assertEqual(story.aggregator, "TimeBasedAggregator")
+        self.assertIsInstance(story.uuid, uuid.UUID)
+        self.assertEqual(story.source_ids, [SOURCE_ID])
+        self.assertEqual(
+            {type(article_id) for article_id in story.article_ids}, {uuid.UUID}
+        )
+        self.assertEqual(len({story.uuid for story in stories}), 7)
+
+    async def test_story_extended_by_concurrent_run_keeps_its_articles(self) -> None:
+        """A story written by another run meanwhile is added to, not replaced."""
+        key = self.aggregator._get_aggregation_key(START.replace(tzinfo=None))
+        other_article = uuid.uuid4()
+        generate_title = self.summarizer.generate_title
+
+        async def concurrent_run(summary: str) -> str:
+            if await AggregatedStory.count() == 0:
+                story = self.aggregator._new_story(key)
+                story.article_ids = [other_article]
+                await story.insert()
+            return await generate_title(summary)
+
+        self.summarizer.generate_title = concurrent_run  # type: ignore[method-assign]
+        await self.aggregator.aggregate_stories(START, START + timedelta(days=1))
+
+        stories = await AggregatedStory.find(
+            AggregatedStory.aggregation_key == key
+        ).to_list()
+        self.assertEqual(len(stories), 1)
+        self.assertEqual(len(stories[0].article_ids), 3)
+        self.assertIn(other_article, stories[0].article_ids)
+        self.assertEqual(stories[0].title, "title")
+
+    async def test_story_changed_by_concurrent_run_is_summarized_again(self) -> None:
+        """A summary made from a story another run updated meanwhile is not kept."""
+        end = START + timedelta(days=1)
+        await self.aggregator.aggregate_stories(START, end)
+        key = self.aggregator._get_aggregation_key(START.replace(tzinfo=None))
+        story = await AggregatedStory.find_one(AggregatedStory.aggregation_key == key)
+        other_article = uuid.uuid4()
+        await make_article(
+            "https://example.com/late",
+            source_id=SOURCE_ID,
+            title="late news",
+            publish_date=START + timedelta(minutes=50),
+        ).insert()
+
+        summarize_articles = self.summarizer.summarize_articles
+        previous_summaries = []
+
+        async def concurrent_run(previous_summary: str, articles: list[str]) -> str:
+            if "late news" not in "".join(articles):
+                return await summarize_articles(previous_summary, articles)
+            previous_summaries.append(previous_summary)
+            if len(previous_summaries) == 1:
+                story.summary = "summary of the other run"  # type: ignore
+                story.article_ids.append(other_article)  # type: ignore
+                await story.save()  # type: ignore
+            return await summarize_articles(previous_summary, articles)
+
+        self.summarizer.summarize_articles = concurrent_run  # type: ignore[method-assign]
+        await self.aggregator.aggregate_stories(START, end)
+
+        self.assertEqual(
+            previous_summaries, ["summary of 2 articles", "summary of the other run"]
+        )
+        story = await AggregatedStory.find_one(AggregatedStory.aggregation_key == key)
+        self.assertEqual(story.summary, "summary of 1 articles")  # type: ignore
+        self.assertEqual(len(story.article_ids), 4)  # type: ignore
+        self.assertIn(other_article, story.article_ids)  # type: ignore
+
+    async def test_conflicting_updates_are_returned(self) -> None:
+        """Updates rejected by the unique window index are reported, not raised."""
+        updates = [
+            UpdateOne({"n": n}, {"$set": {"n": n}}, upsert=True) for n in range(3)
+        ]
+        collection = MagicMock()
+        collection.bulk_write = AsyncMock(
+            side_effect=BulkWriteError(
+                {
+                    "nUpserted": 1,
+                    "nModified": 1,
+                    "writeErrors": [{"index": 1, "code": 11000}],
+                }
+            )
+        )
+        with patch.object(
+            AggregatedStory, "get_motor_collection", return_value=collection
+        ):
+            result = await self.aggregator._save_stories(updates)
+
+        self.assertEqual(
+            result, StoryWriteResult(upserted=1, modified=1, conflicts=[1])
+        )
+        collection.bulk_write.assert_awaited_once()
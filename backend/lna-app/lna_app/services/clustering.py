@@ -1,41 +1,25 @@
-import os
-
-import tiktoken
-from dotenv import load_dotenv
-from google import genai
+from lna_aggregators.rate_limiter import TokenBucket
+from lna_aggregators.summarizer import GEMINI_REQUESTS_PER_MINUTE, Summarizer
 from lna_db.models.news import Article
 
-# Approximate token limit for Gemini-2 models
-MAX_TOKENS = 30000
-
-
-def estimate_tokens(text: str) -> int:
-    # Rough estimate using tiktoken (more accurate for OpenAI but decent for Gemini too)
-    enc = tiktoken.get_encoding("cl100k_base")  # most compatible encoding
-    return len(enc.encode(text))
-
-
-def generate_summary(articles: list[Article]) -> str:
-    load_dotenv()
-    llm_api_key = str(os.environ.get("gemeni_key"))
-
-    # Initial system prompt
-    prompt_intro = """
-أنت مساعد ذكي. لديك مجموعة من الأخبار التالية، كل واحدة بعنوانها ومحتواها الكامل.
-يرجى قراءة جميع الأخبار وتوليد ملخص شامل وموجز لها جميعاً باللغة العربية.
-المحتوى:\n\n
-"""
-    prompt_token_budget = MAX_TOKENS - estimate_tokens(prompt_intro)
-
-    contents = ""
-    for article in articles:
-        section = f"Title: {article.title}\nContent: {article.content}\n\n"
-        if estimate_tokens(contents + section) > prompt_token_budget:
-            break
-        contents += section
-
-    client = genai.Client(api_key=llm_api_key)
-    response = client.models.generate_content(
-        model="gemini-2.0-flash", contents=prompt_intro + contents
+# shared by every request to the API, so that concurrent clusterings stay
+# within the Gemini quota together
+_rate_limiter = TokenBucket.per_minute(GEMINI_REQUESTS_PER_MINUTE)
+
+
+async def generate_summary(
+    articles: list[Article], summarizer: Summarizer | None = None
+) -> str:
+    """
+    Arabic summary of `articles`, made by the aggregators' summarizer: articles
+    over one prompt are summarized by chunks and the partial summaries reduced
+    until they fit, every call rate limited and retried.
+    """
+    summarizer = summarizer or Summarizer(rate_limiter=_rate_limiter)
+    sections = [
+        f"Title: {article.title}\nContent: {article.content}\n\n"
+        for article in articles
+    ]
+    return await summarizer.summarize_articles(
+        previous_summary="", articles=sections, output_language="arabic"
     )
-    return response.text or ""
@@ -109,7 +109,7 @@ async def create_aggregated_story(story_data: AggregatedStoryCreate) -> None:
         language=language,
         publish_date=story_data.publish_date,
         article_ids=story_data.article_ids,
-        aggregation_key="",
+        aggregation_key=story_data.aggregation_key,
         aggregator=story_data.aggregator,
     )
     await db_story.insert()
@@ -233,7 +233,7 @@ async def cluster_articles_into_stories_by_date(
         if not db_articles:
             continue
 
-        summary_generated = generate_summary(db_articles)
+        summary_generated = await generate_summary(db_articles)
         ids = [article.uuid for article in db_articles]
 
         story = AggregatedStoryCreate(
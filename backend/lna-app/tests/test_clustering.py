@@ -0,0 +1,64 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from lna_aggregators.rate_limiter import TokenBucket
+from lna_aggregators.summarizer import Summarizer, estimate_tokens
+from lna_app.services.clustering import generate_summary
+from lna_db.db.mock_db import init_test_db, make_article
+from lna_db.models.news import Article
+
+
+class TestGenerateSummary(unittest.IsolatedAsyncioTestCase):
+    """Test the summaries of the articles clustered through the API."""
+
+    async def asyncSetUp(self) -> None:
+        await init_test_db(Article)
+        self.client = MagicMock()
+        self.client.models.generate_content = AsyncMock(
+            return_value=MagicMock(text="ملخص")
+        )
+        self.rate_limiter = TokenBucket(rate=1000, capacity=1000)
+        self.summarizer = Summarizer(
+            gemeni_client=self.client,
+            rate_limiter=self.rate_limiter,
+            chunk_tokens=1000,
+        )
+        self.summarizer.initial_delay = 0
+        self.articles = [
+            make_article(
+                f"https://example.com/{n}", title=f"title {n}", content="خبر " * 300
+            )
+            for n in range(10)
+        ]
+
+    def prompts(self) -> list[str]:
+        return [
+            call.kwargs["contents"][0]
+            for call in self.client.models.generate_content.await_args_list
+        ]
+
+    async def test_articles_over_one_prompt_are_chunked(self) -> None:
+        """Every prompt stays within the budget, the chunks are then reduced."""
+        with patch.object(
+            self.rate_limiter, "acquire", wraps=self.rate_limiter.acquire
+        ) as acquire:
+            summary = await generate_summary(self.articles, self.summarizer)
+
+        self.assertEqual(summary, "ملخص")
+        prompts = self.prompts()
+        self.assertGreater(len(prompts), 2)
+        self.assertIn("[partial summary]", prompts[-1])
+        for prompt in prompts[:-1]:
+            self.assertLessEqual(estimate_tokens(prompt), 1100)
+            self.assertIn("title", prompt)
+        self.assertEqual(acquire.await_count, len(prompts))
+
+    async def test_failed_call_is_retried(self) -> None:
+        self.client.models.generate_content.side_effect = [
+            RuntimeError("unavailable"),
+            MagicMock(text="ملخص"),
+        ]
+        summary = await generate_summary(self.articles[:1], self.summarizer)
+
+        self.assertEqual(summary, "ملخص")
+        self.assertEqual(len(self.prompts()), 2)
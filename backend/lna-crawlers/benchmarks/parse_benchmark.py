@@ -0,0 +1,85 @@
+"""
+Micro-benchmark of the per-page cost of extracting an article.
+
+Compares the previous approach (BeautifulSoup with html.parser over the whole
+page, then `soup.find`) against `lna_crawlers.parsing.extract_article`.
+
+    python benchmarks/parse_benchmark.py [--pages 50] [--paragraphs 40]
+"""
+
+import argparse
+import statistics
+import time
+
+from bs4 import BeautifulSoup
+from lna_crawlers.extractors import extractor_for
+from lna_crawlers.parsing import extract_article
+from lna_db.models.news import Source
+
+CONTENT_KEY = ("div", "LongDesc text-title-9")
+SOURCE = Source.model_construct(
+    name="aljadeed", url="", content_html_key=CONTENT_KEY, extractor=None
+)
+
+
+def build_page(paragraphs: int) -> bytes:
+    # shaped like a real news page: big inline scripts, navigation, then the body
+    script = "<script>var config = {" + "'k': 'v'," * 4000 + "};</script>"
+    nav = "".join(f'<li><a href="/category/{i}">قسم {i}</a></li>' for i in range(300))
+    body = "".join(
+        f"<p>الفقرة رقم {i} من نص الخبر الذي يتحدث عن الأحداث في لبنان.</p>"
+        for i in range(paragraphs)
+    )
+    page = (
+        f"<html><head><meta charset='utf-8'>{script * 10}</head><body>"
+        f"<nav><ul>{nav}</ul></nav>"
+        '<div class="article_details_image_container"><img src="/images/1.jpg"></div>'
+        f'<div class="LongDesc text-title-9">{body}</div>'
+        f"{script * 5}</body></html>"
+    )
+    return page.encode("utf-8")
+
+
+def bs4_extract(content: bytes) -> str | None:
+    soup = BeautifulSoup(content.decode("utf-8"), "html.parser")
+    article_content = soup.find(CONTENT_KEY[0], class_=CONTENT_KEY[1])
+    container = soup.find("div", class_="article_details_image_container")
+    container.find("img") if container else None
+    if article_content is None:
+        return None
+    return article_content.get_text(strip=True, separator="\n")
+
+
+def lxml_extract(content: bytes) -> str | None:
+    return extract_article(content, "utf-8", extractor_for(SOURCE))[0]
+
+
+def time_per_page(fn, page: bytes, pages: int) -> list[float]:
+    timings = []
+    for _ in range(pages):
+        start = time.perf_counter()
+        fn(page)
+        timings.append((time.perf_counter() - start) * 1_000)
+    return timings
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--pages", type=int, default=50)
+    arg_parser.add_argument("--paragraphs", type=int, default=40)
+    args = arg_parser.parse_args()
+
+    page = build_page(args.paragraphs)
+    assert bs4_extract(page) == lxml_extract(page)
+    print(f"page size: {len(page) / 1024:.0f} KB, {args.pages} pages")
+
+    for name, fn in (("bs4 html.parser", bs4_extract), ("lxml xpath", lxml_extract)):
+        timings = time_per_page(fn, page, args.pages)
+        print(
+            f"{name:>16}: median {statistics.median(timings):7.2f} ms/page, "
+            f"max {max(timings):7.2f} ms/page"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Offline replay of a crawler run, end to end through `lna_crawlers.crawler.crawl`.
+
+Every source is served from `benchmarks/fixtures/<source>` by its own local
+HTTP server (one per source, so the scheduler's per-host limits apply as they
+would against the real sites), with injected latency and errors, and the
+database is mongomock. Each run starts from an empty database and reports
+articles/sec, per-article latency, bytes downloaded and database round
+trips, so crawler changes can be compared run to run.
+
+    python benchmarks/replay.py [--runs 3] [--latency 0.05] [--jitter 0.02]
+        [--error-rate 0.05] [--page-kb 200] [--articles 20]
+        [--per-host 2] [--host-interval 0.25]
+
+Fixture layout: `feed.xml` (RSS) or `feed.json` (mtv API) and `article.html`,
+where `{base}` is the server's URL, `{n}` the article number, `{body}` its
+generated paragraphs and `{padding}` inline script bulk.
+"""
+
+import argparse
+import asyncio
+import functools
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+import lna_crawlers.crawler as crawler
+import mongomock_motor
+from beanie import init_beanie
+from lna_crawlers.pipeline import IngestPipeline
+from lna_crawlers.scheduler import CrawlScheduler
+from lna_db.models.news import (
+    AggregatedStory,
+    Article,
+    CrawlLease,
+    FeedState,
+    Source,
+)
+from mongomock_motor import AsyncMongoMockClient
+
+FIXTURES = Path(__file__).parent / "fixtures"
+WORDS = (
+    "لبنان بيروت الحكومة المجلس النيابي الجيش الجنوب الرئيس الوزير الاقتصاد "
+    "المصارف الكهرباء الموازنة الانتخابات البلدية الحدود الأمم المتحدة القرار "
+    "الدولار الليرة الرواتب المحروقات المطار المرفأ الجامعة المستشفى الطريق"
+).split()
+
+
+class ReplayServer:
+    """Serves one source's fixtures on a local port."""
+
+    def __init__(
+        self,
+        source: str,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        page_kb: int = 0,
+        seed: int = 0,
+    ) -> None:
+        directory = FIXTURES / source
+        feed = next(directory.glob("feed.*"))
+        self.feed_type = "application/json" if feed.suffix == ".json" else "text/xml"
+        self.feed = feed.read_text()
+        self.article = (directory / "article.html").read_text()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.padding = "var x = 'padding';" * (page_kb * 1024 // 18)
+        self.random = random.Random(seed)
+        self.requests: Counter[str] = Counter()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    @functools.lru_cache(maxsize=256)
+    def page(self, n: int) -> bytes:
+        words = random.Random(n)
+        body = "\n".join(
+            f"<p>{' '.join(words.choice(WORDS) for _ in range(40))}</p>"
+            for _ in range(8)
+        )
+        return (
+            self.article.replace("{padding}", self.padding)
+            .replace("{body}", body)
+            .replace("{base}", self.base)
+            .replace("{n}", str(n))
+            .encode()
+        )
+
+    def respond(self, path: str) -> tuple[int, str, bytes]:
+        delay = max(self.latency + self.random.uniform(-1, 1) * self.jitter, 0)
+        time.sleep(delay)
+        if path == "/feed":
+            self.requests["feed"] += 1
+            return 200, self.feed_type, self.feed.replace("{base}", self.base).encode()
+        if path.startswith("/news/"):
+            if self.random.random() < self.error_rate:
+                self.requests["error"] += 1
+                return 500, "text/plain", b"injected error"
+            self.requests["page"] += 1
+            n = int(path.rsplit("/", 1)[-1])
+            return 200, "text/html; charset=utf-8", self.page(n)
+        return 404, "text/plain", b"not found"
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        replay = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                status, content_type, body = replay.respond(self.path)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        return Handler
+
+
+def count_round_trips() -> tuple[Counter[str], Any]:
+    """Count the awaited calls made on every mongomock collection."""
+    calls: Counter[str] = Counter()
+    collection = mongomock_motor.AsyncMongoMockCollection
+    patchers = []
+    for name in (
+        "insert_one",
+        "insert_many",
+        "find_one",
+        "distinct",
+        "update_one",
+        "replace_one",
+        "bulk_write",
+        "count_documents",
+    ):
+        original = getattr(collection, name)
+
+        def counted(
+            self: Any,
+            *args: Any,
+            _name: str = name,
+            _fn: Callable = original,
+            **kw: Any,
+        ) -> Any:
+            calls[_name] += 1
+            return _fn(self, *args, **kw)
+
+        patchers.append(patch.object(collection, name, counted))
+
+    # a find() is a round trip once its cursor is iterated
+    original_find = collection.find
+
+    def counted_find(self: Any, *args: Any, **kw: Any) -> Any:
+        calls["find"] += 1
+        return original_find(self, *args, **kw)
+
+    patchers.append(patch.object(collection, "find", counted_find))
+    return calls, patchers
+
+
+async def replay_run(
+    servers: dict[str, ReplayServer], article_count: int, scheduler: CrawlScheduler
+) -> dict[str, Any]:
+    client = AsyncMongoMockClient()
+    await init_beanie(
+        database=client.get_database("replay"),  # type: ignore
+        document_models=[Source, FeedState, CrawlLease, Article, AggregatedStory],
+    )
+    sources = [
+        source.model_copy(update={"url": f"{servers[source.name].base}/feed"})
+        for source in crawler.default_sources().values()
+    ]
+
+    # per-article latency: from submission to the write that stores it
+    latencies: list[float] = []
+    submit = IngestPipeline.submit
+
+    async def timed_submit(
+        self: IngestPipeline, src: Source, article: Article
+    ) -> asyncio.Future[bool]:
+        started = time.perf_counter()
+        done = await submit(self, src, article)
+        done.add_done_callback(
+            lambda _: latencies.append(time.perf_counter() - started)
+        )
+        return done
+
+    calls, patchers = count_round_trips()
+    for patcher in patchers:
+        patcher.start()
+    try:
+        with patch.object(IngestPipeline, "submit", timed_submit):
+            started = time.perf_counter()
+            report = await crawler.crawl(sources, article_count, scheduler=scheduler)
+            elapsed = time.perf_counter() - started
+    finally:
+        for patcher in patchers:
+            patcher.stop()
+
+    inserted = sum(source.inserted for source in report.sources.values())
+    return {
+        "inserted": inserted,
+        "failed": sum(source.failed for source in report.sources.values()),
+        "fetch_errors": sum(
+            count
+            for source in report.sources.values()
+            for status, count in source.status_counts.items()
+            if not status.startswith("2")
+        ),
+        "bytes": sum(source.bytes_downloaded for source in report.sources.values()),
+        "elapsed": elapsed,
+        "articles_per_second": inserted / elapsed if elapsed else 0.0,
+        "p50": statistics.median(latencies) if latencies else 0.0,
+        "p95": (
+            statistics.quantiles(latencies, n=20)[-1]
+            if len(latencies) > 1
+            else sum(latencies)
+        ),
+        "round_trips": dict(calls),
+    }
+
+
+async def replay(args: argparse.Namespace) -> None:
+    servers = {
+        source: ReplayServer(
+            source,
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            page_kb=args.page_kb,
+            seed=args.seed,
+        )
+        for source in ("almanar", "aljadeed", "mtv")
+    }
+    for server in servers.values():
+        server.start()
+    try:
+        for run in range(1, args.runs + 1):
+            scheduler = CrawlScheduler(
+                per_host_concurrency=args.per_host,
+                min_host_interval=args.host_interval,
+            )
+            result = await replay_run(servers, args.articles, scheduler)
+            round_trips = result["round_trips"]
+            print(
+                f"run {run}: {result['inserted']} articles "
+                f"({result['failed']} failed to write, {result['fetch_errors']} "
+                f"fetch errors) in {result['elapsed']:.2f}s, "
+                f"{result['bytes'] / 1e6:.1f} MB downloaded, "
+                f"{result['articles_per_second']:.1f} articles/s, "
+                f"latency p50 {result['p50'] * 1000:.0f} ms "
+                f"p95 {result['p95'] * 1000:.0f} ms, "
+                f"{sum(round_trips.values())} db round trips {round_trips}"
+            )
+    finally:
+        for server in servers.values():
+            server.stop()
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--runs", type=int, default=3)
+    arg_parser.add_argument("--articles", type=int, default=20)
+    arg_parser.add_argument("--latency", type=float, default=0.05)
+    arg_parser.add_argument("--jitter", type=float, default=0.02)
+    arg_parser.add_argument("--error-rate", type=float, default=0.0)
+    arg_parser.add_argument("--page-kb", type=int, default=200)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    # politeness limits, the crawler's defaults unless comparing without them
+    arg_parser.add_argument("--per-host", type=int, default=2)
+    arg_parser.add_argument("--host-interval", type=float, default=0.25)
+    asyncio.run(replay(arg_parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
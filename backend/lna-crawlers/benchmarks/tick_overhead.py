@@ -0,0 +1,141 @@
+"""
+Per-tick setup cost of the crawler timer, before and after keeping the
+crawler runtime across ticks.
+
+    python benchmarks/tick_overhead.py [--ticks 10] [--articles 5000]
+        [--uri mongodb://localhost:27017]
+
+"per-tick" runs every tick the way the timer used to: a new event loop, a
+new Motor client with Beanie initialised on it, a fresh seen URL index
+warmed from two weeks of articles and a parser pool forked for the tick.
+"runtime" runs the ticks on one loop through `CrawlerRuntime`, as the async
+timer does. Ticks crawl no source, so only the setup is timed; one job is
+sent to the parser pool as the first parse of a tick would be.
+
+The time spent warming the seen URL index is reported apart: mongomock
+scans every article for it, where a server reads the `created_at` index
+from the previous tick on. Without `--uri` the database is mongomock, which
+also leaves out the connection handshake and the index commands of
+`init_beanie` that a real server adds to every per-tick setup.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from collections.abc import Callable
+from datetime import UTC, datetime
+from typing import Any
+from unittest.mock import patch
+
+import lna_crawlers.crawler as crawler
+from lna_crawlers.parsing import ParserPool
+from lna_crawlers.seen_urls import SeenUrlIndex
+from mongomock_motor import AsyncMongoMockClient
+
+
+def client_factory(args: argparse.Namespace) -> Callable[..., Any]:
+    if args.uri:
+        return lambda _uri: crawler.AsyncIOMotorClient(args.uri)
+    # mongomock clients do not share data, every tick reads the same one
+    shared = AsyncMongoMockClient()
+    return lambda _uri: shared
+
+
+async def seed(articles: int) -> None:
+    await crawler.init_db()
+    if await crawler.Article.count() >= articles:
+        return
+    await crawler.Article.insert_many(
+        [
+            crawler.Article(
+                source_id=uuid.UUID(int=0),
+                url=f"https://bench.local/news/{n}",
+                title="title",
+                content="content",
+                created_at=datetime.now(UTC),
+            )
+            for n in range(articles)
+        ]
+    )
+
+
+async def per_tick() -> None:
+    await crawler.init_db()
+    async with ParserPool() as parsers:
+        await parsers.run(len, b"")
+        await crawler.crawl([], parsers=parsers)
+
+
+async def runtime_tick(runtime: crawler.CrawlerRuntime) -> None:
+    await runtime.ready()
+    await runtime.parsers.run(len, b"")
+    await crawler.crawl([], parsers=runtime.parsers, seen=runtime.seen)
+
+
+def timed_warm() -> tuple[list[float], Any]:
+    """Time every seen URL index warm-up."""
+    seconds: list[float] = []
+    warm = SeenUrlIndex.warm
+
+    async def timed(self: SeenUrlIndex) -> int:
+        started = time.perf_counter()
+        try:
+            return await warm(self)
+        finally:
+            seconds.append(time.perf_counter() - started)
+
+    return seconds, patch.object(SeenUrlIndex, "warm", timed)
+
+
+def report(name: str, seconds: list[float], warm: list[float]) -> None:
+    # the first tick of the runtime pays for the setup, the others should not
+    setup = [tick - w for tick, w in zip(seconds, warm, strict=True)]
+    steady, steady_warm = setup[1:] or setup, warm[1:] or warm
+    print(
+        f"{name}: first tick {setup[0] * 1000:.1f} ms setup + "
+        f"{warm[0] * 1000:.1f} ms warm-up, then median "
+        f"{statistics.median(steady) * 1000:.1f} ms setup "
+        f"(max {max(steady) * 1000:.1f} ms) + "
+        f"{statistics.median(steady_warm) * 1000:.1f} ms warm-up"
+    )
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--ticks", type=int, default=10)
+    arg_parser.add_argument("--articles", type=int, default=5000)
+    arg_parser.add_argument("--uri", default=None)
+    args = arg_parser.parse_args()
+
+    with patch.object(crawler, "AsyncIOMotorClient", client_factory(args)):
+        asyncio.run(seed(args.articles))
+
+        warm, patcher = timed_warm()
+        seconds = []
+        with patcher:
+            for _ in range(args.ticks):
+                started = time.perf_counter()
+                asyncio.run(per_tick())
+                seconds.append(time.perf_counter() - started)
+        report("per-tick", seconds, warm)
+
+        async def ticks() -> list[float]:
+            runtime = crawler.CrawlerRuntime()
+            seconds = []
+            for _ in range(args.ticks):
+                started = time.perf_counter()
+                await runtime_tick(runtime)
+                seconds.append(time.perf_counter() - started)
+            runtime.parsers.shutdown()
+            return seconds
+
+        warm, patcher = timed_warm()
+        with patcher:
+            seconds = asyncio.run(ticks())
+        report("runtime", seconds, warm)
+
+
+if __name__ == "__main__":
+    main()
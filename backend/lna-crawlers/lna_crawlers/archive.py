@@ -0,0 +1,153 @@
+import hashlib
+import sqlite3
+import threading
+from datetime import UTC, datetime
+from pathlib import Path
+from types import TracebackType
+from typing import Self
+
+import zstandard
+from pydantic import BaseModel
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT NOT NULL,
+    source TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    encoding TEXT,
+    fetched_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_url ON pages (url, fetched_at);
+CREATE INDEX IF NOT EXISTS pages_fetched_at ON pages (fetched_at);
+"""
+
+
+class ArchivedPage(BaseModel):
+    """One fetch of a page, as recorded in the archive index."""
+
+    url: str
+    source: str
+    digest: str
+    encoding: str | None
+    fetched_at: datetime
+
+
+def _timestamp(moment: datetime) -> str:
+    # stored as UTC ISO strings, which sort like the moments they stand for
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=UTC)
+    return moment.astimezone(UTC).isoformat()
+
+
+def read_blob(path: Path) -> bytes:
+    return zstandard.ZstdDecompressor().decompress(path.read_bytes())
+
+
+class PageArchive:
+    """
+    Local archive of fetched pages, so articles can be re-extracted after an
+    extractor is fixed, when the pages may be gone from the site.
+
+    Bodies are stored zstd-compressed under their sha256, so a page fetched
+    again unchanged takes no extra space. A SQLite index records every fetch
+    by URL and fetch time. Safe to share between threads.
+    """
+
+    def __init__(self, root: Path, level: int = 3) -> None:
+        self.root = root
+        self.objects = root / "objects"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(root / "index.sqlite", check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+
+    def path(self, digest: str) -> Path:
+        return self.objects / digest[:2] / f"{digest[2:]}.zst"
+
+    def put(
+        self,
+        url: str,
+        source: str,
+        content: bytes,
+        encoding: str | None = None,
+        fetched_at: datetime | None = None,
+    ) -> str:
+        """Store a fetched body and index the fetch, returning the body's digest."""
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.path(digest)
+        fetched_at = fetched_at or datetime.now(UTC)
+        with self._lock:
+            if not path.exists():
+                path.parent.mkdir(exist_ok=True)
+                # written aside then renamed, a crash never leaves half a blob
+                partial = path.with_suffix(".tmp")
+                partial.write_bytes(self._compressor.compress(content))
+                partial.replace(path)
+            self._db.execute(
+                "INSERT INTO pages VALUES (?, ?, ?, ?, ?)",
+                (url, source, digest, encoding, _timestamp(fetched_at)),
+            )
+            self._db.commit()
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        return read_blob(self.path(digest))
+
+    def latest(self, url: str) -> ArchivedPage | None:
+        pages = self._select("WHERE url = ? ORDER BY fetched_at DESC LIMIT 1", (url,))
+        return pages[0] if pages else None
+
+    def pages(
+        self, source: str | None = None, since: datetime | None = None
+    ) -> list[ArchivedPage]:
+        """The latest fetch of every archived URL, optionally narrowed down."""
+        where, params = [], []
+        if source is not None:
+            where.append("source = ?")
+            params.append(source)
+        if since is not None:
+            where.append("fetched_at >= ?")
+            params.append(_timestamp(since))
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+        # SQLite returns the other columns of the row holding the max()
+        return self._select_rows(
+            "SELECT url, source, digest, encoding, max(fetched_at) FROM pages "
+            f"{clause} GROUP BY url",
+            tuple(params),
+        )
+
+    def _select(self, clause: str, params: tuple) -> list[ArchivedPage]:
+        return self._select_rows(
+            f"SELECT url, source, digest, encoding, fetched_at FROM pages {clause}",
+            params,
+        )
+
+    def _select_rows(self, query: str, params: tuple) -> list[ArchivedPage]:
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        return [
+            ArchivedPage(
+                url=url,
+                source=source,
+                digest=digest,
+                encoding=encoding,
+                fetched_at=datetime.fromisoformat(fetched_at),
+            )
+            for url, source, digest, encoding, fetched_at in rows
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        self.close()
@@ -2,77 +2,73 @@
 import asyncio
 import logging
 import os
+import time
 import uuid
-from datetime import datetime
+from contextlib import nullcontext
+from datetime import UTC, datetime
+from pathlib import Path
 
 import azure.functions as func
 import beanie
-import feedparser
 
 # Third-Party Library Imports
-import httpx
-from bs4 import BeautifulSoup
 from dateutil import parser
-from langdetect import detect
-from lna_db.core.types import Language
-from lna_db.models.news import AggregatedStory, Article, Source, User, UserPreferences
+from lna_db.models.news import (
+    AggregatedStory,
+    Article,
+    CrawlLease,
+    FeedState,
+    Source,
+    User,
+    UserPreferences,
+)
 from motor.motor_asyncio import AsyncIOMotorClient
 
-article_Dict: dict[str, list[Article]] = {}
+from lna_crawlers.archive import PageArchive
+from lna_crawlers.extractors import load_extractors
+from lna_crawlers.feed_state import (
+    as_utc,
+    conditional_headers,
+    feed_changed,
+    load_feed_state,
+    record_newest_entry,
+    take_new_entries,
+)
+from lna_crawlers.http_clients import HttpClientRegistry
+from lna_crawlers.leases import LeaseLost, LeaseManager
+from lna_crawlers.metrics import CrawlMetrics, RunReport, registry
+from lna_crawlers.parsing import ParserPool
+from lna_crawlers.pipeline import NO_CONTENT, IngestPipeline
+from lna_crawlers.polling import (
+    PollingPolicy,
+    is_due,
+    observe_publish_dates,
+    schedule_next_poll,
+)
+from lna_crawlers.scheduler import CrawlScheduler
+from lna_crawlers.seen_urls import SeenUrlIndex
 
 
-async def fetch_content(
-    link: str, myArticle: Article, source_articles: list[Article], src: Source
-) -> None:
+def _parse_date(value: object) -> datetime | None:
+    if not value or not isinstance(value, str):
+        return None
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(link, timeout=10, follow_redirects=True)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, "html.parser")
-        article_content = soup.find(
-            src.content_html_key[0], class_=src.content_html_key[1]
-        )
-        full_url = myArticle.image_url
-        if src.name == "aljadeed": #For aljadeed, handle as follows
-            container = soup.find("div", class_="article_details_image_container")  # noqa: E501
-            img_tag = container.find("img") if container else None
-            if img_tag and img_tag.get("src"):
-                relative_url = img_tag['src']
-                full_url = f"www.aljadeed.tv{relative_url}"
-        elif src.name == "almanar": #for almanar, do as follows
-            a_tag = soup.find('figure', class_='article-image').find('a')
-            full_url = a_tag['href']
-        myArticle.image_url = full_url
-        if myArticle.title and len(myArticle.title) > 3:
-            try:
-                lang_code = detect(myArticle.title)
-                # Use unknown as default if failed detection
-                myArticle.language = (
-                    Language(lang_code)
-                    if lang_code in Language.__members__.values()
-                    else Language.UNKNOWN
-                )
-            except Exception:
-                myArticle.language = Language.UNKNOWN
-        if not article_content:
-            myArticle.content = "No content to be displayed."
-            source_articles.append(myArticle)
-            return
-
-        article_content = article_content.get_text(strip=True, separator="\n")
-        if len(article_content) < 1:
-            myArticle.content = "No content to be displayed."
-        else:
-            myArticle.content = article_content
-        source_articles.append(myArticle)
+        return parser.parse(value)
+    except (ValueError, OverflowError):
+        return None
 
-    except Exception as e:
-        print(f"Error in fetch_content ({src.name}): {e}")
+
+def feed_entry_url_and_date(entry: dict) -> tuple[str, datetime | None]:
+    return str(entry.get("link", "")), _parse_date(entry.get("published"))
+
+
+def api_article_url_and_date(article: dict) -> tuple[str, datetime | None]:
+    return str(article.get("websiteUrl", "")), _parse_date(article.get("date"))
 
 
 async def process_feed_entry(
-    entry: feedparser.FeedParserDict, source_articles: list[Article], src: Source
-) -> None:
+    entry: dict, src: Source, pipeline: IngestPipeline
+) -> asyncio.Future[bool] | None:
     try:
         id = uuid.uuid4()
         # Use get() to safely access attributes with default values
@@ -85,10 +81,14 @@ async def process_feed_entry(
         if not isinstance(link, str):
             link = str(link) if link else ""
 
+        # already stored, don't download the page again
+        if pipeline.already_seen(src, link):
+            return None
+
         myArticle = Article(
             uuid=id,
             source_id=src.uuid,
-            content="No content to be displayed.",
+            content=NO_CONTENT,
             title=title,
             url=link,
             publish_date=datetime.min,
@@ -96,110 +96,217 @@ async def process_feed_entry(
         )
 
         # Get publish date if available
-        if hasattr(entry, "published"):
-            published = entry.get("published", "")
-            if published and isinstance(published, str):
-                dt = parser.parse(published)
-                myArticle.publish_date = dt
-
-        # Only fetch content if we have a valid URL
-        if link:
-            await fetch_content(link, myArticle, source_articles, src)
-        else:
-            source_articles.append(myArticle)
+        published = entry.get("published")
+        if published and isinstance(published, str):
+            dt = parser.parse(published)
+            myArticle.publish_date = dt
+
+        # the pipeline downloads the page (when there is a link) and writes the article
+        return await pipeline.submit(src, myArticle)
     except Exception as e:
         print(f"Error in process_feed_entry ({src.name}): {e}")
+        return None
 
 
-async def get_feed(src: Source, article_count: int) -> None:
-    source_articles: list[Article] = []
+async def get_feed(
+    src: Source,
+    article_count: int,
+    pipeline: IngestPipeline,
+    policy: PollingPolicy | None = None,
+    leases: LeaseManager | None = None,
+) -> None:
+    """
+    Poll `src` if it is due and schedule its next poll from what was found.
+    With `leases`, the poll stops as soon as the lease on `src` is lost, and
+    leaves the feed state to the instance that took it over.
+    """
+    policy = policy or PollingPolicy()
+    state = await load_feed_state(src)
+    now = datetime.now(UTC)
+    if not is_due(state, now):
+        return
+    started = time.perf_counter()
+    source_metrics = pipeline.metrics.source(src.name)
+    validators = (state.etag, state.last_modified, state.body_hash)
 
-    if not src.has_rss:
-        await fetch_articles(source_articles, src, article_count)
+    try:
+        fetch = fetch_rss_articles if src.has_rss else fetch_articles
+        new_entries, submitted = await fetch(
+            src, article_count, pipeline, state, leases
+        )
+        # wait for this source's articles only, they are written as they complete
+        written = await asyncio.gather(*submitted)
+        if leases is not None:
+            leases.check(src.name)
+    except LeaseLost:
+        logging.warning(f"lost the lease on {src.name}, stopped polling it")
+        source_metrics.run_seconds += time.perf_counter() - started
+        return
+    except Exception as e:
+        print(f"Error in get_feed ({src.name}): {e}")
+        # the fetched body was not processed, keep the validators of the last
+        # one that was so that the next poll does not skip it as unchanged
+        state.etag, state.last_modified, state.body_hash = validators
+        schedule_next_poll(state, now, policy, failed=True)
+        await state.save()
+        source_metrics.run_seconds += time.perf_counter() - started
         return
 
-    feed = feedparser.parse(src.url)
-    tasks = [
-        asyncio.create_task(process_feed_entry(entry, source_articles, src))
-        for entry in feed.entries[:article_count]
-    ]
+    observe_publish_dates(state, [date for _, date in new_entries if date], policy)
+    if all(written):
+        record_newest_entry(state, new_entries)
+    else:
+        # forget the feed validators so the next poll processes the feed again,
+        # the articles that did make it are skipped through the seen urls
+        state.etag = state.last_modified = state.body_hash = None
+    schedule_next_poll(state, now, policy, found_new_entries=bool(new_entries))
+    await state.save()
+    source_metrics.run_seconds += time.perf_counter() - started
+
+
+async def fetch_rss_articles(
+    src: Source,
+    article_count: int,
+    pipeline: IngestPipeline,
+    state: FeedState,
+    leases: LeaseManager | None = None,
+) -> tuple[list[tuple[str, datetime | None]], list[asyncio.Future[bool]]]:
+    # download through the pooled client so the feed shares the article connections,
+    # conditionally so that an unchanged feed costs a 304 and no processing
+    response = await pipeline.fetch_url(
+        src.url, src, headers=conditional_headers(state)
+    )
+    if not feed_changed(state, response):
+        logging.info(f"feed of {src.name} unchanged, skipping")
+        return [], []
+
+    feed_entries = await pipeline.parse_feed(src, response.content)
+    entries = take_new_entries(
+        state, feed_entries[:article_count], feed_entry_url_and_date
+    )
+    submitted = []
+    for entry in entries:
+        if leases is not None:
+            leases.check(src.name)
+        done = await process_feed_entry(entry, src, pipeline)
+        if done is not None:
+            submitted.append(done)
+    return [feed_entry_url_and_date(entry) for entry in entries], submitted
 
-    await asyncio.gather(*tasks)
-    # Use string ID as dictionary key to avoid Optional[PydanticObjectId] issues
-    if src.uuid is not None:
-        article_Dict[str(src.uuid)] = source_articles
-        await add_articles_to_db(src, source_articles)
 
+async def fetch_articles(
+    src: Source,
+    article_count: int,
+    pipeline: IngestPipeline,
+    state: FeedState,
+    leases: LeaseManager | None = None,
+) -> tuple[list[tuple[str, datetime | None]], list[asyncio.Future[bool]]]:
+    response = await pipeline.fetch_url(
+        src.url, src, headers=conditional_headers(state)
+    )
+    if not feed_changed(state, response):
+        logging.info(f"feed of {src.name} unchanged, skipping")
+        return [], []
+    data = response.json()
+    articles = take_new_entries(
+        state, data.get("articles", [])[:article_count], api_article_url_and_date
+    )
+    submitted = []
+
+    for article in articles:
+        # already stored, don't download the page again
+        if pipeline.already_seen(src, article["websiteUrl"]):
+            continue
+        if leases is not None:
+            leases.check(src.name)
+        # Get image url directly, no need to get from article as it is already provided
+        image_url = article["mainImage"].split("?")[0]
+        id = uuid.uuid4()
+        url = article["websiteUrl"]
+        dt = parser.parse(article["date"])
+        myArticle = Article(
+            uuid=id,
+            url=url,
+            source_id=src.uuid,
+            content=NO_CONTENT,
+            title=article["name"],
+            publish_date=dt,
+            crawler="LNACrawlerTimer",
+            image_url=image_url,
+        )
+        submitted.append(await pipeline.submit(src, myArticle))
 
-async def add_articles_to_db(src: Source, data_array: list[Article]) -> None:
-    for article in data_array:
-        try:
-            existing_article = await Article.find_one({"url": article.url})
-            if existing_article:
-                print("skipped")
-                continue  # Skip inserting duplicates
-            await article.save()
-        except Exception as e:
-            print(f"Error occured in adding to DB: {e}")
+    return [api_article_url_and_date(article) for article in articles], submitted
 
 
-async def fetch_articles(
-    source_articles: list[Article], src: Source, article_count: int
+async def auto_get_feed(
+    src: Source,
+    article_count: int,
+    pipeline: IngestPipeline,
+    policy: PollingPolicy | None = None,
 ) -> None:
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(src.url, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-        articles = data.get("articles", [])
-        tasks = []
+    """Keep polling `src`, sleeping until its next poll is due."""
+    policy = policy or PollingPolicy()
+    while True:
+        await get_feed(src, article_count, pipeline, policy)
+        state = await load_feed_state(src)
+        delay = policy.min_interval.total_seconds()
+        if state.next_poll_at is not None:
+            delay = (as_utc(state.next_poll_at) - datetime.now(UTC)).total_seconds()
+        await asyncio.sleep(max(delay, 0))
 
-        for article in articles[:article_count]:
-            image_url = article["mainImage"].split("?")[0] #Get image url directly, no need to get from article as it is already provided  # noqa: E501
-            id = uuid.uuid4()
-            url = article["websiteUrl"]
-            dt = parser.parse(article["date"])
-            myArticle = Article(
-                uuid=id,
-                url=url,
-                source_id=src.uuid,
-                content="No content to be displayed.",
-                title=article["name"],
-                publish_date=dt,
-                crawler="LNACrawlerTimer",
-                image_url=image_url,
-            )
-            tasks.append(
-                asyncio.create_task(
-                    fetch_content(
-                        article["websiteUrl"], myArticle, source_articles, src
-                    )
+
+async def start(user: User, article_count: int, sources: dict[str, Source]) -> None:
+    await load_extractors()
+    seen = SeenUrlIndex()
+    await seen.warm()
+    async with (
+        HttpClientRegistry() as clients,
+        ParserPool() as parsers,
+        IngestPipeline(clients, CrawlScheduler(), parsers, seen) as pipeline,
+    ):
+        tasks = []
+        for srcid in user.preferences.source_ids:
+            source = sources.get(str(srcid))
+            if source:
+                tasks.append(
+                    asyncio.create_task(auto_get_feed(source, article_count, pipeline))
                 )
-            )
 
         await asyncio.gather(*tasks)
-        # Use string ID as dictionary key to avoid Optional[PydanticObjectId] issues
-        if src.uuid is not None:
-            article_Dict[str(src.uuid)] = source_articles
-            await add_articles_to_db(src, source_articles)
 
-    except Exception as e:
-        print(f"Error in fetch_articles : {e}")
 
+class CrawlerRuntime:
+    """
+    Crawler state kept for the life of the worker process, so that a timer
+    tick only pays for the crawl itself: the database connection with Beanie
+    initialised on it, the parser pool, the seen URL index (topped up with
+    the articles stored since the previous tick) and the page archive. The
+    extractors stored on the source documents are loaded again every tick.
+    """
 
-async def auto_get_feed(src: Source, article_count: int) -> None:
-    while True:
-        await get_feed(src, article_count)
+    def __init__(self) -> None:
+        self.parsers = ParserPool()
+        self.seen = SeenUrlIndex()
+        self.archive: PageArchive | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
 
+    async def ready(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # a Motor client is bound to the event loop it was first used on,
+            # so the connection is only set up again if the loop changed
+            await init_db()
+            self._loop = loop
+        if self.archive is None:
+            # fetched pages are kept for re-extraction when a directory is set
+            archive_dir = os.environ.get("PAGE_ARCHIVE_DIR")
+            self.archive = PageArchive(Path(archive_dir)) if archive_dir else None
+        await load_extractors()
+        await self.seen.warm()
 
-async def start(user: User, article_count: int, sources: dict[str, Source]) -> None:
-    tasks = []
-    for srcid in user.preferences.source_ids:
-        source = sources.get(str(srcid))
-        if source:
-            tasks.append(asyncio.create_task(auto_get_feed(source, article_count)))
 
-    await asyncio.gather(*tasks)
+runtime = CrawlerRuntime()
 
 
 async def init_db() -> None:
@@ -211,15 +318,21 @@ async def init_db() -> None:
     # Initialize Beanie with the real MongoDB
     await beanie.init_beanie(
         database=database,
-        document_models=[UserPreferences, User, Source, Article, AggregatedStory],
+        document_models=[
+            UserPreferences,
+            User,
+            Source,
+            FeedState,
+            CrawlLease,
+            Article,
+            AggregatedStory,
+        ],
     )
 
 
-async def main() -> None:
-    # Initialize Beanie before using models
-    await init_db()
+def default_sources() -> dict[uuid.UUID, Source]:
     # Simulate a test user and sources
-    sourceArr = {
+    return {
         (uuid.UUID(int=0)): Source(
             uuid=uuid.UUID(int=0),
             name="almanar",
@@ -243,10 +356,82 @@ async def main() -> None:
         ),
     }
 
-    # Run feed fetching **only once** per source
-    tasks = [asyncio.create_task(get_feed(source, 6)) for source in sourceArr.values()]
 
-    await asyncio.gather(*tasks)
+async def get_leased_feed(
+    src: Source, article_count: int, pipeline: IngestPipeline, leases: LeaseManager
+) -> None:
+    """Poll `src` unless another crawler instance holds its lease."""
+    if not await leases.acquire(src.name):
+        logging.info(f"{src.name} is being crawled by another instance, skipped")
+        return
+    try:
+        await get_feed(src, article_count, pipeline, leases=leases)
+    finally:
+        await leases.release(src.name)
+
+
+async def crawl(
+    sources: list[Source],
+    article_count: int = 6,
+    archive: PageArchive | None = None,
+    scheduler: CrawlScheduler | None = None,
+    leases: LeaseManager | None = None,
+    parsers: ParserPool | None = None,
+    seen: SeenUrlIndex | None = None,
+) -> RunReport:
+    """
+    Poll each of `sources` once, the database must be initialised. With
+    `leases`, only the sources no other instance is crawling are polled.
+    The parser pool and seen URL index are made for the run unless given.
+    """
+    # Run feed fetching **only once** per source, reusing pooled connections per host
+    # and sharing one scheduler so the sources queue fairly behind the same limits.
+    # Articles of every source stream through the same pipeline and are written in
+    # micro-batches as they are extracted.
+    scheduler = scheduler or CrawlScheduler()
+    metrics = CrawlMetrics()
+    if seen is None:
+        seen = SeenUrlIndex()
+        await seen.warm()
+    # a pool that was handed in outlives the run
+    parser_pool = ParserPool() if parsers is None else nullcontext(parsers)
+    async with (
+        HttpClientRegistry() as clients,
+        parser_pool as parsers,
+        IngestPipeline(
+            clients, scheduler, parsers, seen, metrics=metrics, archive=archive
+        ) as pipeline,
+    ):
+        tasks = [
+            asyncio.create_task(
+                get_feed(source, article_count, pipeline)
+                if leases is None
+                else get_leased_feed(source, article_count, pipeline, leases)
+            )
+            for source in sources
+        ]
+
+        await asyncio.gather(*tasks)
+    scheduler.log_stats()
+    report = metrics.report()
+    registry.record(report)
+    return report
+
+
+async def main() -> RunReport:
+    # Initialize Beanie before using models, once per worker process
+    await runtime.ready()
+    sourceArr = default_sources()
+    # instances running at the same time split the sources between them
+    async with LeaseManager() as leases:
+        return await crawl(
+            list(sourceArr.values()),
+            6,
+            runtime.archive,
+            leases=leases,
+            parsers=runtime.parsers,
+            seen=runtime.seen,
+        )
 
 
 # Create a FunctionApp instance with appropriate type annotation
@@ -259,12 +444,15 @@ app = func.FunctionApp()
     run_on_startup=False,
     use_monitor=False,
 )
-def LnaCrawlerTimer(myTimer: func.TimerRequest) -> None:
+async def LnaCrawlerTimer(myTimer: func.TimerRequest) -> None:
+    # async, so it runs on the worker's event loop that lives across ticks and
+    # the database connection and crawler runtime are reused
     if myTimer.past_due:
         logging.info("The timer is past due")
 
     logging.info("Python timer trigger function started!")
     try:
-        asyncio.run(main())
+        report = await main()
+        report.log()
     except Exception as e:
         logging.error(f"Error: {str(e)}")
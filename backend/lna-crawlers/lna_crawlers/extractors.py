@@ -0,0 +1,46 @@
+from lna_db.models.news import ExtractorConfig, Source
+
+from lna_crawlers.parsing import class_xpath
+
+# extractors registered by source name, for sources whose document has none
+EXTRACTORS: dict[str, ExtractorConfig] = {}
+
+
+def register_extractor(source_name: str, extractor: ExtractorConfig) -> None:
+    EXTRACTORS[source_name] = extractor
+
+
+def extractor_for(src: Source) -> ExtractorConfig:
+    """
+    The extractor of `src`: its own document's config first, then the one
+    registered under its name. Without a content selector, the article text
+    is taken from the element named by `content_html_key`.
+    """
+    extractor = src.extractor or EXTRACTORS.get(src.name) or ExtractorConfig()
+    if extractor.content is None:
+        extractor = extractor.model_copy(
+            update={"content": class_xpath(*src.content_html_key)}
+        )
+    return extractor
+
+
+async def load_extractors() -> int:
+    """Register the extractors stored on the source documents."""
+    sources = await Source.find(Source.extractor != None).to_list()  # noqa: E711
+    for src in sources:
+        if src.extractor is not None:
+            register_extractor(src.name, src.extractor)
+    return len(sources)
+
+
+register_extractor(
+    "aljadeed",
+    ExtractorConfig(
+        image=class_xpath("div", "article_details_image_container") + "//img/@src",
+        image_prefix="www.aljadeed.tv",
+    ),
+)
+register_extractor(
+    "almanar",
+    ExtractorConfig(image=class_xpath("figure", "article-image") + "//a/@href"),
+)
@@ -0,0 +1,86 @@
+import hashlib
+from collections.abc import Callable, Iterable, Sequence
+from datetime import UTC, datetime
+from typing import TypeVar
+
+import httpx
+from lna_db.models.news import FeedState, Source
+
+T = TypeVar("T")
+
+
+def as_utc(value: datetime) -> datetime:
+    # mongo hands datetimes back naive (but in UTC), feeds may carry any offset
+    if value.tzinfo is None:
+        return value.replace(tzinfo=UTC)
+    return value.astimezone(UTC)
+
+
+async def load_feed_state(src: Source) -> FeedState:
+    state = await FeedState.find_one(FeedState.source_id == src.uuid)
+    return state or FeedState(source_id=src.uuid)
+
+
+def conditional_headers(state: FeedState) -> dict[str, str]:
+    """Request headers that let the server answer 304 when the feed is unchanged."""
+    headers: dict[str, str] = {}
+    if state.etag:
+        headers["If-None-Match"] = state.etag
+    if state.last_modified:
+        headers["If-Modified-Since"] = state.last_modified
+    return headers
+
+
+def feed_changed(state: FeedState, response: httpx.Response) -> bool:
+    """
+    Return False for a 304 or a body identical to the last processed one.
+    Otherwise record the new validators and body hash on `state`; the caller
+    saves it only once the entries have been processed.
+    """
+    if response.status_code == httpx.codes.NOT_MODIFIED:
+        return False
+
+    body_hash = hashlib.sha256(response.content).hexdigest()
+    if body_hash == state.body_hash:
+        return False
+
+    state.etag = response.headers.get("ETag")
+    state.last_modified = response.headers.get("Last-Modified")
+    state.body_hash = body_hash
+    return True
+
+
+def take_new_entries(
+    state: FeedState,
+    entries: Iterable[T],
+    url_and_date: Callable[[T], tuple[str, datetime | None]],
+) -> list[T]:
+    """
+    Keep the entries newer than the newest one processed on a previous run.
+    Feeds list entries newest first, so everything after the last seen URL
+    is old as well.
+    """
+    newest_date = state.newest_entry_date and as_utc(state.newest_entry_date)
+    new_entries = []
+    for entry in entries:
+        url, published = url_and_date(entry)
+        if state.newest_entry_url and url == state.newest_entry_url:
+            break
+        if newest_date and published and as_utc(published) <= newest_date:
+            continue
+        new_entries.append(entry)
+    return new_entries
+
+
+def record_newest_entry(
+    state: FeedState, entries: Sequence[tuple[str, datetime | None]]
+) -> None:
+    """Remember the newest of the processed `(url, date)` entries, newest first."""
+    if not entries:
+        return
+    state.newest_entry_url = entries[0][0]
+    dates = [as_utc(date) for _, date in entries if date]
+    if state.newest_entry_date:
+        dates.append(as_utc(state.newest_entry_date))
+    if dates:
+        state.newest_entry_date = max(dates)
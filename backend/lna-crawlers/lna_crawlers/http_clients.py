@@ -0,0 +1,102 @@
+import importlib.util
+import logging
+from types import TracebackType
+from typing import Self
+from urllib.parse import urlsplit
+
+import httpx
+from pydantic import BaseModel, Field
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (compatible; LNACrawler/0.1)"
+
+
+class HttpClientConfig(BaseModel):
+    """Connection pool and timeout settings shared by every crawler request."""
+
+    connect_timeout: float = Field(
+        default=5.0, description="Seconds allowed to establish a connection."
+    )
+    read_timeout: float = Field(
+        default=10.0, description="Seconds allowed between two received chunks."
+    )
+    pool_timeout: float = Field(
+        default=10.0, description="Seconds to wait for a free pooled connection."
+    )
+    max_connections_per_host: int = Field(
+        default=4, description="Upper bound on open connections to a single host."
+    )
+    max_keepalive_per_host: int = Field(
+        default=4, description="Idle connections kept open per host for reuse."
+    )
+    keepalive_expiry: float = Field(
+        default=30.0, description="Seconds an idle connection stays in the pool."
+    )
+    http2: bool = Field(
+        default=False,
+        description="Negotiate HTTP/2 when the optional `h2` package is installed.",
+    )
+    user_agent: str = Field(default=DEFAULT_USER_AGENT)
+
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+class HttpClientRegistry:
+    """
+    Crawler-scoped registry of pooled `httpx.AsyncClient`s, one per host.
+    Keeping a client per host lets keep-alive connections be reused across
+    articles of the same source while the pool limits act as per-host limits.
+    """
+
+    def __init__(self, config: HttpClientConfig | None = None) -> None:
+        self.config = config or HttpClientConfig()
+        self._clients: dict[str, httpx.AsyncClient] = {}
+        self._http2 = self.config.http2
+        if self._http2 and not _http2_available():
+            logging.warning("http2 requested but `h2` is not installed, using HTTP/1.1")
+            self._http2 = False
+
+    def _build_client(self) -> httpx.AsyncClient:
+        config = self.config
+        return httpx.AsyncClient(
+            http2=self._http2,
+            follow_redirects=True,
+            headers={"User-Agent": config.user_agent},
+            timeout=httpx.Timeout(
+                config.read_timeout,
+                connect=config.connect_timeout,
+                pool=config.pool_timeout,
+            ),
+            limits=httpx.Limits(
+                max_connections=config.max_connections_per_host,
+                max_keepalive_connections=config.max_keepalive_per_host,
+                keepalive_expiry=config.keepalive_expiry,
+            ),
+        )
+
+    def get(self, url: str) -> httpx.AsyncClient:
+        """Return the pooled client for the host of `url`, creating it if needed."""
+        host = urlsplit(url).netloc.lower()
+        client = self._clients.get(host)
+        if client is None or client.is_closed:
+            client = self._build_client()
+            self._clients[host] = client
+        return client
+
+    async def aclose(self) -> None:
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        await self.aclose()
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import UTC, datetime, timedelta
+from types import TracebackType
+from typing import Self
+
+from lna_db.models.news import CrawlLease
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+class LeaseLost(Exception):
+    """The lease on a source was taken over by another instance mid-crawl."""
+
+
+def instance_id() -> str:
+    # Azure names each scaled-out instance, the pid tells overlapping runs apart
+    instance = os.environ.get("WEBSITE_INSTANCE_ID") or socket.gethostname()
+    return f"{instance[:16]}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LeaseManager:
+    """
+    Claims sources for this crawler instance through expiring leases in Mongo.
+
+    A source is crawled only by the instance holding its lease, so overlapping
+    runs and scaled-out instances split the sources between them instead of
+    crawling them twice. Held leases are renewed by a heartbeat every
+    `heartbeat_interval`; a lease whose owner stopped renewing it expires
+    after `ttl` and is taken over by the next instance that claims it.
+    A crawl checks its lease before each step that another instance would
+    repeat, and stops once the heartbeat found it lost.
+    """
+
+    def __init__(
+        self,
+        owner: str | None = None,
+        ttl: timedelta = timedelta(minutes=2),
+        heartbeat_interval: timedelta | None = None,
+    ) -> None:
+        self.owner = owner or instance_id()
+        self.ttl = ttl
+        self.heartbeat_interval = heartbeat_interval or ttl / 3
+        self.held: set[str] = set()
+        self.lost: set[str] = set()
+        self._heartbeat: asyncio.Task[None] | None = None
+
+    async def acquire(self, key: str) -> bool:
+        """Claim `key` unless another instance holds an unexpired lease on it."""
+        now = datetime.now(UTC)
+        try:
+            # one atomic round trip: the filter only matches a lease that is free
+            # to take, otherwise the upsert collides with it on the unique key
+            previous = await CrawlLease.get_motor_collection().find_one_and_update(
+                {
+                    "key": key,
+                    "$or": [{"owner": self.owner}, {"expires_at": {"$lte": now}}],
+                },
+                {
+                    "$set": {
+                        "owner": self.owner,
+                        "acquired_at": now,
+                        "expires_at": now + self.ttl,
+                    }
+                },
+                upsert=True,
+                return_document=ReturnDocument.BEFORE,
+            )
+        except DuplicateKeyError:
+            return False
+        if previous is not None and previous["owner"] != self.owner:
+            logging.warning(
+                f"took over the expired lease on {key} from {previous['owner']}"
+            )
+        self.held.add(key)
+        self.lost.discard(key)
+        return True
+
+    async def renew(self) -> None:
+        """Push back the expiry of every held lease, dropping the ones lost."""
+        if not self.held:
+            return
+        now = datetime.now(UTC)
+        keys = list(self.held)
+        await CrawlLease.get_motor_collection().update_many(
+            {"key": {"$in": keys}, "owner": self.owner},
+            {"$set": {"expires_at": now + self.ttl}},
+        )
+        owned = await CrawlLease.get_motor_collection().distinct(
+            "key", {"key": {"$in": keys}, "owner": self.owner}
+        )
+        for key in set(keys) - set(owned):
+            logging.warning(f"lost the lease on {key}, it was taken over")
+            self.held.discard(key)
+            self.lost.add(key)
+
+    def check(self, key: str) -> None:
+        """Raise LeaseLost unless `key` is still held by this instance."""
+        if key not in self.held:
+            raise LeaseLost(key)
+
+    async def release(self, key: str) -> None:
+        """Give up `key` so that it can be claimed right away."""
+        self.held.discard(key)
+        await CrawlLease.get_motor_collection().delete_one(
+            {"key": key, "owner": self.owner}
+        )
+
+    async def _beat(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval.total_seconds())
+            try:
+                await self.renew()
+            except Exception as e:
+                # the leases stay ours until they expire, the next beat retries
+                logging.error(f"failed to renew crawl leases: {e}")
+
+    async def start(self) -> None:
+        self._heartbeat = asyncio.create_task(self._beat())
+
+    async def close(self) -> None:
+        """Stop the heartbeat and release every lease still held."""
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            await asyncio.gather(self._heartbeat, return_exceptions=True)
+            self._heartbeat = None
+        for key in list(self.held):
+            await self.release(key)
+
+    async def __aenter__(self) -> Self:
+        await self.start()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        await self.close()
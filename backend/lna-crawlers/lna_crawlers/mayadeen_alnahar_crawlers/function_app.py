@@ -1,25 +1,42 @@
 # pyre-ignore-all-errors
 
 import asyncio
-import datetime
 import logging
 import os
-from datetime import UTC
+from datetime import UTC, datetime, timedelta
+from urllib.parse import urljoin
 from uuid import UUID
 
 import azure.functions as func
-import requests
+import httpx
 
 # beanie requirements:
 from beanie import init_beanie
 from bs4 import BeautifulSoup
 from bson import ObjectId
+from language import detect_languages  # type: ignore
 from motor.motor_asyncio import AsyncIOMotorClient
-from my_types import Language  # type: ignore
 from news import Article  # type: ignore
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 
 app = func.FunctionApp()
 
+# requests in flight at once, over connections kept open for the whole run
+MAX_CONCURRENCY = 16
+WRITE_BATCH_SIZE = 100
+ALNAHAR_SOURCE_ID = UUID("f67322c8-069c-43a2-9097-6805d56dd436")
+# lastmod of every sitemap and article url seen in a sitemap
+SITEMAP_LASTMODS = "sitemap_lastmods"
+# failed downloads of each sitemap article url, given up on after a few
+SITEMAP_FAILURES = "sitemap_failures"
+MAX_ARTICLE_FAILURES = 3
+# sitemaps and articles last changed before this are not read, which also keeps
+# the first run, with no lastmods recorded yet, from scraping the whole archive
+SITEMAP_MAX_AGE = timedelta(days=2)
+# sitemap articles scraped per run, the newest first, the rest wait for the next
+MAX_SITEMAP_ARTICLES = 300
+
 
 @app.function_name(name="crawler_1")
 @app.timer_trigger(
@@ -37,11 +54,23 @@ def crawler_1(myTimer: func.TimerRequest) -> None:
     garbage_links = set()
     good_links = set()
     dataset = []
+    updates = []  # articles changed since they were stored
+    lastmods = {}  # recorded once the run's articles are written
+    sitemap_changes = {}  # sitemaps' lastmods, kept only if all their articles came
+    sitemap_urls = {}  # article urls listed in each of those sitemaps
+    deferred = set()  # sitemap articles left for the next run
 
     # UTILS
 
-    def get_category_main_pages(main_url):
-        html = requests.get(main_url)
+    async def fetch(client, semaphore, url):
+        # the semaphore bounds the requests in flight across every category
+        async with semaphore:
+            response = await client.get(url)
+        response.raise_for_status()
+        return response
+
+    async def get_category_main_pages(client, semaphore, main_url):
+        html = await fetch(client, semaphore, main_url)
         tags = BeautifulSoup(html.text, "html.parser")
         menu_tags = tags.find("div", class_="menu")
         main_page_links = menu_tags.find_all("a", href=True)
@@ -53,149 +82,17 @@ def crawler_1(myTimer: func.TimerRequest) -> None:
         main_pages_to_scrape.append(main_url)
         return main_pages_to_scrape
 
-    # PREPROCESS
-
-    def get_language(content):
-        # Common words in English articles
-        dict_eng = {
-            "the",
-            "a",
-            "an",
-            "in",
-            "on",
-            "at",
-            "by",
-            "for",
-            "with",
-            "from",
-            "to",
-            "of",
-            "and",
-            "but",
-            "or",
-            "because",
-            "if",
-            "he",
-            "she",
-            "it",
-            "they",
-            "we",
-            "you",
-            "I",
-            "is",
-            "are",
-            "was",
-            "were",
-            "have",
-            "has",
-            "do",
-            "does",
-            "can",
-            "will",
-            "time",
-            "person",
-            "year",
-            "way",
-            "day",
-            "thing",
-            "man",
-            "world",
-            "very",
-            "not",
-            "also",
-            "more",
-            "so",
-        }
-
-        # Common words in French articles
-        dict_fr = {
-            "le",
-            "la",
-            "les",
-            "un",
-            "une",
-            "des",
-            "à",
-            "de",
-            "en",
-            "dans",
-            "sur",
-            "avec",
-            "pour",
-            "par",
-            "et",
-            "mais",
-            "ou",
-            "car",
-            "donc",
-            "il",
-            "elle",
-            "nous",
-            "vous",
-            "ils",
-            "elles",
-            "ce",
-            "cette",
-            "être",
-            "avoir",
-            "faire",
-            "aller",
-            "dire",
-            "pouvoir",
-            "temps",
-            "personne",
-            "année",
-            "monde",
-            "vie",
-            "très",
-            "pas",
-            "aussi",
-            "plus",
-            "comme",
-        }
+    async def get_new_links(links):
+        # one lookup for the whole page, stored articles are not downloaded again
+        existing = await Article.get_motor_collection().distinct(
+            "url", {"url": {"$in": links}}
+        )
+        return [link for link in links if link not in existing]
 
-        # Common words in Arabic articles (Arabic script)
-        dict_ar = {
-            "ال",
-            "في",
-            "على",
-            "من",
-            "إلى",
-            "مع",
-            "و",
-            "أو",
-            "لكن",
-            "لأن",
-            "هو",
-            "هي",
-            "نحن",
-            "أنتم",
-            "كان",
-            "يكون",
-            "قال",
-            "فعل",
-            "وقت",
-            "إنسان",
-            "يوم",
-            "عام",
-            "جدًا",
-            "ليس",
-            "أيضًا",
-        }
-        for word in content.split():
-            if word in dict_eng:
-                return Language.ENGLISH
-            elif word in dict_fr:
-                return Language.FRENCH
-            elif word in dict_ar:
-                return Language.ARABIC
-        return Language.UNKNOWN
+    # PREPROCESS
 
     def normalize_links(url, list_urls):
-        for link in list_urls:
-            if "https://" not in str(link):  #
-                link = url + str(link)  #
-        return list_urls
+        return [urljoin(url, link["href"]) for link in list_urls]
 
     def unify_date_mayadeen(date):
         month_dict = {
@@ -292,6 +189,8 @@ def crawler_1(myTimer: func.TimerRequest) -> None:
         else:
             scrape_link = link["href"]
         if scrape_link not in good_links:
+            # claimed now, so another category listing the same article skips it
+            good_links.add(scrape_link)
             title = str(title.text)
             summary = "Something big happened!"
             url = str(scrape_link)
@@ -301,115 +200,353 @@ def crawler_1(myTimer: func.TimerRequest) -> None:
             return (scrape_link, title, summary, url, publish_date)
         return False
 
-    def scrape_news(news_link):  # where ar is the article
-        # if news_link not in good_links:
-        article_html = requests.get(news_link)
+    async def scrape_news(client, semaphore, news_link):  # where ar is the article
+        article_html = await fetch(client, semaphore, news_link)
         article_tags = BeautifulSoup(article_html.text, "html.parser")
         content = article_tags.find("div", class_="bodyText bodyContentMainParent")
-        # dataset['Content'].append(str(content.text))
-        # dataset['Language'].append(get_language(content.text))
-        # dataset['Author'].append('Al Nahar')
-        content = str(content.text)
-        language = get_language(content)
-        good_links.add(news_link)
-        return content, language
-
-    # return "", Language.FRENCH
-
-    async def scrape_main_page(main_link):
-        html = requests.get(main_link)
+        title = article_tags.find("meta", property="og:title") or {}
+        if content is None:  # video and photo pages have no article text
+            return "", title.get("content", "")
+        return str(content.text), title.get("content", "")
+
+    async def scrape_alnahar_article(client, semaphore, meta):
+        (scrape_link, title_i, summary_i, url_i, publish_date_i) = meta
+        try:
+            content_i, _ = await scrape_news(client, semaphore, scrape_link)
+            if (
+                content_i != ""
+            ):  # checking if the content is null i.e. could be a vid photo ...
+                dataset.append(
+                    Article(
+                        id=ObjectId(),
+                        # it is gonna be 2 specific values one for annahar and
+                        # another for mayadeen
+                        source_id=ALNAHAR_SOURCE_ID,
+                        title=title_i,
+                        content=content_i,
+                        summary=summary_i,
+                        url=url_i,
+                        publish_date=publish_date_i,
+                        crawler="mayadeen_alnahar_crawler",
+                    )
+                )
+        except Exception as _:
+            garbage_links.add(scrape_link)
+
+    async def scrape_main_page(client, semaphore, main_link):
+        html = await fetch(client, semaphore, main_link)
         tags = BeautifulSoup(html.text, "html.parser")
 
         # we notice it is inside the tag div with class litingInfos:
         news = tags.find_all("div", class_="listingInfos")
 
+        metas = []
         for info in news:
-            # if get_link_add_meta_data_to_dataset(main_link, info) == False:
-            # #handling the case where the link is already visited
-            #     return False
-            (scrape_link, title_i, summary_i, url_i, publish_date_i) = (
-                get_link_add_meta_data_to_dataset(main_link, info)
-            )  #
             try:
-                # print("started scraping link: ", scrape_link)
-                content_i, language_i = scrape_news(scrape_link)
-                # print("successfully scraped the link")
-                if (
-                    content_i != ""
-                ):  # checking if the content is null i.e. could be a vid photo ...
-                    # print("appending to dataset")
-                    dataset.append(
-                        Article(
-                            id=ObjectId(),
-                            # it is gonna be 2 specific values one for annahar and
-                            # another for mayadeen
-                            source_id=UUID("f67322c8-069c-43a2-9097-6805d56dd436"),
-                            title=title_i,
-                            content=content_i,
-                            summary=summary_i,
-                            url=url_i,
-                            publish_date=publish_date_i,
-                            language=language_i,
-                            crawler="mayadeen_alnahar_crawler",
-                        )
-                    )
+                meta = get_link_add_meta_data_to_dataset(main_link, info)
             except Exception as _:
-                # print(scrape_link)
-                # print("failed")
-                garbage_links.add(scrape_link)
+                continue
+            if meta:  # False when the link is already visited
+                metas.append(meta)
+
+        new_links = set(await get_new_links([meta[0] for meta in metas]))
+        await asyncio.gather(
+            *(
+                scrape_alnahar_article(client, semaphore, meta)
+                for meta in metas
+                if meta[0] in new_links
+            )
+        )
 
     # FINAL:
-    async def scrape_alnahar(main_url):
+    async def scrape_alnahar(client, semaphore, main_url):
         some_error = []
-        main_pages = get_category_main_pages(main_url)
-        for main_page in main_pages:
+        main_pages = await get_category_main_pages(client, semaphore, main_url)
+
+        async def scrape_category(main_page):
             try:
-                main_page = main_url + main_page["href"]  #
-                await scrape_main_page(main_page)
+                await scrape_main_page(client, semaphore, main_page)
             except Exception as _:
                 some_error.append(main_page)
 
-    async def scrape_mayadeen_rss(xml):
-        xml_almayadeen = requests.get(xml)
+        # every category at once, their article downloads share the semaphore
+        await asyncio.gather(*(scrape_category(page) for page in main_pages))
+        if some_error:
+            logging.error(f"failed to scrape {len(some_error)} annahar pages")
+
+    # SITEMAP DISCOVERY:
+    # the sitemaps list every article with its last change, so only the sitemaps
+    # and articles that changed since the previous run are downloaded, instead of
+    # the menu and every category listing
+
+    def sitemap_lastmods():
+        return Article.get_motor_collection().database[SITEMAP_LASTMODS]
+
+    async def load_lastmods(urls):
+        cursor = sitemap_lastmods().find({"_id": {"$in": urls}})
+        return {document["_id"]: document["lastmod"] async for document in cursor}
+
+    def sitemap_failures():
+        return Article.get_motor_collection().database[SITEMAP_FAILURES]
+
+    async def load_failures(urls):
+        cursor = sitemap_failures().find({"_id": {"$in": urls}})
+        return {document["_id"]: document["failures"] async for document in cursor}
+
+    async def record_failures(failed, recovered):
+        if failed:
+            await sitemap_failures().bulk_write(
+                [
+                    UpdateOne({"_id": url}, {"$inc": {"failures": 1}}, upsert=True)
+                    for url in failed
+                ],
+                ordered=False,
+            )
+        if recovered:
+            await sitemap_failures().delete_many({"_id": {"$in": recovered}})
+
+    def parse_lastmod(lastmod):
+        try:
+            date = datetime.fromisoformat(lastmod)
+        except (TypeError, ValueError):
+            return None
+        return date if date.tzinfo else date.replace(tzinfo=UTC)
+
+    def is_stale(lastmod):
+        date = parse_lastmod(lastmod)
+        return date is not None and date < datetime.now(UTC) - SITEMAP_MAX_AGE
+
+    async def save_lastmods():
+        if lastmods:
+            await sitemap_lastmods().bulk_write(
+                [
+                    UpdateOne({"_id": url}, {"$set": {"lastmod": lastmod}}, upsert=True)
+                    for url, lastmod in lastmods.items()
+                ],
+                ordered=False,
+            )
+
+    def tag_text(tag, name):
+        found = tag.find(name)
+        return found.text.strip() if found is not None else None
+
+    def parse_sitemap(content):
+        # a sitemap index lists sitemaps, a sitemap (or news sitemap) lists urls
+        tags = BeautifulSoup(content, "lxml-xml")
+        sitemaps = [
+            (tag_text(sitemap, "loc"), tag_text(sitemap, "lastmod"))
+            for sitemap in tags.find_all("sitemap")
+        ]
+        urls = [
+            (
+                tag_text(url, "loc"),
+                tag_text(url, "lastmod") or tag_text(url, "publication_date"),
+                tag_text(url, "title"),
+                tag_text(url, "publication_date") or tag_text(url, "lastmod"),
+            )
+            for url in tags.find_all("url")
+        ]
+        return sitemaps, urls
+
+    async def read_sitemap(client, semaphore, sitemap_url):
+        """
+        Entries of the sitemap, following the sitemaps that changed, and
+        whether it listed anything at all.
+        """
+        sitemap = await fetch(client, semaphore, sitemap_url)
+        sitemaps, urls = parse_sitemap(sitemap.content)
+        known = await load_lastmods([loc for loc, _ in sitemaps])
+        changed = []
+        for loc, lastmod in sitemaps:
+            if not loc or (lastmod is not None and known.get(loc) == lastmod):
+                continue
+            if is_stale(lastmod):
+                # nothing it lists is recent enough to be scraped
+                sitemap_changes[loc] = lastmod
+                continue
+            changed.append((loc, lastmod))
+        listed = bool(sitemaps or urls)
+        read = await asyncio.gather(
+            *(read_sitemap(client, semaphore, loc) for loc, _ in changed)
+        )
+        for (loc, lastmod), (_, entries) in zip(changed, read, strict=True):
+            urls += entries
+            sitemap_urls[loc] = {entry[0] for entry in entries}
+            if lastmod is not None:
+                sitemap_changes[loc] = lastmod
+        return listed, urls
+
+    async def scrape_sitemap_article(client, semaphore, entry, changed):
+        url, lastmod, title, published = entry
+        try:
+            content, page_title = await scrape_news(client, semaphore, url)
+        except Exception as _:
+            garbage_links.add(url)
+            return
+        # only articles scraped get their lastmod, the others are tried again;
+        # pages with no text, like videos, are not scraped again either
+        if lastmod is not None:
+            lastmods[url] = lastmod
+        if content == "":
+            return
+        if changed:
+            updates.append(
+                UpdateOne(
+                    {"url": url},
+                    {"$set": {"content": content, "title": title or page_title}},
+                )
+            )
+            return
+        dataset.append(
+            Article(
+                id=ObjectId(),
+                source_id=ALNAHAR_SOURCE_ID,
+                title=title or page_title,
+                content=content,
+                summary="Something big happened!",
+                url=url,
+                publish_date=published or datetime.now(UTC),
+                crawler="mayadeen_alnahar_crawler",
+            )
+        )
+
+    async def scrape_alnahar_sitemap(client, semaphore, sitemap_url):
+        """
+        Scrape the articles that are new, or whose lastmod changed since it was
+        recorded; False when the sitemap lists nothing to go by.
+        """
+        listed, entries = await read_sitemap(client, semaphore, sitemap_url)
+        if not listed:
+            return False
+        entries = [
+            entry
+            for entry in entries
+            if entry[0] and entry[0] not in good_links and not is_stale(entry[1])
+        ]
+        urls = [entry[0] for entry in entries]
+        good_links.update(urls)
+        new_links = set(await get_new_links(urls))
+        known = await load_lastmods(urls)
+        failures = await load_failures(urls)
+
+        jobs = []
+        for entry in entries:
+            url, lastmod = entry[0], entry[1]
+            if failures.get(url, 0) >= MAX_ARTICLE_FAILURES:
+                continue
+            if url in new_links:
+                # pages with no text are not stored, their lastmod tells them apart
+                if lastmod is None or known.get(url) != lastmod:
+                    jobs.append((entry, False))
+            elif url in known and lastmod is not None and known[url] != lastmod:
+                jobs.append((entry, True))
+            elif url not in known and lastmod is not None:
+                # stored articles seen for the first time only get their lastmod
+                lastmods[url] = lastmod
+        oldest = datetime.min.replace(tzinfo=UTC)
+        jobs.sort(key=lambda job: parse_lastmod(job[0][1]) or oldest, reverse=True)
+        deferred.update(entry[0] for entry, _ in jobs[MAX_SITEMAP_ARTICLES:])
+        jobs = jobs[:MAX_SITEMAP_ARTICLES]
+        await asyncio.gather(
+            *(
+                scrape_sitemap_article(client, semaphore, entry, changed)
+                for entry, changed in jobs
+            )
+        )
+
+        scraped = [entry[0] for entry, _ in jobs]
+        await record_failures(
+            [url for url in scraped if url in garbage_links],
+            [url for url in scraped if url in failures and url not in garbage_links],
+        )
+        # a sitemap keeps its lastmod once its articles came or were given up on,
+        # otherwise it is read again to retry the failed and deferred ones
+        unfinished = garbage_links | deferred
+        for loc, lastmod in sitemap_changes.items():
+            if unfinished.isdisjoint(sitemap_urls.get(loc, ())):
+                lastmods[loc] = lastmod
+        logging.info(
+            f"annahar sitemap: {len(entries)} urls, {len(jobs)} new or changed, "
+            f"{len(deferred)} left for the next run"
+        )
+        return True
+
+    def get_mayadeen_content(html):
+        html_tags = BeautifulSoup(html, "html.parser")
+        content = html_tags.find("div", class_="p-content")
+        info = ""
+        if content is not None:
+            paragraphs = content.find_all(
+                "p", recursive=False
+            )  # recursive = False will take only p tags of depth 1
+            for paragraph in paragraphs:
+                info += paragraph.text.strip()
+        return info
+
+    async def scrape_mayadeen_article(client, semaphore, title, url, date):
+        try:
+            content_page = await fetch(client, semaphore, url)
+        except Exception as _:
+            garbage_links.add(url)
+            return
+        info = get_mayadeen_content(content_page.text)
+        dataset.append(
+            Article(
+                id=ObjectId(),
+                source_id=UUID(
+                    "8310fb18-4420-4cac-9330-9b178b8264dc"
+                ),  # 1 for mayadeen
+                title=title,
+                content=info,
+                summary="Something big happened!",
+                url=url,
+                publish_date=unify_date_mayadeen(date),
+                crawler="mayadeen_alnahar_crawler",
+            )
+        )
+
+    async def scrape_mayadeen_rss(client, semaphore, xml):
+        xml_almayadeen = await fetch(client, semaphore, xml)
         almayadeen_tags = BeautifulSoup(xml_almayadeen.content, "lxml-xml")
         news = almayadeen_tags.find_all("item")
+        items = []
         for info in news:
-            title = info.find("title").text
             url = info.find("link").text
             if url not in good_links:
-                date = info.find("pubDate").text
-
-                # let's scrape the content
-                content_page = requests.get(url)
-                html_tags = BeautifulSoup(content_page.text, "html.parser")
-                content = html_tags.find("div", class_="p-content")
-                info = ""
-                if content is not None:
-                    paragraphs = content.find_all(
-                        "p", recursive=False
-                    )  # recursive = False will take only p tags of depth 1
-                    for paragraph in paragraphs:
-                        info += paragraph.text.strip()
-                dataset.append(
-                    Article(
-                        id=ObjectId(),
-                        source_id=UUID(
-                            "8310fb18-4420-4cac-9330-9b178b8264dc"
-                        ),  # 1 for mayadeen
-                        title=title,
-                        content=info,
-                        summary="Something big happened!",
-                        url=url,
-                        publish_date=unify_date_mayadeen(date),
-                        language=get_language(info),
-                        crawler="mayadeen_alnahar_crawler",
-                    )
-                )
+                good_links.add(url)
+                items.append((info.find("title").text, url, info.find("pubDate").text))
+
+        new_links = set(await get_new_links([url for _, url, _ in items]))
+        await asyncio.gather(
+            *(
+                scrape_mayadeen_article(client, semaphore, title, url, date)
+                for title, url, date in items
+                if url in new_links
+            )
+        )
 
     xml = "https://www.almayadeen.net/feed.rss"
+    alnahar_sitemap = "https://www.annahar.com/sitemap.xml"
 
     async def add_to_db(dataset):  # the dataset is a list of articles
-        await dataset.save()
+        # every article of the run is labelled in one pass
+        languages = detect_languages([article.content for article in dataset])
+        for article, language in zip(dataset, languages, strict=True):
+            article.language = language
+        inserted = 0
+        for i in range(0, len(dataset), WRITE_BATCH_SIZE):
+            batch = dataset[i : i + WRITE_BATCH_SIZE]
+            try:
+                await Article.insert_many(batch, ordered=False)
+                inserted += len(batch)
+            except BulkWriteError as e:
+                # articles stored meanwhile fail on the unique url, the rest go in
+                inserted += e.details.get("nInserted", 0)
+        logging.info(f"inserted {inserted} of {len(dataset)} articles")
+        if updates:
+            await Article.get_motor_collection().bulk_write(updates, ordered=False)
+            logging.info(f"updated {len(updates)} changed articles")
+        await save_lastmods()
 
     # now the dataset has members of type Article so we need to initalize the beanie
     #  and start to add sstuff to the db
@@ -418,34 +555,52 @@ def crawler_1(myTimer: func.TimerRequest) -> None:
             # asynchrinous connecting:
             client = AsyncIOMotorClient(mongo_uri)
             db = client["my_db"]
-            article = db["articles"]
             await init_beanie(database=db, document_models=[Article])
             logging.info("Connected to the db successful init_beanie")
         except Exception as _:
             logging.error("error while establishing connection to the db")
-        # writing to db
-        # with each function directly adding to the db as we go i.e. in the functions
-        #  we will have an: await Article( ... ).insert()
-        # and at the end we will call this init() function to start running it
-        # using asyncio
-        try:
-            await scrape_mayadeen_rss(xml)
-            # now we have the dataset filled with al mayadeen articles
-            logging.info("successfully scraped mayadeen")
 
-        except Exception as e:
-            logging.error(f"{e} occured while scraping mayadeen")
+        semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+        limits = httpx.Limits(
+            max_connections=MAX_CONCURRENCY, max_keepalive_connections=MAX_CONCURRENCY
+        )
+        async with httpx.AsyncClient(
+            limits=limits, timeout=15.0, follow_redirects=True
+        ) as http_client:
+
+            async def mayadeen():
+                try:
+                    await scrape_mayadeen_rss(http_client, semaphore, xml)
+                    # now the dataset has al mayadeen articles
+                    logging.info("successfully scraped mayadeen")
+                except Exception as e:
+                    logging.error(f"{e} occured while scraping mayadeen")
+
+            async def alnahar():
+                try:
+                    logging.info("started scraping annahar")
+                    if await scrape_alnahar_sitemap(
+                        http_client, semaphore, alnahar_sitemap
+                    ):
+                        logging.info("successfully scraped alnahar sitemap")
+                        return
+                except Exception as e:
+                    logging.error(f"{e} occured while reading the annahar sitemap")
+                # without a usable sitemap, every category listing is scraped
+                try:
+                    await scrape_alnahar(
+                        http_client, semaphore, "https://www.annahar.com"
+                    )
+                    logging.info("successfully scraped alnahar")
+                except Exception as e:
+                    logging.error(f"{e} error occured while scraping alnahar")
 
-        try:
-            logging.info("started scraping annahar")
-            await scrape_alnahar("https://www.annahar.com")
-            logging.info("successfully scraped alnaha")
-        except Exception as e:
-            logging.error(f"{e} error occured while scraping alnahar")
+            # both sites are crawled at the same time
+            await asyncio.gather(mayadeen(), alnahar())
 
+        # writing to db, in batches once everything is scraped
         try:
-            for article in dataset:
-                await article.save()
+            await add_to_db(dataset)
         except Exception as _:
             logging.error("error adding to the mongo db")
 
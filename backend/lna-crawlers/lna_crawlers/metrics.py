@@ -0,0 +1,193 @@
+import bisect
+import logging
+import time
+from collections import deque
+from datetime import UTC, datetime
+
+from pydantic import BaseModel, Field
+
+from lna_crawlers.storage import ArticleInsertResult
+
+# upper bounds in seconds, an extra bucket catches everything slower
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram(BaseModel):
+    """Fixed-bucket histogram of observed durations."""
+
+    buckets: list[float] = Field(default_factory=lambda: list(LATENCY_BUCKETS))
+    counts: list[int] = Field(
+        default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1),
+        description="Observations per bucket, the last one above every bound.",
+    )
+    count: int = 0
+    total: float = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def merge(self, other: "Histogram") -> None:
+        self.counts = [a + b for a, b in zip(self.counts, other.counts, strict=True)]
+        self.count += other.count
+        self.total += other.total
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the `q` quantile, inf above them all."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts, strict=False):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class SourceMetrics(BaseModel):
+    """What crawling one source cost and produced."""
+
+    fetch_latency: Histogram = Field(
+        default_factory=Histogram,
+        description="Time of the HTTP requests, excluding the scheduler queue.",
+    )
+    bytes_downloaded: int = 0
+    status_counts: dict[str, int] = Field(
+        default_factory=dict,
+        description="Responses per HTTP status, 'error' for failed requests.",
+    )
+    parse_seconds: float = Field(
+        default=0.0, description="Time spent parsing feeds and extracting pages."
+    )
+    pages_parsed: int = 0
+    dedupe_checked: int = Field(
+        default=0, description="Articles checked against the stored ones."
+    )
+    dedupe_hits: int = Field(default=0, description="Articles already stored.")
+    inserted: int = 0
+    near_duplicates: int = 0
+    failed: int = 0
+    run_seconds: float = Field(
+        default=0.0, description="End-to-end time of the source's polls."
+    )
+
+    @property
+    def dedupe_hit_rate(self) -> float:
+        return self.dedupe_hits / self.dedupe_checked if self.dedupe_checked else 0.0
+
+    def merge(self, other: "SourceMetrics") -> None:
+        self.fetch_latency.merge(other.fetch_latency)
+        self.bytes_downloaded += other.bytes_downloaded
+        for status, count in other.status_counts.items():
+            self.status_counts[status] = self.status_counts.get(status, 0) + count
+        self.parse_seconds += other.parse_seconds
+        self.pages_parsed += other.pages_parsed
+        self.dedupe_checked += other.dedupe_checked
+        self.dedupe_hits += other.dedupe_hits
+        self.inserted += other.inserted
+        self.near_duplicates += other.near_duplicates
+        self.failed += other.failed
+        self.run_seconds += other.run_seconds
+
+
+class RunReport(BaseModel):
+    """Metrics of one crawler run, per source."""
+
+    started_at: datetime
+    finished_at: datetime
+    duration_seconds: float
+    sources: dict[str, SourceMetrics] = Field(default_factory=dict)
+
+    def log(self) -> None:
+        logging.info(
+            f"crawl run: {len(self.sources)} sources in {self.duration_seconds:.2f}s"
+        )
+        for name, source in sorted(self.sources.items()):
+            latency = source.fetch_latency
+            logging.info(
+                f"{name}: {latency.count} requests, p50 <= "
+                f"{latency.quantile(0.5)}s, p95 <= {latency.quantile(0.95)}s, "
+                f"{source.bytes_downloaded} bytes, status {source.status_counts}, "
+                f"parse {source.parse_seconds:.3f}s, dedupe hit rate "
+                f"{source.dedupe_hit_rate:.0%}, inserted {source.inserted} "
+                f"({source.near_duplicates} near-duplicates), "
+                f"failed {source.failed}, run {source.run_seconds:.2f}s"
+            )
+        # the whole report on one line, for log queries
+        logging.info(f"crawl run report: {self.model_dump_json()}")
+
+
+class CrawlMetrics:
+    """Collects the metrics of one crawler run."""
+
+    def __init__(self) -> None:
+        self.started_at = datetime.now(UTC)
+        self._started = time.monotonic()
+        self.sources: dict[str, SourceMetrics] = {}
+
+    def source(self, name: str) -> SourceMetrics:
+        return self.sources.setdefault(name, SourceMetrics())
+
+    def observe_fetch(
+        self, name: str, seconds: float, status: int | None, size: int = 0
+    ) -> None:
+        source = self.source(name)
+        source.fetch_latency.observe(seconds)
+        source.bytes_downloaded += size
+        key = str(status) if status is not None else "error"
+        source.status_counts[key] = source.status_counts.get(key, 0) + 1
+
+    def observe_parse(self, name: str, seconds: float) -> None:
+        source = self.source(name)
+        source.parse_seconds += seconds
+        source.pages_parsed += 1
+
+    def observe_dedupe(self, name: str, checked: int, hits: int) -> None:
+        source = self.source(name)
+        source.dedupe_checked += checked
+        source.dedupe_hits += hits
+
+    def observe_write(self, name: str, result: ArticleInsertResult) -> None:
+        """Count a write; skipped articles were duplicates the earlier checks missed."""
+        source = self.source(name)
+        source.inserted += result.inserted
+        source.near_duplicates += result.near_duplicates
+        source.failed += result.failed
+        source.dedupe_hits += result.skipped
+
+    def report(self) -> RunReport:
+        return RunReport(
+            started_at=self.started_at,
+            finished_at=datetime.now(UTC),
+            duration_seconds=time.monotonic() - self._started,
+            sources={
+                name: source.model_copy(deep=True)
+                for name, source in self.sources.items()
+            },
+        )
+
+
+class MetricsRegistry:
+    """In-process totals of every run, plus the reports of the latest runs."""
+
+    def __init__(self, keep_runs: int = 20) -> None:
+        self.runs: deque[RunReport] = deque(maxlen=keep_runs)
+        self.totals: dict[str, SourceMetrics] = {}
+
+    def record(self, report: RunReport) -> None:
+        self.runs.append(report)
+        for name, source in report.sources.items():
+            self.totals.setdefault(name, SourceMetrics()).merge(source)
+
+    @property
+    def last_run(self) -> RunReport | None:
+        return self.runs[-1] if self.runs else None
+
+
+registry = MetricsRegistry()
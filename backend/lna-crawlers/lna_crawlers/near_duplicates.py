@@ -0,0 +1,142 @@
+import hashlib
+import random
+import re
+from uuid import UUID
+
+from bson import Binary
+from lna_db.models.news import Article
+
+PERMUTATIONS = 64
+BANDS = 16
+ROWS = PERMUTATIONS // BANDS
+# estimated Jaccard similarity of the shingles above which articles are duplicates
+SIMILARITY = 0.8
+SHINGLE_SIZE = 3
+MIN_SHINGLES = 8
+
+# The shingle hashes are already uniform, so XOR with a random mask is enough of
+# a permutation, and much cheaper than a*h+b mod p. The seed is fixed since
+# signatures are stored: every process must use the same masks.
+_MASKS = [random.Random(1701 + i).getrandbits(64) for i in range(PERMUTATIONS)]
+
+# Arabic diacritics and tatweel, which outlets apply inconsistently
+_DIACRITICS = re.compile("[\u064b-\u0652\u0640]")
+_WORD = re.compile(r"\w+")
+
+
+def _shingle_hashes(text: str) -> set[int]:
+    words = _WORD.findall(_DIACRITICS.sub("", text).lower())
+    return {
+        int.from_bytes(
+            hashlib.blake2b(
+                " ".join(words[i : i + SHINGLE_SIZE]).encode(), digest_size=8
+            ).digest(),
+            "big",
+        )
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+
+
+def minhash(text: str) -> bytes | None:
+    """
+    MinHash signature of the word 3-grams of `text`, 4 bytes per
+    permutation, or None when the text is too short to compare.
+    """
+    hashes = _shingle_hashes(text)
+    if len(hashes) < MIN_SHINGLES:
+        return None
+    return b"".join(
+        (min(map(mask.__xor__, hashes)) & 0xFFFFFFFF).to_bytes(4, "big")
+        for mask in _MASKS
+    )
+
+
+def bands(signature: bytes) -> list[int]:
+    """Hash of each band of `signature`, tagged with the band's position."""
+    width = ROWS * 4
+    return [
+        band << 56
+        | int.from_bytes(
+            hashlib.blake2b(
+                signature[band * width : (band + 1) * width], digest_size=7
+            ).digest(),
+            "big",
+        )
+        for band in range(BANDS)
+    ]
+
+
+def similarity(a: bytes, b: bytes) -> float:
+    """Estimated Jaccard similarity of the texts behind two signatures."""
+    same = sum(a[i : i + 4] == b[i : i + 4] for i in range(0, len(a), 4))
+    return same / PERMUTATIONS
+
+
+def set_fingerprint(article: Article, signature: bytes | None) -> None:
+    if signature is not None:
+        article.minhash = signature
+        article.minhash_bands = bands(signature)
+
+
+def _as_uuid(value: object) -> UUID:
+    # raw documents hold UUIDs as binary unless the client sets a representation
+    if isinstance(value, Binary) and value.subtype == 4:
+        return value.as_uuid()
+    return value if isinstance(value, UUID) else UUID(str(value))
+
+
+async def link_near_duplicates(articles: list[Article]) -> int:
+    """
+    Fingerprint `articles` and point `duplicate_of` of each near-duplicate
+    at its canonical article, stored or earlier in the batch.
+
+    Candidates come from one lookup on the indexed `minhash_bands`: only
+    articles sharing a whole band, which unrelated texts practically never
+    do, are compared, however large the collection grows. Articles not
+    fingerprinted yet (the pipeline does it in the parser pool) are
+    fingerprinted here. Returns how many articles were linked.
+    """
+    fingerprinted = []
+    for article in articles:
+        if article.minhash is None:
+            set_fingerprint(article, minhash(article.content))
+        if article.minhash is not None:
+            fingerprinted.append(article)
+    if not fingerprinted:
+        return 0
+
+    wanted = {band for article in fingerprinted for band in article.minhash_bands}
+    cursor = Article.get_motor_collection().find(
+        {"minhash_bands": {"$in": list(wanted)}},
+        {"uuid": 1, "minhash": 1, "minhash_bands": 1, "duplicate_of": 1, "_id": 0},
+    )
+    # band -> (signature, canonical uuid) of the articles carrying it
+    index: dict[int, list[tuple[bytes, UUID]]] = {}
+    async for document in cursor:
+        canonical = _as_uuid(document.get("duplicate_of") or document["uuid"])
+        for band in document["minhash_bands"]:
+            index.setdefault(band, []).append((bytes(document["minhash"]), canonical))
+
+    linked = 0
+    for article in fingerprinted:
+        signature = article.minhash
+        assert signature is not None
+        candidates = {
+            candidate
+            for band in article.minhash_bands
+            for candidate in index.get(band, [])
+        }
+        best = max(
+            candidates,
+            key=lambda candidate: similarity(signature, candidate[0]),
+            default=None,
+        )
+        if best is not None and similarity(signature, best[0]) >= SIMILARITY:
+            article.duplicate_of = best[1]
+            linked += 1
+        # later articles of the batch are compared with this one too
+        for band in article.minhash_bands:
+            index.setdefault(band, []).append(
+                (signature, article.duplicate_of or article.uuid)
+            )
+    return linked
@@ -0,0 +1,218 @@
+import asyncio
+import functools
+import multiprocessing
+import time
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from types import TracebackType
+from typing import Any, Self, TypeVar
+
+import feedparser
+from lna_db.models.news import ExtractorConfig
+from lxml import etree, html
+
+T = TypeVar("T")
+
+# text nodes that BeautifulSoup's get_text() would have returned
+_VISIBLE_TEXT = etree.XPath(".//text()[not(ancestor::script) and not(ancestor::style)]")
+_FOLLOWING = etree.XPath("boolean(following::node())")
+
+
+def _literal(value: str) -> str:
+    return f'"{value}"' if "'" in value else f"'{value}'"
+
+
+def class_xpath(tag: str, css_class: str) -> str:
+    """
+    XPath equivalent of `soup.find(tag, class_=css_class)`.
+    Like BeautifulSoup, a class containing spaces must match the whole attribute,
+    while a single class matches any of the element's classes.
+    """
+    css_class = css_class.strip()
+    if " " in css_class:
+        predicate = f"normalize-space(@class) = {_literal(css_class)}"
+    else:
+        predicate = (
+            "contains(concat(' ', normalize-space(@class), ' '), "
+            f"{_literal(f' {css_class} ')})"
+        )
+    return f"(//{tag or '*'}[{predicate}])[1]"
+
+
+@functools.lru_cache(maxsize=128)
+def compile_xpath(expression: str) -> etree.XPath:
+    return etree.XPath(expression)
+
+
+def select_first(root: etree._Element, expression: str | None) -> Any:
+    """First node or string matched by the compiled `expression`, if any."""
+    if not expression:
+        return None
+    matches = compile_xpath(expression)(root)
+    if not isinstance(matches, list):
+        # string(), count() and the like return a single value
+        return matches or None
+    return matches[0] if matches else None
+
+
+def element_text(element: etree._Element) -> str:
+    """Stripped, newline separated text of `element`, like get_text(strip=True)."""
+    texts = (text.strip() for text in _VISIBLE_TEXT(element))
+    return "\n".join(text for text in texts if text)
+
+
+def parse_html(content: bytes, encoding: str | None = None) -> etree._Element:
+    parser = html.HTMLParser(encoding=encoding, remove_comments=True)
+    return html.document_fromstring(content, parser=parser)
+
+
+def _node_text(node: Any) -> str | None:
+    if node is None:
+        return None
+    if isinstance(node, etree._Element):
+        return element_text(node)
+    return str(node).strip() or None
+
+
+def extract_article(
+    content: bytes, encoding: str | None, extractor: ExtractorConfig
+) -> tuple[str | None, str | None, str | None]:
+    """
+    Extract the article text, image URL and publish date from a downloaded
+    page with the source's selectors, each compiled once per process. Runs in
+    the parser pool, so it only takes and returns picklable values.
+    """
+    return extract_from_tree(parse_html(content, encoding), extractor)
+
+
+def extract_from_tree(
+    root: etree._Element, extractor: ExtractorConfig
+) -> tuple[str | None, str | None, str | None]:
+    text = _node_text(select_first(root, extractor.content))
+    image_url = _node_text(select_first(root, extractor.image))
+    if image_url and not image_url.startswith(("http://", "https://")):
+        image_url = f"{extractor.image_prefix}{image_url}"
+    published = _node_text(select_first(root, extractor.date))
+    return text, image_url, published
+
+
+class PageStream:
+    """
+    Incremental parse of an article page while it downloads, so the download
+    can stop as soon as the article is complete: once the content element
+    has been closed and the image and date selectors have matched, or once
+    the source's `max_page_bytes` have been fed. Bytes past that point are
+    neither downloaded nor decoded.
+    """
+
+    def __init__(self, extractor: ExtractorConfig, encoding: str | None = None):
+        self.extractor = extractor
+        self.size = 0
+        self.complete = False
+        self.truncated = False
+        self.parse_seconds = 0.0
+        self._parser = etree.HTMLPullParser(
+            events=("end",), encoding=encoding, remove_comments=True
+        )
+        self._root: etree._Element | None = None
+
+    def feed(self, chunk: bytes) -> bool:
+        """Parse the next chunk, returning True once the rest is not needed."""
+        started = time.perf_counter()
+        room = self.extractor.max_page_bytes - self.size
+        if len(chunk) >= room:
+            chunk = chunk[:room]
+            self.truncated = True
+        self.size += len(chunk)
+        self._parser.feed(chunk)
+        element = None
+        for _, element in self._parser.read_events():
+            pass
+        if element is not None:
+            self._root = element.getroottree().getroot()
+            self.complete = self._is_complete(self._root)
+        self.parse_seconds += time.perf_counter() - started
+        return self.complete or self.truncated
+
+    def _is_complete(self, root: etree._Element) -> bool:
+        content = select_first(root, self.extractor.content)
+        # the parser only adds nodes after an element once it has been closed
+        if not isinstance(content, etree._Element) or not _FOLLOWING(content):
+            return False
+        return all(
+            select_first(root, expression) is not None
+            for expression in (self.extractor.image, self.extractor.date)
+            if expression
+        )
+
+    def result(self) -> tuple[str | None, str | None, str | None]:
+        """Extract the article from what was parsed, closing any open element."""
+        started = time.perf_counter()
+        root = self._parser.close()
+        extracted = extract_from_tree(root, self.extractor)
+        self.parse_seconds += time.perf_counter() - started
+        return extracted
+
+
+def parse_feed_entries(content: bytes) -> list[dict[str, Any]]:
+    """Parse an RSS/Atom body into the entry fields the crawler uses."""
+    feed = feedparser.parse(content)
+    return [
+        {key: entry.get(key) for key in ("title", "link", "published")}
+        for entry in feed.entries
+    ]
+
+
+class ParserPool:
+    """
+    Worker pool that keeps feed and HTML parsing off the event loop.
+    Processes are used by default since both parsers hold the GIL for most
+    of their work; threads can be used where processes are not possible.
+    Worker processes are spawned rather than forked: the Azure Functions
+    worker runs gRPC threads, and a forked child can deadlock on a lock one
+    of them held.
+    """
+
+    def __init__(self, max_workers: int | None = None, use_processes: bool = True):
+        self.max_workers = max_workers
+        self.use_processes = use_processes
+        self._executor: Executor | None = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.use_processes:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), fn, *args)
+
+    async def parse_feed(self, content: bytes) -> list[dict[str, Any]]:
+        return await self.run(parse_feed_entries, content)
+
+    async def extract_article(
+        self, content: bytes, encoding: str | None, extractor: ExtractorConfig
+    ) -> tuple[str | None, str | None, str | None]:
+        return await self.run(extract_article, content, encoding, extractor)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        self.shutdown()
@@ -0,0 +1,375 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from types import TracebackType
+from typing import Self
+
+import httpx
+from dateutil import parser
+from lna_db.core.language import detect_language
+from lna_db.models.news import Article, Source
+
+from lna_crawlers.archive import PageArchive
+from lna_crawlers.extractors import extractor_for
+from lna_crawlers.http_clients import HttpClientRegistry
+from lna_crawlers.metrics import CrawlMetrics
+from lna_crawlers.near_duplicates import minhash, set_fingerprint
+from lna_crawlers.parsing import PageStream, ParserPool
+from lna_crawlers.scheduler import CrawlScheduler
+from lna_crawlers.seen_urls import SeenUrlIndex
+from lna_crawlers.storage import ArticleInsertResult, insert_new_articles
+
+NO_CONTENT = "No content to be displayed."
+
+
+class _Job:
+    """An article travelling through the pipeline stages."""
+
+    def __init__(self, src: Source, article: Article, done: asyncio.Future[bool]):
+        self.src = src
+        self.article = article
+        self.done = done
+        self.content = b""
+        self.encoding: str | None = None
+        self.page: PageStream | None = None
+
+    def finish(self, ok: bool) -> None:
+        if not self.done.done():
+            self.done.set_result(ok)
+
+
+class IngestPipeline:
+    """
+    Streaming ingestion of crawled articles:
+
+        discover -> fetch -> extract -> dedupe -> write
+
+    Discovery (`get_feed`, `fetch_articles`) submits articles whose pages
+    are then downloaded, parsed and written in micro-batches as soon as they
+    are ready, instead of once the whole source has been crawled. Stages are
+    connected by bounded queues, so a slow stage makes the previous ones wait
+    and `submit` itself blocks when the pipeline is full.
+
+    With `stream_pages`, article pages are parsed while they download and
+    the download stops once the article is complete or the source's size
+    cap is reached; otherwise whole pages are downloaded and parsed in the
+    parser pool. Fetch, parse, dedupe and write figures of every source are
+    recorded in `metrics`. With an `archive`, every downloaded page is kept
+    for later re-extraction.
+    """
+
+    def __init__(
+        self,
+        clients: HttpClientRegistry,
+        scheduler: CrawlScheduler,
+        parsers: ParserPool,
+        seen: SeenUrlIndex,
+        fetch_workers: int = 16,
+        extract_workers: int = 4,
+        queue_size: int = 32,
+        batch_size: int = 20,
+        batch_interval: float = 2.0,
+        metrics: CrawlMetrics | None = None,
+        archive: PageArchive | None = None,
+        stream_pages: bool = True,
+    ) -> None:
+        self.clients = clients
+        self.scheduler = scheduler
+        self.parsers = parsers
+        self.seen = seen
+        self.fetch_workers = fetch_workers
+        self.extract_workers = extract_workers
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.metrics = metrics or CrawlMetrics()
+        self.archive = archive
+        self.stream_pages = stream_pages
+
+        self._fetch_queue: asyncio.Queue[_Job] = asyncio.Queue(queue_size)
+        self._extract_queue: asyncio.Queue[_Job] = asyncio.Queue(queue_size)
+        self._dedupe_queue: asyncio.Queue[_Job] = asyncio.Queue(queue_size)
+        self._write_queue: asyncio.Queue[_Job | None] = asyncio.Queue(queue_size)
+        self._pending_urls: set[str] = set()
+        self._workers: list[asyncio.Task[None]] = []
+        self._writer: asyncio.Task[None] | None = None
+
+    async def start(self) -> None:
+        self._workers = [
+            asyncio.create_task(self._fetch_worker()) for _ in range(self.fetch_workers)
+        ]
+        self._workers += [
+            asyncio.create_task(self._extract_worker())
+            for _ in range(self.extract_workers)
+        ]
+        self._workers.append(asyncio.create_task(self._dedupe_worker()))
+        self._writer = asyncio.create_task(self._write_worker())
+
+    async def close(self) -> None:
+        """Drain every stage in order, write the last batch and stop the workers."""
+        for queue in (self._fetch_queue, self._extract_queue, self._dedupe_queue):
+            await queue.join()
+        if self._writer is not None:
+            await self._write_queue.put(None)
+            await self._writer
+            self._writer = None
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def __aenter__(self) -> Self:
+        await self.start()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        await self.close()
+
+    async def fetch_url(
+        self, url: str, src: Source, headers: dict[str, str] | None = None
+    ) -> httpx.Response:
+        """GET `url` through the scheduler, queued fairly under the source's name."""
+        client = self.clients.get(url)
+
+        async def get() -> httpx.Response:
+            # timed once the scheduler lets the request go, queueing is not latency
+            started = time.perf_counter()
+            try:
+                response = await client.get(url, headers=headers)
+            except Exception:
+                self.metrics.observe_fetch(
+                    src.name, time.perf_counter() - started, None
+                )
+                raise
+            self.metrics.observe_fetch(
+                src.name,
+                time.perf_counter() - started,
+                response.status_code,
+                len(response.content),
+            )
+            return response
+
+        response = await self.scheduler.run(src.name, url, get)
+        response.raise_for_status()
+        return response
+
+    async def stream_page(self, job: _Job) -> None:
+        """
+        Download the job's page through the scheduler, parsing it as chunks
+        arrive, and close the response as soon as the article is complete.
+        The downloaded bytes are only kept when they are to be archived, in
+        which case the rest of the page is read up to the size cap.
+        """
+        src, url = job.src, job.article.url
+        extractor = extractor_for(src)
+        client = self.clients.get(url)
+
+        async def get() -> httpx.Response:
+            started = time.perf_counter()
+            status: int | None = None
+            downloaded = 0
+            page: PageStream | None = None
+            done = False
+            chunks: list[bytes] = []
+            try:
+                async with client.stream("GET", url) as response:
+                    status = response.status_code
+                    if response.is_success:
+                        page = PageStream(extractor, response.charset_encoding)
+                        async for chunk in response.aiter_bytes():
+                            downloaded += len(chunk)
+                            if not done:
+                                done = page.feed(chunk)
+                            if self.archive is None:
+                                if done:
+                                    break
+                            else:
+                                # an archived page is kept whole, to re-extract
+                                chunks.append(chunk)
+                                if downloaded >= extractor.max_page_bytes:
+                                    break
+            except Exception:
+                status = None
+                raise
+            finally:
+                parse_seconds = page.parse_seconds if page else 0.0
+                self.metrics.observe_fetch(
+                    src.name,
+                    time.perf_counter() - started - parse_seconds,
+                    status,
+                    downloaded,
+                )
+            job.page = page
+            job.content = b"".join(chunks)
+            job.encoding = response.charset_encoding
+            return response
+
+        response = await self.scheduler.run(src.name, url, get)
+        response.raise_for_status()
+
+    async def parse_feed(self, src: Source, content: bytes) -> list[dict]:
+        started = time.perf_counter()
+        entries = await self.parsers.parse_feed(content)
+        self.metrics.observe_parse(src.name, time.perf_counter() - started)
+        return entries
+
+    def already_seen(self, src: Source, url: str) -> bool:
+        """Whether the article at `url` is stored, counted in the dedupe metrics."""
+        seen = bool(url) and url in self.seen
+        self.metrics.observe_dedupe(src.name, 1, int(seen))
+        return seen
+
+    async def submit(self, src: Source, article: Article) -> asyncio.Future[bool]:
+        """
+        Queue `article` for ingestion, waiting while the pipeline is full.
+        The returned future resolves to whether the article made it to the
+        database (written, or already stored).
+        """
+        job = _Job(src, article, asyncio.get_running_loop().create_future())
+        # articles without a page to download go straight to the dedupe stage
+        queue = self._fetch_queue if article.url else self._dedupe_queue
+        await queue.put(job)
+        return job.done
+
+    async def _fetch_worker(self) -> None:
+        while True:
+            job = await self._fetch_queue.get()
+            try:
+                if self.stream_pages:
+                    await self.stream_page(job)
+                else:
+                    response = await self.fetch_url(job.article.url, job.src)
+                    job.content = response.content
+                    job.encoding = response.charset_encoding
+                if self.archive is not None:
+                    await self._archive(job)
+                await self._extract_queue.put(job)
+            except Exception as e:
+                print(f"Error in fetch_content ({job.src.name}): {e}")
+                job.finish(False)
+            finally:
+                self._fetch_queue.task_done()
+
+    async def _archive(self, job: _Job) -> None:
+        try:
+            await asyncio.to_thread(
+                self.archive.put,  # type: ignore
+                job.article.url,
+                job.src.name,
+                job.content,
+                job.encoding,
+            )
+        except Exception as e:
+            # the article is still worth writing without its archived page
+            logging.error(f"failed to archive {job.article.url}: {e}")
+
+    async def _extract_worker(self) -> None:
+        while True:
+            job = await self._extract_queue.get()
+            try:
+                await self._extract(job)
+                await self._dedupe_queue.put(job)
+            except Exception as e:
+                print(f"Error in fetch_content ({job.src.name}): {e}")
+                job.finish(False)
+            finally:
+                self._extract_queue.task_done()
+
+    async def _extract(self, job: _Job) -> None:
+        article, src = job.article, job.src
+        if job.page is not None:
+            # streamed pages are already parsed, up to where the article ends
+            content, image_url, published = job.page.result()
+            self.metrics.observe_parse(src.name, job.page.parse_seconds)
+            job.page = None
+        else:
+            # the page is parsed in the pool, the event loop only does the download
+            started = time.perf_counter()
+            content, image_url, published = await self.parsers.extract_article(
+                job.content, job.encoding, extractor_for(src)
+            )
+            self.metrics.observe_parse(src.name, time.perf_counter() - started)
+        job.content = b""
+        if image_url:
+            article.image_url = image_url
+        if published and article.publish_date == datetime.min:
+            # only when the feed did not date the entry
+            try:
+                article.publish_date = parser.parse(published)
+            except (ValueError, OverflowError):
+                pass
+        if article.title:
+            article.language = detect_language(article.title)
+        article.content = content or NO_CONTENT
+        if content:
+            set_fingerprint(article, await self.parsers.run(minhash, content))
+
+    async def _dedupe_worker(self) -> None:
+        while True:
+            job = await self._dedupe_queue.get()
+            try:
+                url = job.article.url
+                if url in self.seen or url in self._pending_urls:
+                    self.metrics.observe_dedupe(job.src.name, 0, 1)
+                    job.finish(True)
+                    continue
+                self._pending_urls.add(url)
+                await self._write_queue.put(job)
+            finally:
+                self._dedupe_queue.task_done()
+
+    async def _write_worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        batch: list[_Job] = []
+        deadline = 0.0
+        while True:
+            try:
+                timeout = max(deadline - loop.time(), 0) if batch else None
+                job = await asyncio.wait_for(self._write_queue.get(), timeout)
+            except TimeoutError:
+                await self._flush(batch)
+                batch = []
+                continue
+
+            self._write_queue.task_done()
+            if job is None:
+                await self._flush(batch)
+                return
+            if not batch:
+                deadline = loop.time() + self.batch_interval
+            batch.append(job)
+            if len(batch) >= self.batch_size:
+                await self._flush(batch)
+                batch = []
+
+    async def _flush(self, batch: list[_Job]) -> None:
+        by_source: dict[str, list[_Job]] = {}
+        for job in batch:
+            by_source.setdefault(job.src.name, []).append(job)
+
+        for name, jobs in by_source.items():
+            urls = [job.article.url for job in jobs]
+            try:
+                result = await insert_new_articles([job.article for job in jobs])
+            except Exception as e:
+                print(f"Error occured in adding to DB: {e}")
+                result = ArticleInsertResult(failed=len(jobs))
+            self.metrics.observe_write(name, result)
+            logging.info(
+                f"{name}: inserted {result.inserted} articles "
+                f"({result.near_duplicates} near-duplicates), "
+                f"skipped {result.skipped} duplicates, {result.failed} failed"
+            )
+
+            # after a clean write every url of the batch is stored, failed ones are
+            # left out of the index so that the next run retries them
+            if not result.failed:
+                self.seen.add_many(urls)
+            self._pending_urls.difference_update(urls)
+            for job in jobs:
+                job.finish(not result.failed)
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+
+from lna_db.models.news import FeedState
+from pydantic import BaseModel, Field
+
+from lna_crawlers.feed_state import as_utc
+
+
+class PollingPolicy(BaseModel):
+    """How the poll interval of a source follows its publish cadence."""
+
+    min_interval: timedelta = Field(
+        default=timedelta(minutes=2), description="Fastest a source is polled."
+    )
+    max_interval: timedelta = Field(
+        default=timedelta(hours=2), description="Slowest a source is polled."
+    )
+    initial_interval: timedelta = Field(
+        default=timedelta(minutes=10),
+        description="Interval used before anything is known about the source.",
+    )
+    cadence_fraction: float = Field(
+        default=0.5,
+        description="Poll interval as a fraction of the learned publish interval.",
+    )
+    smoothing: float = Field(
+        default=0.3, description="Weight of new observations in the cadence average."
+    )
+    quiet_growth: float = Field(
+        default=1.5, description="Interval growth factor after a poll with no news."
+    )
+    error_backoff: float = Field(
+        default=2.0, description="Interval growth factor per consecutive error."
+    )
+
+    def clamp(self, seconds: float) -> float:
+        return min(
+            max(seconds, self.min_interval.total_seconds()),
+            self.max_interval.total_seconds(),
+        )
+
+
+def is_due(state: FeedState, now: datetime) -> bool:
+    return state.next_poll_at is None or as_utc(state.next_poll_at) <= as_utc(now)
+
+
+def observe_publish_dates(
+    state: FeedState, dates: list[datetime], policy: PollingPolicy
+) -> None:
+    """
+    Fold the gaps between newly seen entries (and the newest entry of the
+    previous poll) into the smoothed publish interval of the source.
+    Must be called before the newest entry of `state` is updated.
+    """
+    points = sorted(as_utc(date) for date in dates)
+    if state.newest_entry_date is not None:
+        previous = as_utc(state.newest_entry_date)
+        points = [previous] + [point for point in points if point > previous]
+    for earlier, later in zip(points, points[1:], strict=False):
+        gap = (later - earlier).total_seconds()
+        if gap <= 0:
+            continue
+        if state.publish_interval_seconds is None:
+            state.publish_interval_seconds = gap
+        else:
+            state.publish_interval_seconds = (
+                policy.smoothing * gap
+                + (1 - policy.smoothing) * state.publish_interval_seconds
+            )
+
+
+def schedule_next_poll(
+    state: FeedState,
+    now: datetime,
+    policy: PollingPolicy,
+    found_new_entries: bool = False,
+    failed: bool = False,
+) -> None:
+    """Set `next_poll_at` from the outcome of the poll that just ran."""
+    current = state.poll_interval_seconds or policy.initial_interval.total_seconds()
+
+    if failed:
+        state.consecutive_errors += 1
+        interval = current * policy.error_backoff**state.consecutive_errors
+    else:
+        state.consecutive_errors = 0
+        if found_new_entries and state.publish_interval_seconds is not None:
+            interval = state.publish_interval_seconds * policy.cadence_fraction
+        elif found_new_entries:
+            interval = current
+        else:
+            interval = current * policy.quiet_growth
+        # the error backoff only delays the next poll, it is not learned
+        state.poll_interval_seconds = policy.clamp(interval)
+
+    state.next_poll_at = as_utc(now) + timedelta(seconds=policy.clamp(interval))
@@ -0,0 +1,148 @@
+"""
+Re-run the extractors over the page archive and update the stored articles,
+without any network access besides the database.
+
+    PAGE_ARCHIVE_DIR=... MONGODB_URI=... python -m lna_crawlers.reextract \
+        [--source mtv] [--since 2025-03-01] [--workers 4] [--dry-run]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+
+from dateutil import parser
+from lna_db.models.news import Article, ExtractorConfig, Source
+from pydantic import BaseModel
+from pymongo import UpdateOne
+
+from lna_crawlers.archive import ArchivedPage, PageArchive, read_blob
+from lna_crawlers.crawler import default_sources, init_db
+from lna_crawlers.extractors import extractor_for, load_extractors
+from lna_crawlers.near_duplicates import bands, minhash
+from lna_crawlers.parsing import ParserPool, extract_article
+
+
+class ReextractResult(BaseModel):
+    """Outcome of a re-extraction run."""
+
+    pages: int = 0
+    extracted: int = 0
+    updated: int = 0
+    skipped_sources: list[str] = []
+
+
+def reextract_page(
+    path: Path, encoding: str | None, extractor: ExtractorConfig
+) -> tuple[str | None, str | None, bytes | None]:
+    """Decompress and extract one archived page; runs in the parser pool."""
+    text, image_url, _ = extract_article(read_blob(path), encoding, extractor)
+    return text, image_url, minhash(text) if text else None
+
+
+def _update(
+    url: str, text: str, image_url: str | None, signature: bytes | None
+) -> UpdateOne:
+    fields: dict[str, object] = {"content": text}
+    if image_url:
+        fields["image_url"] = image_url
+    if signature is not None:
+        fields["minhash"] = signature
+        fields["minhash_bands"] = bands(signature)
+    return UpdateOne({"url": url}, {"$set": fields})
+
+
+async def reextract(
+    archive: PageArchive,
+    sources: dict[str, Source],
+    parsers: ParserPool,
+    source: str | None = None,
+    since: datetime | None = None,
+    batch_size: int = 500,
+    dry_run: bool = False,
+) -> ReextractResult:
+    """Re-extract the latest archived page of every URL into its article."""
+    result = ReextractResult()
+    pages = archive.pages(source=source, since=since)
+    result.pages = len(pages)
+
+    jobs: list[tuple[ArchivedPage, asyncio.Future[tuple]]] = []
+    for page in pages:
+        src = sources.get(page.source)
+        if src is None:
+            if page.source not in result.skipped_sources:
+                result.skipped_sources.append(page.source)
+            continue
+        future = parsers.run(
+            reextract_page,
+            archive.path(page.digest),
+            page.encoding,
+            extractor_for(src),
+        )
+        jobs.append((page, asyncio.ensure_future(future)))
+
+    updates = []
+    for page, future in jobs:
+        text, image_url, signature = await future
+        if not text:
+            continue
+        result.extracted += 1
+        updates.append(_update(page.url, text, image_url, signature))
+        if len(updates) >= batch_size:
+            result.updated += await _write(updates, dry_run)
+            updates = []
+    result.updated += await _write(updates, dry_run)
+    return result
+
+
+async def _write(updates: list[UpdateOne], dry_run: bool) -> int:
+    if not updates or dry_run:
+        return 0
+    written = await Article.get_motor_collection().bulk_write(updates, ordered=False)
+    return written.modified_count
+
+
+async def run(args: argparse.Namespace) -> ReextractResult:
+    await init_db()
+    await load_extractors()
+    sources = {src.name: src for src in default_sources().values()}
+    sources.update({src.name: src for src in await Source.find_all().to_list()})
+    with PageArchive(Path(args.archive)) as archive:
+        async with ParserPool(max_workers=args.workers) as parsers:
+            return await reextract(
+                archive,
+                sources,
+                parsers,
+                source=args.source,
+                since=parser.parse(args.since) if args.since else None,
+                dry_run=args.dry_run,
+            )
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument(
+        "--archive", default=os.environ.get("PAGE_ARCHIVE_DIR"), required=False
+    )
+    arg_parser.add_argument("--source", help="only re-extract this source")
+    arg_parser.add_argument("--since", help="only pages fetched since this date")
+    arg_parser.add_argument("--workers", type=int, default=None)
+    arg_parser.add_argument("--dry-run", action="store_true")
+    args = arg_parser.parse_args()
+    if not args.archive:
+        arg_parser.error("--archive or PAGE_ARCHIVE_DIR is required")
+
+    result = asyncio.run(run(args))
+    logging.info(
+        f"re-extracted {result.extracted}/{result.pages} archived pages, "
+        f"updated {result.updated} articles"
+    )
+    if result.skipped_sources:
+        logging.warning(f"no extractor for sources {result.skipped_sources}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+from urllib.parse import urlsplit
+
+from pydantic import BaseModel, Field
+
+T = TypeVar("T")
+
+
+class SchedulerStats(BaseModel):
+    """Counters describing how requests moved through a `CrawlScheduler`."""
+
+    submitted: int = 0
+    completed: int = 0
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    total_wait_seconds: float = Field(
+        default=0.0, description="Sum of the time requests spent queued."
+    )
+    max_wait_seconds: float = 0.0
+
+    @property
+    def mean_wait_seconds(self) -> float:
+        started = self.completed + self.in_flight
+        return self.total_wait_seconds / started if started else 0.0
+
+
+class _Request:
+    def __init__(self, host: str, future: asyncio.Future[None]) -> None:
+        self.host = host
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class CrawlScheduler:
+    """
+    Bounded-concurrency gate for crawler requests.
+
+    Requests are queued per `queue_key` (the source name) and granted in
+    round-robin order across keys, so a source with many slow pages cannot
+    starve the others. A request only starts when the global cap, the
+    per-host cap and the minimum delay between two requests to the same host
+    all allow it.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        per_host_concurrency: int = 2,
+        min_host_interval: float = 0.25,
+    ) -> None:
+        self.max_concurrency = max_concurrency
+        self.per_host_concurrency = per_host_concurrency
+        self.min_host_interval = min_host_interval
+        self.stats = SchedulerStats()
+        self._queues: dict[str, deque[_Request]] = {}
+        self._round_robin: deque[str] = deque()
+        self._host_active: dict[str, int] = {}
+        self._host_next_start: dict[str, float] = {}
+        self._wakeup: asyncio.TimerHandle | None = None
+
+    async def run(self, queue_key: str, url: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Wait for a slot for `url`, then await `fn()` while holding it."""
+        request = _Request(
+            host=urlsplit(url).netloc.lower(),
+            future=asyncio.get_running_loop().create_future(),
+        )
+        queue = self._queues.get(queue_key)
+        if queue is None:
+            queue = self._queues[queue_key] = deque()
+            self._round_robin.append(queue_key)
+        queue.append(request)
+        self.stats.submitted += 1
+        self._dispatch()
+
+        try:
+            await request.future
+        except asyncio.CancelledError:
+            if request.future.done() and not request.future.cancelled():
+                # the slot was granted right before the cancellation
+                self._release(request.host)
+            else:
+                queue.remove(request)
+                self.stats.submitted -= 1
+            raise
+
+        try:
+            return await fn()
+        finally:
+            self._release(request.host)
+
+    def _release(self, host: str) -> None:
+        self.stats.in_flight -= 1
+        self.stats.completed += 1
+        self._host_active[host] -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        now = time.monotonic()
+        next_ready: float | None = None
+
+        # keep granting while there are free slots and some queue can make progress
+        progressed = True
+        while progressed and self.stats.in_flight < self.max_concurrency:
+            progressed = False
+            for _ in range(len(self._round_robin)):
+                key = self._round_robin[0]
+                self._round_robin.rotate(-1)
+                queue = self._queues[key]
+                if not queue:
+                    continue
+                head = queue[0]
+                if self._host_active.get(head.host, 0) >= self.per_host_concurrency:
+                    continue
+                ready_at = self._host_next_start.get(head.host, 0.0)
+                if ready_at > now:
+                    next_ready = (
+                        ready_at if next_ready is None else min(next_ready, ready_at)
+                    )
+                    continue
+
+                queue.popleft()
+                self._grant(head, now)
+                progressed = True
+                if self.stats.in_flight >= self.max_concurrency:
+                    break
+
+        # drop keys whose queues drained so the round robin stays short
+        for key in [key for key, queue in self._queues.items() if not queue]:
+            del self._queues[key]
+            self._round_robin.remove(key)
+
+        if next_ready is None:
+            return
+        loop = asyncio.get_running_loop()
+        wake_at = loop.time() + (next_ready - now)
+        if self._wakeup is not None:
+            if self._wakeup.when() <= wake_at:
+                return
+            self._wakeup.cancel()
+        self._wakeup = loop.call_at(wake_at, self._on_wakeup)
+
+    def _on_wakeup(self) -> None:
+        self._wakeup = None
+        self._dispatch()
+
+    def _grant(self, request: _Request, now: float) -> None:
+        self._host_active[request.host] = self._host_active.get(request.host, 0) + 1
+        self._host_next_start[request.host] = now + self.min_host_interval
+
+        stats = self.stats
+        stats.in_flight += 1
+        stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+        waited = now - request.enqueued_at
+        stats.total_wait_seconds += waited
+        stats.max_wait_seconds = max(stats.max_wait_seconds, waited)
+        request.future.set_result(None)
+
+    def log_stats(self) -> None:
+        stats = self.stats
+        logging.info(
+            f"crawl scheduler: {stats.completed} requests, peak in flight "
+            f"{stats.peak_in_flight}/{self.max_concurrency}, mean queue wait "
+            f"{stats.mean_wait_seconds:.3f}s, max queue wait "
+            f"{stats.max_wait_seconds:.3f}s"
+        )
@@ -0,0 +1,68 @@
+import logging
+from collections.abc import Iterable
+from datetime import UTC, datetime, timedelta
+
+from lna_db.models.news import Article
+
+from lna_crawlers.feed_state import as_utc
+
+# longest time between an article being built and written
+WRITE_DELAY = timedelta(minutes=10)
+
+
+class SeenUrlIndex:
+    """
+    In-memory set of article URLs that are already stored, checked before a
+    page is downloaded so that repeated feed entries cost nothing.
+
+    The index is warmed from the `articles` collection, limited to articles
+    created within `window`: feeds only list recent entries, and anything
+    older that shows up again is still caught by the database dedupe. An
+    index kept across crawler runs drops the URLs that left the window on
+    every warm-up, so it does not grow for the life of the process.
+    """
+
+    def __init__(self, window: timedelta = timedelta(days=14)) -> None:
+        self.window = window
+        # creation time of each URL's article
+        self._urls: dict[str, datetime] = {}
+        self._warmed_at: datetime | None = None
+
+    async def warm(self) -> int:
+        """
+        Load the URLs of the articles created within `window`, or only of
+        those created since the previous warm-up when the index is kept
+        across crawler runs, and forget the ones created before `window`.
+        """
+        now = datetime.now(UTC)
+        since = now - self.window
+        if self._warmed_at is not None:
+            # articles are dated when built, a while before they are written
+            since = max(since, self._warmed_at - WRITE_DELAY)
+        cursor = Article.get_motor_collection().find(
+            {"created_at": {"$gte": since}}, {"url": 1, "created_at": 1, "_id": 0}
+        )
+        async for document in cursor:
+            self._urls[document["url"]] = as_utc(document["created_at"])
+        oldest = now - self.window
+        self._urls = {
+            url: created_at
+            for url, created_at in self._urls.items()
+            if created_at >= oldest
+        }
+        self._warmed_at = now
+        logging.info(f"seen url index warmed with {len(self._urls)} urls")
+        return len(self._urls)
+
+    def add(self, url: str) -> None:
+        self._urls[url] = datetime.now(UTC)
+
+    def add_many(self, urls: Iterable[str]) -> None:
+        now = datetime.now(UTC)
+        self._urls.update((url, now) for url in urls)
+
+    def __contains__(self, url: object) -> bool:
+        return url in self._urls
+
+    def __len__(self) -> int:
+        return len(self._urls)
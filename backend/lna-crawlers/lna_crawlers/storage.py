@@ -0,0 +1,64 @@
+import logging
+
+from lna_db.models.news import Article
+from pydantic import BaseModel, Field
+from pymongo.errors import BulkWriteError
+
+from lna_crawlers.near_duplicates import link_near_duplicates
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class ArticleInsertResult(BaseModel):
+    """Outcome of writing a batch of crawled articles."""
+
+    inserted: int = 0
+    skipped: int = 0
+    failed: int = 0
+    near_duplicates: int = Field(
+        default=0, description="New articles linked to a canonical article."
+    )
+
+
+async def insert_new_articles(articles: list[Article]) -> ArticleInsertResult:
+    """
+    Insert the articles whose URL is not stored yet, in two round trips:
+    one `$in` lookup of the existing URLs and one unordered `insert_many`.
+    Articles inserted concurrently by another writer hit the unique index on
+    `Article.url` and are counted as skipped rather than failed.
+    New articles are linked to the stored articles they nearly duplicate.
+    """
+    result = ArticleInsertResult()
+
+    # keep the first article of each URL, later ones in the batch are repeats
+    by_url: dict[str, Article] = {}
+    for article in articles:
+        by_url.setdefault(article.url, article)
+    result.skipped += len(articles) - len(by_url)
+    if not by_url:
+        return result
+
+    existing_urls = await Article.get_motor_collection().distinct(
+        "url", {"url": {"$in": list(by_url)}}
+    )
+    for url in existing_urls:
+        del by_url[url]
+    result.skipped += len(existing_urls)
+    if not by_url:
+        return result
+    result.near_duplicates = await link_near_duplicates(list(by_url.values()))
+
+    try:
+        await Article.insert_many(list(by_url.values()), ordered=False)
+        result.inserted += len(by_url)
+    except BulkWriteError as e:
+        write_errors = e.details.get("writeErrors", [])
+        duplicates = sum(
+            1 for error in write_errors if error.get("code") == DUPLICATE_KEY_ERROR
+        )
+        result.inserted += e.details.get("nInserted", 0)
+        result.skipped += duplicates
+        result.failed += len(write_errors) - duplicates
+        if result.failed:
+            logging.error(f"failed to insert {result.failed} articles: {e}")
+    return result
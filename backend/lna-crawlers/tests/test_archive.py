@@ -0,0 +1,73 @@
+import tempfile
+import unittest
+from datetime import UTC, datetime
+from pathlib import Path
+from uuid import UUID
+
+from lna_crawlers.archive import PageArchive
+from lna_crawlers.parsing import ParserPool
+from lna_crawlers.reextract import reextract
+from lna_db.db.mock_db import init_test_db, make_article, mongomock_bulk_update
+from lna_db.models.news import Article, Source
+
+PAGE = '<html><body><p class="_paragraphs">النص الكامل {}</p></body></html>'
+
+
+class TestPageArchive(unittest.IsolatedAsyncioTestCase):
+    """Test the raw page archive and re-extraction from it."""
+
+    async def asyncSetUp(self) -> None:
+        await init_test_db(Article, Source)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.archive = PageArchive(Path(directory.name))
+        self.addCleanup(self.archive.close)
+        self.enterContext(mongomock_bulk_update())
+
+    def test_content_addressed(self) -> None:
+        """Identical bodies are stored once, every fetch is indexed."""
+        body = PAGE.format(1).encode()
+        first = self.archive.put(
+            "https://a.com/1", "mtv", body, "utf-8", datetime(2025, 3, 1, tzinfo=UTC)
+        )
+        second = self.archive.put(
+            "https://a.com/1", "mtv", body, "utf-8", datetime(2025, 3, 2, tzinfo=UTC)
+        )
+        self.archive.put("https://a.com/2", "lbci", b"<html></html>")
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.archive.get(first), body)
+        self.assertEqual(len(list(self.archive.objects.rglob("*.zst"))), 2)
+        latest = self.archive.latest("https://a.com/1")
+        assert latest is not None
+        self.assertEqual(latest.fetched_at, datetime(2025, 3, 2, tzinfo=UTC))
+        self.assertEqual(len(self.archive.pages()), 2)
+        self.assertEqual(len(self.archive.pages(source="mtv")), 1)
+        self.assertEqual(
+            len(self.archive.pages(since=datetime(2025, 3, 3, tzinfo=UTC))), 1
+        )
+
+    async def test_reextract_updates_articles(self) -> None:
+        """A fixed content selector is applied to the archived pages."""
+        src = Source(
+            uuid=UUID(int=2),
+            name="mtv",
+            url="https://mtv.com.lb/api",
+            content_html_key=("p", "_paragraphs"),
+        )
+        for i in range(3):
+            url = f"https://mtv.com.lb/{i}"
+            await make_article(url, source_id=src.uuid, content="No content").insert()
+            self.archive.put(url, "mtv", PAGE.format(i).encode(), "utf-8")
+        self.archive.put("https://other.com/1", "other", b"<html></html>")
+
+        async with ParserPool(use_processes=False) as parsers:
+            result = await reextract(self.archive, {"mtv": src}, parsers)
+
+        self.assertEqual(result.pages, 4)
+        self.assertEqual(result.extracted, 3)
+        self.assertEqual(result.updated, 3)
+        self.assertEqual(result.skipped_sources, ["other"])
+        article = await Article.find_one(Article.url == "https://mtv.com.lb/1")
+        assert article is not None
+        self.assertEqual(article.content, "النص الكامل 1")
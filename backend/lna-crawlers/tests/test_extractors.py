@@ -0,0 +1,67 @@
+import unittest
+from uuid import UUID
+
+from lna_crawlers.extractors import EXTRACTORS, extractor_for, load_extractors
+from lna_crawlers.parsing import extract_article
+from lna_db.db.mock_db import init_test_db
+from lna_db.models.news import ExtractorConfig, Source
+
+PAGE = """
+<html><body>
+<figure class="article-image"><a href="https://almanar.com.lb/1.jpg">x</a></figure>
+<div class="article_details_image_container"><img src="/images/1.jpg"></div>
+<div class="body main"><p>النص</p></div>
+<span class="when">2025-03-25 09:35</span>
+</body></html>
+""".encode()
+
+
+class TestExtractors(unittest.IsolatedAsyncioTestCase):
+    """Test the extractor registry keyed by source."""
+
+    async def asyncSetUp(self) -> None:
+        await init_test_db(Source)
+        self.registered = dict(EXTRACTORS)
+        self.addCleanup(self.restore_registry)
+
+    def restore_registry(self) -> None:
+        EXTRACTORS.clear()
+        EXTRACTORS.update(self.registered)
+
+    def make_source(self, name: str, **kwargs: object) -> Source:
+        return Source(
+            uuid=UUID(int=len(name)),
+            name=name,
+            url=f"https://{name}.com/rss",
+            content_html_key=("div", "body"),
+            **kwargs,  # type: ignore
+        )
+
+    def test_builtin_extractors(self) -> None:
+        """Known sources get their image selector, content comes from the key."""
+        for name, image in (
+            ("almanar", "https://almanar.com.lb/1.jpg"),
+            ("aljadeed", "www.aljadeed.tv/images/1.jpg"),
+            ("mtv", None),
+        ):
+            extractor = extractor_for(self.make_source(name))
+            self.assertEqual(
+                extract_article(PAGE, "utf-8", extractor), ("النص", image, None)
+            )
+
+    async def test_extractor_loaded_from_source_document(self) -> None:
+        """A source configured in the database needs no code change."""
+        await self.make_source(
+            "annahar",
+            extractor=ExtractorConfig(
+                content="//div[@class='body main']/p",
+                date="//span[@class='when']",
+            ),
+        ).insert()
+
+        self.assertEqual(await load_extractors(), 1)
+        extractor = extractor_for(self.make_source("annahar"))
+        self.assertEqual(
+            extract_article(PAGE, "utf-8", extractor),
+            ("النص", None, "2025-03-25 09:35"),
+        )
@@ -0,0 +1,74 @@
+import unittest
+import uuid
+from datetime import UTC, datetime
+
+import httpx
+from lna_crawlers.feed_state import (
+    conditional_headers,
+    feed_changed,
+    record_newest_entry,
+    take_new_entries,
+)
+from lna_db.models.news import FeedState
+
+
+def url_and_date(entry: tuple[str, datetime | None]) -> tuple[str, datetime | None]:
+    return entry
+
+
+class TestFeedState(unittest.TestCase):
+    """Test the conditional GET helpers of the crawler."""
+
+    def setUp(self) -> None:
+        self.state = FeedState.model_construct(
+            source_id=uuid.UUID(int=0),
+            etag=None,
+            last_modified=None,
+            body_hash=None,
+            newest_entry_url=None,
+            newest_entry_date=None,
+        )
+
+    def test_conditional_headers(self) -> None:
+        """Only the validators we already have are sent."""
+        self.assertEqual(conditional_headers(self.state), {})
+        self.state.etag = '"abc"'
+        self.state.last_modified = "Tue, 25 Mar 2025 09:35:09 GMT"
+        self.assertEqual(
+            conditional_headers(self.state),
+            {
+                "If-None-Match": '"abc"',
+                "If-Modified-Since": "Tue, 25 Mar 2025 09:35:09 GMT",
+            },
+        )
+
+    def test_feed_changed(self) -> None:
+        """304s and identical bodies short-circuit, new bodies update the state."""
+        not_modified = httpx.Response(304)
+        self.assertFalse(feed_changed(self.state, not_modified))
+
+        response = httpx.Response(200, content=b"<rss/>", headers={"ETag": '"v1"'})
+        self.assertTrue(feed_changed(self.state, response))
+        self.assertEqual(self.state.etag, '"v1"')
+        self.assertIsNotNone(self.state.body_hash)
+
+        same_body = httpx.Response(200, content=b"<rss/>")
+        self.assertFalse(feed_changed(self.state, same_body))
+
+    def test_take_new_entries(self) -> None:
+        """Entries at or before the newest processed one are dropped."""
+        entries = [
+            ("https://a.com/3", datetime(2025, 3, 25, 12, tzinfo=UTC)),
+            ("https://a.com/2", datetime(2025, 3, 25, 11, tzinfo=UTC)),
+            ("https://a.com/1", datetime(2025, 3, 25, 10, tzinfo=UTC)),
+        ]
+        self.assertEqual(take_new_entries(self.state, entries, url_and_date), entries)
+
+        record_newest_entry(self.state, entries[1:])
+        self.assertEqual(self.state.newest_entry_url, "https://a.com/2")
+        # mongo returns naive datetimes, comparisons must still work
+        self.state.newest_entry_date = datetime(2025, 3, 25, 11)
+
+        self.assertEqual(
+            take_new_entries(self.state, entries, url_and_date), entries[:1]
+        )
@@ -0,0 +1,97 @@
+import asyncio
+import unittest
+import uuid
+from datetime import timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+from lna_crawlers import crawler
+from lna_crawlers.leases import LeaseManager
+from lna_db.db.mock_db import init_test_db
+from lna_db.models.news import Article, CrawlLease, FeedState, Source
+
+
+class TestLeaseManager(unittest.IsolatedAsyncioTestCase):
+    """Test the Mongo leases that split sources between crawler instances."""
+
+    async def asyncSetUp(self) -> None:
+        await init_test_db(CrawlLease, Article, Source, FeedState)
+        self.first = LeaseManager(owner="first")
+        self.second = LeaseManager(owner="second")
+
+    async def test_exclusive(self) -> None:
+        """Only one instance holds a lease, the holder may claim it again."""
+        self.assertTrue(await self.first.acquire("almanar"))
+        self.assertFalse(await self.second.acquire("almanar"))
+        self.assertTrue(await self.first.acquire("almanar"))
+        self.assertTrue(await self.second.acquire("mtv"))
+        self.assertEqual(self.first.held, {"almanar"})
+
+        await self.first.release("almanar")
+        self.assertTrue(await self.second.acquire("almanar"))
+        self.assertEqual(await CrawlLease.count(), 2)
+
+    async def test_expired_lease_is_taken_over(self) -> None:
+        """An owner that stopped heartbeating loses its lease once it expires."""
+        stale = LeaseManager(owner="stale", ttl=timedelta(seconds=-1))
+        self.assertTrue(await stale.acquire("almanar"))
+        self.assertTrue(await self.second.acquire("almanar"))
+
+        lease = await CrawlLease.find_one(CrawlLease.key == "almanar")
+        self.assertEqual(lease.owner, "second")  # type: ignore
+
+        # the stale owner notices on its next heartbeat, and cannot release it
+        await stale.renew()
+        self.assertEqual(stale.held, set())
+        self.assertEqual(stale.lost, {"almanar"})
+        await stale.release("almanar")
+        self.assertFalse(await self.first.acquire("almanar"))
+
+    async def test_heartbeat_keeps_lease(self) -> None:
+        """Leases held across many heartbeats are never taken over."""
+        async with LeaseManager(
+            owner="busy",
+            ttl=timedelta(milliseconds=150),
+            heartbeat_interval=timedelta(milliseconds=20),
+        ) as busy:
+            self.assertTrue(await busy.acquire("almanar"))
+            await asyncio.sleep(0.4)
+            self.assertFalse(await self.second.acquire("almanar"))
+        # leases are released on close
+        self.assertTrue(await self.second.acquire("almanar"))
+
+    async def test_crawl_skips_leased_sources(self) -> None:
+        """A run polls only the sources no other instance is crawling."""
+        sources = list(crawler.default_sources().values())
+        self.assertTrue(await self.second.acquire("mtv"))
+        with patch.object(crawler, "get_feed", AsyncMock()) as get_feed:
+            async with self.first as leases:
+                await crawler.crawl(sources, leases=leases)
+        polled = {call.args[0].name for call in get_feed.await_args_list}
+        self.assertEqual(polled, {"almanar", "aljadeed"})
+        self.assertEqual(self.first.held, set())
+        self.assertEqual(await CrawlLease.count(), 1)
+
+    async def test_poll_stops_when_lease_is_lost(self) -> None:
+        """A poll whose lease was taken over submits nothing more and saves nothing."""
+        src = crawler.default_sources()[uuid.UUID(int=0)]
+        self.assertTrue(await self.first.acquire(src.name))
+
+        async def fetch_url(*args: object, **kwargs: object) -> httpx.Response:
+            # the heartbeat finds the lease gone while the feed downloads
+            self.first.held.discard(src.name)
+            self.first.lost.add(src.name)
+            return httpx.Response(200, content=b"<rss/>")
+
+        pipeline = MagicMock()
+        pipeline.fetch_url = fetch_url
+        pipeline.parse_feed = AsyncMock(
+            return_value=[{"title": "t", "link": "https://a.com/1", "published": None}]
+        )
+        pipeline.already_seen.return_value = False
+        pipeline.submit = AsyncMock()
+
+        await crawler.get_feed(src, 10, pipeline, leases=self.first)
+
+        pipeline.submit.assert_not_awaited()
+        self.assertEqual(await FeedState.count(), 0)
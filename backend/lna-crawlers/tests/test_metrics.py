@@ -0,0 +1,53 @@
+import unittest
+
+from lna_crawlers.metrics import CrawlMetrics, Histogram, MetricsRegistry
+from lna_crawlers.storage import ArticleInsertResult
+
+
+class TestCrawlMetrics(unittest.TestCase):
+    """Test the per-source run metrics and the registry."""
+
+    def test_histogram(self) -> None:
+        histogram = Histogram()
+        for value in (0.05, 0.2, 0.3, 0.4, 3.0, 30.0):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.count, 6)
+        self.assertEqual(histogram.counts[0], 1)
+        self.assertEqual(histogram.counts[-1], 1)
+        self.assertEqual(histogram.quantile(0.5), 0.5)
+        self.assertEqual(histogram.quantile(0.95), float("inf"))
+        self.assertAlmostEqual(histogram.mean, 33.95 / 6)
+
+    def test_report(self) -> None:
+        metrics = CrawlMetrics()
+        metrics.observe_fetch("mtv", 0.2, 200, 1000)
+        metrics.observe_fetch("mtv", 0.4, 200, 500)
+        metrics.observe_fetch("mtv", 5.0, None)
+        metrics.observe_parse("mtv", 0.01)
+        metrics.observe_dedupe("mtv", 4, 1)
+        metrics.observe_write("mtv", ArticleInsertResult(inserted=2, skipped=1))
+
+        report = metrics.report()
+        source = report.sources["mtv"]
+        self.assertEqual(source.bytes_downloaded, 1500)
+        self.assertEqual(source.status_counts, {"200": 2, "error": 1})
+        self.assertEqual(source.inserted, 2)
+        self.assertEqual(source.dedupe_hit_rate, 0.5)
+
+        # the report is a snapshot, later observations do not change it
+        metrics.observe_fetch("mtv", 0.1, 200)
+        self.assertEqual(report.sources["mtv"].fetch_latency.count, 3)
+
+    def test_registry_totals(self) -> None:
+        registry = MetricsRegistry(keep_runs=1)
+        for _ in range(2):
+            metrics = CrawlMetrics()
+            metrics.observe_fetch("almanar", 0.3, 200, 10)
+            registry.record(metrics.report())
+
+        self.assertEqual(len(registry.runs), 1)
+        self.assertEqual(registry.totals["almanar"].bytes_downloaded, 20)
+        self.assertEqual(registry.totals["almanar"].fetch_latency.count, 2)
+        assert registry.last_run is not None
+        self.assertIn("almanar", registry.last_run.sources)
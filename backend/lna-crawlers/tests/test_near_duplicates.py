@@ -0,0 +1,80 @@
+import unittest
+
+from lna_crawlers.near_duplicates import (
+    SIMILARITY,
+    bands,
+    link_near_duplicates,
+    minhash,
+    similarity,
+)
+from lna_crawlers.storage import insert_new_articles
+from lna_db.db.mock_db import init_test_db, make_article
+from lna_db.models.news import Article
+
+WIRE = (
+    "استقبل رئيس الجمهورية في قصر بعبدا وفدا من البرلمان الأوروبي وبحث معه "
+    "التطورات في الجنوب والوضع الاقتصادي وملف النازحين السوريين، وأكد ضرورة "
+    "دعم الجيش اللبناني وتطبيق القرار ١٧٠١ بكل مندرجاته ووقف الاعتداءات "
+    "الإسرائيلية المتكررة على القرى الحدودية، كما عرض الوفد برنامج المساعدات "
+    "المخصص للبنان خلال العام المقبل وسبل تعزيز التعاون بين الجانبين. "
+    "وكان الوفد قد زار في وقت سابق رئيس مجلس النواب في عين التينة حيث جرى "
+    "عرض للأوضاع العامة والمستجدات السياسية والتشريعية، ثم انتقل إلى السراي "
+    "الحكومي للقاء رئيس الحكومة الذي شدد على أهمية الإصلاحات المالية المطلوبة "
+    "من صندوق النقد الدولي وعلى التزام الحكومة إعادة هيكلة القطاع المصرفي "
+    "وإقرار قانون استقلالية القضاء قبل نهاية الدورة التشريعية الحالية"
+)
+# the same wire story as republished by another outlet
+REPUBLISHED = WIRE.replace("استقبل", "اِستقبل") + " (الوكالة الوطنية للإعلام)"
+OTHER = (
+    "أعلنت وزارة الطاقة عن زيادة ساعات التغذية الكهربائية في بيروت والمناطق "
+    "ابتداء من الأسبوع المقبل بعد وصول شحنة الفيول العراقي إلى معمل دير عمار "
+    "وتفريغها، على أن يستمر العمل بالبرنامج الجديد حتى نهاية الشهر الحالي"
+)
+
+
+class TestNearDuplicates(unittest.IsolatedAsyncioTestCase):
+    """Test MinHash fingerprints and the banded near-duplicate lookup."""
+
+    async def asyncSetUp(self) -> None:
+        await init_test_db(Article)
+
+    def test_fingerprints(self) -> None:
+        wire, republished, other = minhash(WIRE), minhash(REPUBLISHED), minhash(OTHER)
+        assert wire is not None and republished is not None and other is not None
+        self.assertGreaterEqual(similarity(wire, republished), SIMILARITY)
+        self.assertLess(similarity(wire, other), 0.1)
+        self.assertIsNone(minhash("خبر عاجل"))
+        # unrelated texts share no band, so they are never even compared
+        self.assertFalse(set(bands(wire)) & set(bands(other)))
+
+    async def test_insert_links_to_canonical(self) -> None:
+        """A republished story points at the first stored copy."""
+        await insert_new_articles([make_article("https://a.com/1", content=WIRE)])
+        original = await Article.find_one(Article.url == "https://a.com/1")
+        assert original is not None
+
+        result = await insert_new_articles(
+            [
+                make_article("https://b.com/1", content=REPUBLISHED),
+                make_article("https://b.com/2", content=OTHER),
+                make_article("https://c.com/1", content=REPUBLISHED + " "),
+            ]
+        )
+
+        self.assertEqual(result.inserted, 3)
+        self.assertEqual(result.near_duplicates, 2)
+        for url in ("https://b.com/1", "https://c.com/1"):
+            article = await Article.find_one(Article.url == url)
+            assert article is not None
+            self.assertEqual(article.duplicate_of, original.uuid)
+        other = await Article.find_one(Article.url == "https://b.com/2")
+        assert other is not None
+        self.assertIsNone(other.duplicate_of)
+
+    async def test_batch_links_within_itself(self) -> None:
+        first = make_article("https://a.com/1", content=WIRE)
+        second = make_article("https://b.com/1", content=REPUBLISHED)
+
+        self.assertEqual(await link_near_duplicates([first, second]), 1)
+        self.assertIsNone(first.duplicate_of)
+        self.assertEqual(second.duplicate_of, first.uuid)
@@ -0,0 +1,117 @@
+import unittest
+from unittest.mock import patch
+
+from bs4 import BeautifulSoup
+from lna_crawlers import parsing
+from lna_crawlers.parsing import (
+    PageStream,
+    ParserPool,
+    class_xpath,
+    extract_article,
+    parse_feed_entries,
+)
+from lna_db.models.news import ExtractorConfig
+
+PAGE = """
+<html><head><script>var x = "not content";</script></head><body>
+<figure class="article-image main"><a href="https://almanar.com.lb/1.jpg">
+<img src="/thumb.jpg"></a></figure>
+<div class="article_details_image_container"><img src="/images/1.jpg"></div>
+<div class="LongDesc text-title-9">
+  <p>الفقرة الأولى</p>
+  <!-- a comment -->
+  <script>ignored()</script>
+  <p>  second <b>paragraph</b> </p>
+</div>
+<p class="_pragraphs other">mtv body</p>
+<time datetime="2025-03-25T09:35:09Z">25 March</time>
+</body></html>
+""".encode()
+
+RSS = b"""<?xml version="1.0"?><rss version="2.0"><channel><title>t</title>
+<item><title>first</title><link>https://a.com/1</link>
+<pubDate>Tue, 25 Mar 2025 09:35:09 GMT</pubDate></item>
+<item><title>second</title><link>https://a.com/2</link></item>
+</channel></rss>"""
+
+
+def worker_was_forked() -> bool:
+    return hasattr(parsing, "forked_from_test")
+
+
+class TestParsing(unittest.IsolatedAsyncioTestCase):
+    """Test the lxml based extraction against the BeautifulSoup behaviour."""
+
+    def test_extract_matches_beautifulsoup(self) -> None:
+        """The extracted text is the same as soup.find(...).get_text(...)."""
+        soup = BeautifulSoup(PAGE.decode(), "html.parser")
+        for key in (("div", "LongDesc text-title-9"), ("p", "_pragraphs")):
+            expected = soup.find(key[0], class_=key[1]).get_text(  # type: ignore
+                strip=True, separator="\n"
+            )
+            extractor = ExtractorConfig(content=class_xpath(*key))
+            text, _, _ = extract_article(PAGE, "utf-8", extractor)
+            self.assertEqual(text, expected)
+
+    def test_extract_image_and_date(self) -> None:
+        """Relative image URLs get the prefix, missing selectors give None."""
+        extractor = ExtractorConfig(
+            content=class_xpath("p", "_pragraphs"),
+            image="//div[@class='article_details_image_container']//img/@src",
+            image_prefix="www.aljadeed.tv",
+            date="//time/@datetime",
+        )
+        text, image, published = extract_article(PAGE, "utf-8", extractor)
+        self.assertEqual(text, "mtv body")
+        self.assertEqual(image, "www.aljadeed.tv/images/1.jpg")
+        self.assertEqual(published, "2025-03-25T09:35:09Z")
+
+        extractor = ExtractorConfig(content=class_xpath("div", "missing"))
+        self.assertEqual(extract_article(PAGE, "utf-8", extractor), (None, None, None))
+
+    def test_page_stream_stops_once_complete(self) -> None:
+        """Feeding stops after the content and the later date have been parsed."""
+        extractor = ExtractorConfig(
+            content=class_xpath("div", "LongDesc text-title-9"),
+            date="//time/@datetime",
+        )
+        page = PAGE.replace(b"</body></html>", b"<script>" + b"x" * 5000 + b"</script>")
+        stream = PageStream(extractor, "utf-8")
+        fed = 0
+        for start in range(0, len(page), 256):
+            fed += 1
+            if stream.feed(page[start : start + 256]):
+                break
+        self.assertTrue(stream.complete)
+        # the content ends halfway through the page, the date right after it
+        self.assertLess(stream.size, len(PAGE) + 256)
+        self.assertGreater(stream.size, PAGE.index(b"<time"))
+        self.assertEqual(stream.result(), extract_article(PAGE, "utf-8", extractor))
+
+    def test_page_stream_size_cap(self) -> None:
+        extractor = ExtractorConfig(
+            content=class_xpath("div", "missing"), max_page_bytes=100
+        )
+        stream = PageStream(extractor, "utf-8")
+        self.assertTrue(stream.feed(PAGE))
+        self.assertTrue(stream.truncated)
+        self.assertFalse(stream.complete)
+        self.assertEqual(stream.size, 100)
+
+    async def test_pool_parses_feed(self) -> None:
+        """The pool returns the plain entry fields used by the crawler."""
+        async with ParserPool(max_workers=1, use_processes=False) as parsers:
+            entries = await parsers.parse_feed(RSS)
+        self.assertEqual(entries, parse_feed_entries(RSS))
+        self.assertEqual(entries[0]["link"], "https://a.com/1")
+        self.assertIsNone(entries[1]["published"])
+
+    async def test_pool_spawns_worker_processes(self) -> None:
+        """Workers are spawned, not forked from the threaded Functions worker."""
+        # a forked worker would inherit this attribute, a spawned one imports anew
+        with patch.object(parsing, "forked_from_test", True, create=True):
+            async with ParserPool(max_workers=1) as parsers:
+                entries = await parsers.parse_feed(RSS)
+                forked = await parsers.run(worker_was_forked)
+        self.assertEqual(entries, parse_feed_entries(RSS))
+        self.assertFalse(forked)
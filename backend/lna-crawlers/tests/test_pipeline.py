@@ -0,0 +1,186 @@
+import tempfile
+import unittest
+from collections.abc import AsyncIterator
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+from uuid import UUID
+
+import httpx
+from lna_crawlers.archive import PageArchive
+from lna_crawlers.http_clients import HttpClientRegistry
+from lna_crawlers.parsing import ParserPool
+from lna_crawlers.pipeline import NO_CONTENT, IngestPipeline
+from lna_crawlers.scheduler import CrawlScheduler
+from lna_crawlers.seen_urls import SeenUrlIndex
+from lna_db.db.mock_db import init_test_db, make_article
+from lna_db.models.news import Article, ExtractorConfig, Source
+
+PAGE = '<html><body><div class="c">نص المقال %s</div></body></html>'
+# scripts and markup after the article, sent in chunks of 1 KB
+TRAILER_CHUNKS = 100
+
+
+async def long_page(path: str) -> AsyncIterator[bytes]:
+    yield (PAGE % path).replace("</body></html>", "").encode()
+    for _ in range(TRAILER_CHUNKS):
+        yield b"<script>" + b"x" * 1007 + b"</script>"
+
+
+def handler(request: httpx.Request) -> httpx.Response:
+    if request.url.path.startswith("/missing"):
+        return httpx.Response(404)
+    if request.url.path.startswith("/long"):
+        return httpx.Response(
+            200,
+            content=long_page(request.url.path),
+            headers={"content-type": "text/html; charset=utf-8"},
+        )
+    return httpx.Response(
+        200,
+        content=(PAGE % request.url.path).encode(),
+        headers={"content-type": "text/html; charset=utf-8"},
+    )
+
+
+def build_client(self: HttpClientRegistry) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+class TestIngestPipeline(unittest.IsolatedAsyncioTestCase):
+    """Test articles streaming from submission to the database."""
+
+    async def asyncSetUp(self) -> None:
+        await init_test_db(Article, Source)
+        self.src = Source(
+            uuid=UUID(int=1),
+            name="almanar",
+            url="https://a.com/rss",
+            content_html_key=("div", "c"),
+        )
+        self.seen = SeenUrlIndex()
+        patcher = patch.object(HttpClientRegistry, "_build_client", build_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def ingest(self, urls: list[str], **kwargs: Any) -> list[bool]:
+        async with (
+            HttpClientRegistry() as clients,
+            ParserPool(use_processes=False) as parsers,
+            IngestPipeline(
+                clients,
+                CrawlScheduler(min_host_interval=0),
+                parsers,
+                self.seen,
+                **kwargs,
+            ) as pipeline,
+        ):
+            articles = [
+                make_article(
+                    url,
+                    source_id=self.src.uuid,
+                    title="عنوان الخبر",
+                    content=NO_CONTENT,
+                )
+                for url in urls
+            ]
+            done = [await pipeline.submit(self.src, article) for article in articles]
+            self.pipeline = pipeline
+        return [future.result() for future in done]
+
+    async def test_articles_are_extracted_and_written(self) -> None:
+        """Every page is downloaded, extracted and written in batches."""
+        urls = [f"https://a.com/{i}" for i in range(7)]
+
+        written = await self.ingest(urls, queue_size=2, batch_size=3)
+
+        self.assertEqual(written, [True] * 7)
+        self.assertEqual(await Article.count(), 7)
+        article = await Article.find_one(Article.url == "https://a.com/3")
+        assert article is not None
+        self.assertEqual(article.content, "نص المقال /3")
+        metrics = self.pipeline.metrics.source("almanar")
+        self.assertEqual(metrics.inserted, 7)
+        self.assertEqual(metrics.pages_parsed, 7)
+        self.assertEqual(metrics.status_counts, {"200": 7})
+        self.assertIn("https://a.com/6", self.seen)
+
+    async def test_repeated_and_seen_urls_are_skipped(self) -> None:
+        """URLs already stored or already in flight are not written twice."""
+        self.seen.add("https://a.com/1")
+
+        written = await self.ingest(
+            ["https://a.com/1", "https://a.com/2", "https://a.com/2"]
+        )
+
+        self.assertEqual(written, [True, True, True])
+        self.assertEqual(await Article.count(), 1)
+        self.assertEqual(self.pipeline.metrics.source("almanar").dedupe_hits, 2)
+
+    async def test_failed_download_is_reported(self) -> None:
+        """A page that cannot be downloaded resolves its future to False."""
+        written = await self.ingest(["https://a.com/missing", "https://a.com/1"])
+
+        self.assertEqual(written, [False, True])
+        self.assertEqual(await Article.count(), 1)
+        self.assertNotIn("https://a.com/missing", self.seen)
+        metrics = self.pipeline.metrics.source("almanar")
+        self.assertEqual(metrics.status_counts, {"404": 1, "200": 1})
+
+    async def test_streamed_download_stops_after_article(self) -> None:
+        """The rest of a page is not downloaded once its article is complete."""
+        # no image selector to wait for, unlike the registered almanar extractor
+        self.src.extractor = ExtractorConfig()
+        for stream_pages, expected_chunks in ((True, 2), (False, TRAILER_CHUNKS + 1)):
+            await Article.delete_all()
+            self.seen = SeenUrlIndex()
+
+            written = await self.ingest(
+                ["https://a.com/long"], stream_pages=stream_pages
+            )
+
+            self.assertEqual(written, [True])
+            article = await Article.find_one(Article.url == "https://a.com/long")
+            assert article is not None
+            self.assertEqual(article.content, "نص المقال /long")
+            metrics = self.pipeline.metrics.source("almanar")
+            self.assertLessEqual(
+                metrics.bytes_downloaded, expected_chunks * 1024, stream_pages
+            )
+            self.assertGreater(
+                metrics.bytes_downloaded, (expected_chunks - 1) * 1024, stream_pages
+            )
+
+    async def test_archived_page_is_downloaded_in_full(self) -> None:
+        """A streamed page is not cut short when it is to be archived."""
+        self.src.extractor = ExtractorConfig()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        archive = PageArchive(Path(directory.name))
+        self.addCleanup(archive.close)
+
+        written = await self.ingest(["https://a.com/long"], archive=archive)
+
+        self.assertEqual(written, [True])
+        body = b"".join([chunk async for chunk in long_page("/long")])
+        self.assertEqual(
+            self.pipeline.metrics.source("almanar").bytes_downloaded, len(body)
+        )
+        page = archive.latest("https://a.com/long")
+        assert page is not None
+        self.assertEqual(archive.get(page.digest), body)
+
+    async def test_streamed_download_is_capped(self) -> None:
+        """A page is cut at the source's size cap and extracted from what came."""
+        self.src.extractor = ExtractorConfig(
+            content="//div[@class='c']//text()[1]", max_page_bytes=4096
+        )
+        # the content selector never proves complete, only the cap stops reading
+        written = await self.ingest(["https://a.com/long"])
+
+        self.assertEqual(written, [True])
+        metrics = self.pipeline.metrics.source("almanar")
+        self.assertLessEqual(metrics.bytes_downloaded, 5 * 1024)
+        article = await Article.find_one(Article.url == "https://a.com/long")
+        assert article is not None
+        self.assertEqual(article.content, "نص المقال /long")
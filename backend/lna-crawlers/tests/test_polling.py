@@ -0,0 +1,102 @@
+import unittest
+import uuid
+from datetime import UTC, datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+from lna_crawlers import crawler
+from lna_crawlers.polling import (
+    PollingPolicy,
+    is_due,
+    observe_publish_dates,
+    schedule_next_poll,
+)
+from lna_db.db.mock_db import init_test_db
+from lna_db.models.news import FeedState
+
+NOW = datetime(2025, 3, 25, 12, tzinfo=UTC)
+
+
+class TestPolling(unittest.IsolatedAsyncioTestCase):
+    """Test how the poll interval follows a source's publish cadence."""
+
+    async def asyncSetUp(self) -> None:
+        await init_test_db(FeedState)
+        self.policy = PollingPolicy()
+        self.state = FeedState(source_id=uuid.UUID(int=0))
+
+    def test_new_state_is_due(self) -> None:
+        """A source that was never polled is due right away."""
+        self.assertTrue(is_due(self.state, NOW))
+        schedule_next_poll(self.state, NOW, self.policy)
+        self.assertFalse(is_due(self.state, NOW))
+        # naive datetimes from mongo are read as UTC
+        self.state.next_poll_at = datetime(2025, 3, 25, 11)
+        self.assertTrue(is_due(self.state, NOW))
+
+    def test_hot_source_is_polled_often(self) -> None:
+        """The interval tracks a fraction of the learned publish interval."""
+        dates = [NOW - timedelta(minutes=10 * i) for i in range(4)]
+        observe_publish_dates(self.state, dates, self.policy)
+        self.assertEqual(self.state.publish_interval_seconds, 600)
+
+        schedule_next_poll(self.state, NOW, self.policy, found_new_entries=True)
+        self.assertEqual(self.state.poll_interval_seconds, 300)
+        self.assertEqual(self.state.next_poll_at, NOW + timedelta(minutes=5))
+
+    def test_quiet_source_backs_off_up_to_max(self) -> None:
+        """Polls without news grow the interval until the configured maximum."""
+        for _ in range(20):
+            schedule_next_poll(self.state, NOW, self.policy)
+        self.assertEqual(
+            self.state.poll_interval_seconds,
+            self.policy.max_interval.total_seconds(),
+        )
+
+    def test_errors_back_off_without_changing_the_learned_interval(self) -> None:
+        """Consecutive errors delay the next poll exponentially."""
+        schedule_next_poll(self.state, NOW, self.policy, found_new_entries=True)
+        interval = self.state.poll_interval_seconds
+        assert interval is not None
+        schedule_next_poll(self.state, NOW, self.policy, failed=True)
+        schedule_next_poll(self.state, NOW, self.policy, failed=True)
+
+        self.assertEqual(self.state.consecutive_errors, 2)
+        self.assertEqual(self.state.poll_interval_seconds, interval)
+        self.assertEqual(self.state.next_poll_at, NOW + timedelta(seconds=interval * 4))
+
+        schedule_next_poll(self.state, NOW, self.policy, found_new_entries=True)
+        self.assertEqual(self.state.consecutive_errors, 0)
+
+
+class TestFailedPoll(unittest.IsolatedAsyncioTestCase):
+    """Test that a poll that failed is retried against the same feed body."""
+
+    async def asyncSetUp(self) -> None:
+        await init_test_db(FeedState)
+
+    async def test_failed_poll_keeps_previous_validators(self) -> None:
+        src = crawler.default_sources()[uuid.UUID(int=0)]
+        response = httpx.Response(
+            200,
+            content=b"<rss/>",
+            headers={"ETag": '"v2"'},
+            request=httpx.Request("GET", src.url),
+        )
+        pipeline = MagicMock()
+        pipeline.fetch_url = AsyncMock(return_value=response)
+        pipeline.parse_feed = AsyncMock(side_effect=[ValueError("bad feed"), []])
+
+        await crawler.get_feed(src, 10, pipeline)
+        state = await FeedState.find_one(FeedState.source_id == src.uuid)
+        self.assertIsNone(state.etag)  # type: ignore
+        self.assertIsNone(state.body_hash)  # type: ignore
+        self.assertEqual(state.consecutive_errors, 1)  # type: ignore
+
+        # the retry fetches the same body and processes it this time
+        with patch.object(crawler, "is_due", return_value=True):
+            await crawler.get_feed(src, 10, pipeline)
+        self.assertEqual(pipeline.parse_feed.await_count, 2)
+        self.assertEqual(pipeline.fetch_url.await_args.kwargs["headers"], {})
+        state = await FeedState.find_one(FeedState.source_id == src.uuid)
+        self.assertEqual(state.etag, '"v2"')  # type: ignore
@@ -0,0 +1,55 @@
+import asyncio
+import unittest
+import uuid
+from unittest.mock import AsyncMock, patch
+
+from lna_crawlers import crawler
+from lna_crawlers.extractors import EXTRACTORS, extractor_for
+from lna_db.db.mock_db import init_test_db
+from lna_db.models.news import Article, ExtractorConfig, Source
+
+
+class TestCrawlerRuntime(unittest.TestCase):
+    """Test the crawler state kept across timer ticks."""
+
+    def setUp(self) -> None:
+        self.registered = dict(EXTRACTORS)
+        self.addCleanup(self.restore_registry)
+
+    def restore_registry(self) -> None:
+        EXTRACTORS.clear()
+        EXTRACTORS.update(self.registered)
+
+    async def init_db(self) -> None:
+        await init_test_db(Article, Source)
+
+    def test_database_set_up_once_per_loop(self) -> None:
+        runtime = crawler.CrawlerRuntime()
+
+        async def ticks(count: int) -> None:
+            for _ in range(count):
+                await runtime.ready()
+
+        with patch.object(
+            crawler, "init_db", AsyncMock(side_effect=self.init_db)
+        ) as init:
+            asyncio.run(ticks(3))
+            self.assertEqual(init.await_count, 1)
+            # a Motor client cannot be used from another loop, it is set up again
+            asyncio.run(ticks(1))
+            self.assertEqual(init.await_count, 2)
+        self.assertIs(runtime.archive, None)
+
+    def test_stored_extractor_used_by_crawl(self) -> None:
+        """An extractor saved on a source document applies from the next tick."""
+        src = crawler.default_sources()[uuid.UUID(int=0)]
+        stored = ExtractorConfig(content="//div[@class='body']//text()")
+
+        async def tick() -> None:
+            await self.init_db()
+            await src.model_copy(update={"extractor": stored}).insert()
+            await crawler.CrawlerRuntime().ready()
+
+        with patch.object(crawler, "init_db", AsyncMock()):
+            asyncio.run(tick())
+        self.assertEqual(extractor_for(src), stored)
@@ -0,0 +1,82 @@
+import asyncio
+import unittest
+
+from lna_crawlers.scheduler import CrawlScheduler
+
+
+class TestCrawlScheduler(unittest.IsolatedAsyncioTestCase):
+    """Test the limits and fairness of the CrawlScheduler."""
+
+    async def test_global_and_per_host_limits(self) -> None:
+        """In-flight requests never exceed the global or per-host caps."""
+        scheduler = CrawlScheduler(
+            max_concurrency=3, per_host_concurrency=2, min_host_interval=0
+        )
+        active: dict[str, int] = {}
+        peak_per_host: dict[str, int] = {}
+
+        async def fake_fetch(host: str) -> str:
+            active[host] = active.get(host, 0) + 1
+            peak_per_host[host] = max(peak_per_host.get(host, 0), active[host])
+            await asyncio.sleep(0.01)
+            active[host] -= 1
+            return host
+
+        def submit(source: str, host: str) -> asyncio.Future[str]:
+            url = f"https://{host}/page"
+            return asyncio.ensure_future(
+                scheduler.run(source, url, lambda: fake_fetch(host))
+            )
+
+        tasks = [submit("a", "a.com") for _ in range(6)]
+        tasks += [submit("b", "b.com") for _ in range(6)]
+        results = await asyncio.gather(*tasks)
+
+        self.assertEqual(len(results), 12)
+        self.assertEqual(scheduler.stats.peak_in_flight, 3)
+        self.assertLessEqual(max(peak_per_host.values()), 2)
+        self.assertEqual(scheduler.stats.completed, 12)
+        self.assertEqual(scheduler.stats.in_flight, 0)
+
+    async def test_round_robin_between_sources(self) -> None:
+        """A source with a long backlog does not delay another source's requests."""
+        scheduler = CrawlScheduler(
+            max_concurrency=1, per_host_concurrency=1, min_host_interval=0
+        )
+        order: list[str] = []
+
+        async def record(source: str) -> None:
+            order.append(source)
+            await asyncio.sleep(0)
+
+        slow = [
+            asyncio.ensure_future(
+                scheduler.run("slow", f"https://slow.com/{i}", lambda: record("slow"))
+            )
+            for i in range(5)
+        ]
+        fast = asyncio.ensure_future(
+            scheduler.run("fast", "https://fast.com/1", lambda: record("fast"))
+        )
+        await asyncio.gather(*slow, fast)
+
+        self.assertLessEqual(order.index("fast"), 2)
+
+    async def test_min_host_interval(self) -> None:
+        """Requests to the same host are spaced by the politeness delay."""
+        scheduler = CrawlScheduler(
+            max_concurrency=4, per_host_concurrency=4, min_host_interval=0.05
+        )
+        started: list[float] = []
+        loop = asyncio.get_running_loop()
+
+        async def stamp() -> None:
+            started.append(loop.time())
+
+        await asyncio.gather(
+            *[scheduler.run("a", "https://a.com/x", stamp) for _ in range(3)]
+        )
+
+        gaps = [b - a for a, b in zip(started, started[1:], strict=False)]
+        self.assertTrue(all(gap >= 0.04 for gap in gaps))
+        self.assertGreater(scheduler.stats.max_wait_seconds, 0)
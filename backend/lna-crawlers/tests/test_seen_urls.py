@@ -0,0 +1,60 @@
+import unittest
+from datetime import UTC, datetime, timedelta
+
+from lna_crawlers.seen_urls import SeenUrlIndex
+from lna_db.db.mock_db import init_test_db, make_article
+from lna_db.models.news import Article
+
+
+class TestSeenUrlIndex(unittest.IsolatedAsyncioTestCase):
+    """Test the in-memory index of stored article URLs."""
+
+    async def asyncSetUp(self) -> None:
+        await init_test_db(Article)
+
+    async def test_warm_only_loads_recent_articles(self) -> None:
+        """Articles created outside the window are left to the database dedupe."""
+        old = datetime.now(UTC) - timedelta(days=30)
+        for url, created_at in (
+            ("https://a.com/recent", datetime.now(UTC)),
+            ("https://a.com/old", old),
+        ):
+            await make_article(url, created_at=created_at).insert()
+
+        seen = SeenUrlIndex(window=timedelta(days=14))
+        self.assertEqual(await seen.warm(), 1)
+        self.assertIn("https://a.com/recent", seen)
+        self.assertNotIn("https://a.com/old", seen)
+
+        seen.add_many(["https://a.com/new"])
+        self.assertIn("https://a.com/new", seen)
+        self.assertEqual(len(seen), 2)
+
+    async def test_warm_again_loads_new_articles(self) -> None:
+        """A kept index only reads the articles stored since its last warm-up."""
+        seen = SeenUrlIndex()
+        await seen.warm()
+        for url, created_at in (
+            ("https://a.com/missed", datetime.now(UTC) - timedelta(hours=1)),
+            ("https://a.com/new", datetime.now(UTC)),
+        ):
+            await make_article(url, created_at=created_at).insert()
+
+        self.assertEqual(await seen.warm(), 1)
+        self.assertIn("https://a.com/new", seen)
+        self.assertNotIn("https://a.com/missed", seen)
+
+    async def test_kept_index_forgets_urls_out_of_window(self) -> None:
+        """A warm-up drops the URLs of articles created before the window."""
+        seen = SeenUrlIndex(window=timedelta(days=14))
+        await make_article(
+            "https://a.com/old", created_at=datetime.now(UTC) - timedelta(days=10)
+        ).insert()
+        await seen.warm()
+        seen.add("https://a.com/new")
+        self.assertIn("https://a.com/old", seen)
+
+        seen.window = timedelta(days=7)
+        self.assertEqual(await seen.warm(), 1)
+        self.assertNotIn("https://a.com/old", seen)
+        self.assertIn("https://a.com/new", seen)
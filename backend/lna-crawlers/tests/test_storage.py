@@ -0,0 +1,53 @@
+import unittest
+from unittest.mock import patch
+
+from lna_crawlers.storage import insert_new_articles
+from lna_db.db.mock_db import init_test_db, make_article
+from lna_db.models.news import Article
+
+
+class TestInsertNewArticles(unittest.IsolatedAsyncioTestCase):
+    """Test the bulk deduplicate-and-insert path."""
+
+    async def asyncSetUp(self) -> None:
+        await init_test_db(Article)
+
+    async def test_inserts_new_and_skips_existing(self) -> None:
+        """Stored URLs and repeats inside the batch are counted as skipped."""
+        await make_article("https://a.com/1").insert()
+
+        result = await insert_new_articles(
+            [
+                make_article("https://a.com/1"),
+                make_article("https://a.com/2"),
+                make_article("https://a.com/2"),
+                make_article("https://a.com/3"),
+            ]
+        )
+
+        self.assertEqual(result.inserted, 2)
+        self.assertEqual(result.skipped, 2)
+        self.assertEqual(result.failed, 0)
+        self.assertEqual(await Article.count(), 3)
+
+    async def test_empty_batch(self) -> None:
+        """An empty batch does not touch the database."""
+        result = await insert_new_articles([])
+        self.assertEqual(result.inserted + result.skipped + result.failed, 0)
+
+    async def test_concurrent_insert_counts_as_skipped(self) -> None:
+        """A URL inserted by another writer after the lookup is skipped."""
+        await make_article("https://a.com/1").insert()
+        collection = Article.get_motor_collection()
+
+        async def no_existing_urls(*args: object, **kwargs: object) -> list[str]:
+            return []
+
+        with patch.object(type(collection), "distinct", no_existing_urls):
+            result = await insert_new_articles(
+                [make_article("https://a.com/1"), make_article("https://a.com/2")]
+            )
+
+        self.assertEqual(result.inserted, 1)
+        self.assertEqual(result.skipped, 1)
+        self.assertEqual(result.failed, 0)
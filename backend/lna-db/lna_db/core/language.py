@@ -0,0 +1,160 @@
+"""Language detection for article titles and content."""
+
+import re
+from collections import Counter
+from collections.abc import Iterable, Mapping
+
+from lna_db.core.types import Language
+
+# letters of the Arabic blocks, including presentation forms
+_ARABIC = re.compile(
+    "[\u0620-\u064a\u066e-\u06d3\u06fa-\u06ff\u0750-\u077f\ufb50-\ufdff\ufe70-\ufefc]"
+)
+_LATIN = re.compile("[A-Za-z\u00c0-\u00d6\u00d8-\u00f6\u00f8-\u024f]")
+_ACCENTED = re.compile("[\u00c0-\u00d6\u00d8-\u00f6\u00f8-\u024f]")
+
+# Arabic words keep their diacritics, the lexicons spell a few of them out
+_TOKEN = re.compile(r"[\w\u0610-\u061a\u064b-\u065f\u0670]+")
+
+_langdetect_ready = False
+
+# common words of news articles in each language
+LEXICONS: Mapping[Language, frozenset[str]] = {
+    Language.ENGLISH: frozenset(
+        "the a an in on at by for with from to of and but or because if he she "
+        "it they we you i is are was were have has had do does can will be been "
+        "that this which said after as time person year way day thing man world "
+        "very not also more so".split()
+    ),
+    Language.FRENCH: frozenset(
+        "le la les un une des du au aux à de en dans sur avec pour par et mais "
+        "ou car donc il elle nous vous ils elles ce cette qui que est sont être "
+        "avoir faire aller dire pouvoir été selon son sa ses leur temps personne "
+        "année monde vie très pas aussi plus comme".split()
+    ),
+    Language.ARABIC: frozenset(
+        "ال في على من إلى عن مع و أو لكن لأن هو هي نحن أنتم كان يكون قال فعل "
+        "وقت إنسان يوم عام جدًا ليس أيضًا التي الذي هذا هذه ذلك أن إن لا ما "
+        "كما حتى بين بعد قبل عند".split()
+    ),
+}
+
+
+def script_ratio(text: str) -> tuple[float, int]:
+    """Share of Arabic letters among the Arabic and Latin letters of `text`."""
+    arabic = len(_ARABIC.findall(text))
+    latin = len(_LATIN.findall(text))
+    letters = arabic + latin
+    return (arabic / letters if letters else 0.0), letters
+
+
+class LexiconClassifier:
+    """
+    Classify texts by counting the words of each language's lexicon among
+    their tokens. Every token counts, so a stray foreign word does not decide
+    the language of an article, and a text is only classified when one
+    language has at least `min_hits` words and more than any other.
+    """
+
+    def __init__(
+        self, lexicons: Mapping[Language, Iterable[str]], min_hits: int = 2
+    ) -> None:
+        self.lexicons = {
+            language: frozenset(word.casefold() for word in words)
+            for language, words in lexicons.items()
+        }
+        self.min_hits = min_hits
+
+    def scores(self, text: str) -> dict[Language, int]:
+        """Number of tokens of `text` in each lexicon."""
+        counts = Counter(_TOKEN.findall(text.casefold()))
+        # the distinct tokens are matched against each lexicon in one set operation
+        return {
+            language: sum(counts[word] for word in lexicon & counts.keys())
+            for language, lexicon in self.lexicons.items()
+        }
+
+    def classify(self, text: str) -> Language:
+        ranked = sorted(self.scores(text).items(), key=lambda item: -item[1])
+        if not ranked or ranked[0][1] < self.min_hits:
+            return Language.UNKNOWN
+        if len(ranked) > 1 and ranked[1][1] == ranked[0][1]:
+            return Language.UNKNOWN
+        return ranked[0][0]
+
+    def classify_many(self, texts: Iterable[str]) -> list[Language]:
+        """Classify each text, classifying repeated texts once."""
+        classified: dict[str, Language] = {}
+        languages = []
+        for text in texts:
+            if text not in classified:
+                classified[text] = self.classify(text)
+            languages.append(classified[text])
+        return languages
+
+
+lexicon_classifier = LexiconClassifier(LEXICONS)
+
+
+def _langdetect(text: str) -> Language:
+    global _langdetect_ready
+    # imported on first use, most texts never get here
+    from langdetect import DetectorFactory, LangDetectException, detect
+
+    if not _langdetect_ready:
+        # langdetect is random unless seeded, the same text must get the same answer
+        DetectorFactory.seed = 0
+        _langdetect_ready = True
+    try:
+        lang_code = detect(text)
+    except LangDetectException:
+        return Language.UNKNOWN
+    return (
+        Language(lang_code)
+        if lang_code in Language.__members__.values()
+        else Language.UNKNOWN
+    )
+
+
+def detect_language(
+    text: str, min_letters: int = 4, threshold: float = 0.9, max_chars: int = 2000
+) -> Language:
+    """
+    Detect the language of `text` from the script of its letters, then from
+    the words it uses.
+
+    Text whose letters are at least `threshold` Arabic is Arabic. Other text
+    goes to the lexicon classifier, which tells English from French and
+    settles mixed text. Text the lexicons cannot decide is English when at
+    least `threshold` of it is unaccented Latin, and is left to langdetect
+    otherwise; text with fewer than `min_letters` letters is unknown. Only
+    the first `max_chars` characters of a long article body are looked at.
+    """
+    text = text[:max_chars]
+    ratio, letters = script_ratio(text)
+    if letters < min_letters:
+        return Language.UNKNOWN
+    if ratio >= threshold:
+        return Language.ARABIC
+    language = lexicon_classifier.classify(text)
+    if language is not Language.UNKNOWN:
+        return language
+    if ratio <= 1 - threshold and not _ACCENTED.search(text):
+        return Language.ENGLISH
+    return _langdetect(text)
+
+
+def detect_languages(
+    texts: Iterable[str],
+    min_letters: int = 4,
+    threshold: float = 0.9,
+    max_chars: int = 2000,
+) -> list[Language]:
+    """Detect the language of each text, detecting repeated texts once."""
+    detected: dict[str, Language] = {}
+    languages = []
+    for text in texts:
+        if text not in detected:
+            detected[text] = detect_language(text, min_letters, threshold, max_chars)
+        languages.append(detected[text])
+    return languages
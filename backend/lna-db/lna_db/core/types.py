@@ -12,6 +12,7 @@ class Language(str, Enum):
 
     ENGLISH = "en"
     ARABIC = "ar"
+    FRENCH = "fr"
     UNKNOWN = "unknown"
 
 
@@ -0,0 +1,69 @@
+from typing import TYPE_CHECKING, Any
+
+from lna_db.models.news import STORY_WINDOW_INDEX
+
+if TYPE_CHECKING:
+    from motor.motor_asyncio import AsyncIOMotorCollection
+
+# the first version of the window index covered the stories of every aggregator
+_LEGACY_STORY_INDEX = "aggregator_1_aggregation_key_1"
+
+
+def _union(values: list[Any], more: list[Any]) -> list[Any]:
+    return values + [value for value in more if value not in values]
+
+
+async def merge_duplicate_stories(collection: "AsyncIOMotorCollection") -> int:
+    """
+    Prepare the stories collection for the unique window index: merge the time
+    based aggregator's stories that share a window into the oldest one, keeping
+    the articles, sources and distinct summaries of all of them, and drop the
+    index that also covered the stories created through the API.
+    Does nothing once the window index exists. Returns the stories removed.
+    """
+    indexes = await collection.index_information()
+    if STORY_WINDOW_INDEX in indexes:
+        return 0
+    if _LEGACY_STORY_INDEX in indexes:
+        await collection.drop_index(_LEGACY_STORY_INDEX)
+
+    groups = collection.aggregate(
+        [
+            {"$match": {"aggregator": "TimeBasedAggregator"}},
+            {"$sort": {"created_at": 1}},
+            {
+                "$group": {
+                    "_id": "$aggregation_key",
+                    "stories": {"$push": "$$ROOT"},
+                    "count": {"$sum": 1},
+                }
+            },
+            {"$match": {"count": {"$gt": 1}}},
+        ]
+    )
+    removed = 0
+    async for group in groups:
+        kept, *duplicates = group["stories"]
+        article_ids = kept.get("article_ids", [])
+        source_ids = kept.get("source_ids", [])
+        summaries = [kept["summary"]]
+        for story in duplicates:
+            article_ids = _union(article_ids, story.get("article_ids", []))
+            source_ids = _union(source_ids, story.get("source_ids", []))
+            summaries = _union(summaries, [story["summary"]])
+
+        await collection.update_one(
+            {"_id": kept["_id"]},
+            {
+                "$set": {
+                    "article_ids": article_ids,
+                    "source_ids": source_ids,
+                    "summary": "\n\n".join(summaries),
+                }
+            },
+        )
+        await collection.delete_many(
+            {"_id": {"$in": [story["_id"] for story in duplicates]}}
+        )
+        removed += len(duplicates)
+    return removed
@@ -1,11 +1,16 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
 from datetime import UTC, datetime, timedelta
+from typing import Any
+from unittest import mock
 from uuid import UUID
 
-from beanie import init_beanie
+from beanie import Document, init_beanie
+from mongomock.collection import BulkOperationBuilder
 from mongomock_motor import AsyncMongoMockClient, AsyncMongoMockDatabase
 
 from lna_db.core.types import Language
-from lna_db.models.news import AggregatedStory, Article, Source
+from lna_db.models.news import AggregatedStory, Article, FeedState, Source
 
 # Create an in-memory MongoDB client for testing
 client: AsyncMongoMockClient = AsyncMongoMockClient()
@@ -152,11 +157,11 @@ def get_mock_data() -> tuple[list[Source], list[Article], list[AggregatedStory]]
                 new_article_1_id,
                 new_article_3_id,
             ],
-            aggregation_key="",
+            aggregation_key="manual_en",
             aggregator="manual_create",
         ),
         AggregatedStory(
-            aggregation_key="",
+            aggregation_key="manual_ar",
             aggregator="manual_create",
             uuid=UUID("d834d941-4fd2-4819-a3b7-7cc8971ab25e"),
             title="مستقبل التكنولوجيا والذكاء الاصطناعي",
@@ -202,10 +207,11 @@ async def init_mock_db() -> None:
     """Initialize the mock database with sample data."""
     await init_beanie(
         database=db,  # type: ignore
-        document_models=[Source, Article, AggregatedStory],
+        document_models=[Source, FeedState, Article, AggregatedStory],
     )
 
     await Source.delete_all()
+    await FeedState.delete_all()
     await Article.delete_all()
     await AggregatedStory.delete_all()
 
@@ -219,3 +225,36 @@ async def init_mock_db() -> None:
 
     for story in mock_stories:
         await story.save()
+
+
+async def init_test_db(*document_models: type[Document]) -> None:
+    """Initialize Beanie for `document_models` on a new, empty database."""
+    await init_beanie(
+        database=AsyncMongoMockClient().get_database("test_database"),  # type: ignore
+        document_models=list(document_models),
+    )
+
+
+def make_article(url: str, **fields: Any) -> Article:
+    """An article at `url`, with placeholders for the required fields not given."""
+    fields = {"source_id": UUID(int=1), "title": "title", "content": "content"} | fields
+    return Article(url=url, **fields)
+
+
+_add_update = BulkOperationBuilder.add_update
+
+
+def _add_update_without_sort(self: Any, *args: Any, sort: Any = None, **kwargs: Any):
+    return _add_update(self, *args, **kwargs)
+
+
+@contextmanager
+def mongomock_bulk_update() -> Iterator[None]:
+    """
+    Patch mongomock to accept the `sort` that pymongo >= 4.11 passes along with
+    every bulk `UpdateOne`, which it does not know about yet.
+    """
+    with mock.patch.object(
+        BulkOperationBuilder, "add_update", _add_update_without_sort
+    ):
+        yield
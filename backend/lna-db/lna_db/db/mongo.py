@@ -5,7 +5,16 @@ from beanie import init_beanie
 from lna_db.db.db import (
     initialize,  # Import your initialize function  # Import your initialize function
 )
-from lna_db.models.news import AggregatedStory, Article, Source, User, UserPreferences
+from lna_db.db.migrations import merge_duplicate_stories
+from lna_db.models.news import (
+    AggregatedStory,
+    AggregatorState,
+    Article,
+    FeedState,
+    Source,
+    User,
+    UserPreferences,
+)
 
 if TYPE_CHECKING:
     from motor.motor_asyncio import AsyncIOMotorDatabase
@@ -26,7 +35,18 @@ async def init_database(
     )
     db: AsyncIOMotorDatabase = async_client[DATABASE_NAME]
 
-    models = [User, Source, Article, AggregatedStory, UserPreferences]
+    models = [
+        User,
+        Source,
+        FeedState,
+        Article,
+        AggregatedStory,
+        AggregatorState,
+        UserPreferences,
+    ]
+
+    # duplicate windows would keep init_beanie from building the unique index
+    await merge_duplicate_stories(db[AggregatedStory.Settings.name])
 
     await init_beanie(
         database=db,
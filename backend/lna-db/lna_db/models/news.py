@@ -3,10 +3,13 @@ from typing import Annotated, Any, Self
 from uuid import uuid4
 
 from beanie import Document, Indexed
-from pydantic import EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field
+from pymongo import ASCENDING, IndexModel
 
 from lna_db.core.types import Language, UUIDstr
 
+STORY_WINDOW_INDEX = "time_based_story_window"
+
 
 class TimeStampedModel(Document):
     """Base model with created and updated timestamps."""
@@ -60,6 +63,29 @@ class User(TimeStampedModel):
         name = "users"
 
 
+class ExtractorConfig(BaseModel):
+    """XPath selectors that extract an article from a source's pages."""
+
+    content: str | None = Field(
+        default=None,
+        description="XPath of the element holding the article text, "
+        "derived from content_html_key when unset.",
+    )
+    image: str | None = Field(
+        default=None, description="XPath of the article image URL, e.g. an @src."
+    )
+    image_prefix: str = Field(
+        default="", description="Prepended to image URLs that are not absolute."
+    )
+    date: str | None = Field(
+        default=None, description="XPath of the publish date text or attribute."
+    )
+    max_page_bytes: int = Field(
+        default=2_000_000,
+        description="Most bytes of an article page downloaded and parsed.",
+    )
+
+
 class Source(TimeStampedModel):
     """News source model."""
 
@@ -81,6 +107,76 @@ class Source(TimeStampedModel):
         description="Boolean value that determines whether "
         "a webpage has an RSS value or not.",
     )
+    extractor: ExtractorConfig | None = Field(
+        default=None, description="Selectors used to extract the source's articles."
+    )
+
+
+class FeedState(TimeStampedModel):
+    """Per-source feed state used to skip crawls of feeds that did not change."""
+
+    source_id: Annotated[UUIDstr, Indexed(unique=True)] = Field(
+        ..., description="Reference to the Source this feed state belongs to"
+    )
+    etag: str | None = Field(
+        default=None, description="ETag returned by the last successful feed fetch."
+    )
+    last_modified: str | None = Field(
+        default=None,
+        description="Last-Modified header returned by the last successful feed fetch.",
+    )
+    body_hash: str | None = Field(
+        default=None, description="SHA-256 of the last processed feed body."
+    )
+    newest_entry_url: str | None = Field(
+        default=None, description="URL of the newest entry already processed."
+    )
+    newest_entry_date: datetime | None = Field(
+        default=None, description="Publish date of the newest entry already processed."
+    )
+    publish_interval_seconds: float | None = Field(
+        default=None,
+        description="Smoothed time between two entries of the source, learned from "
+        "the publish dates of its entries.",
+    )
+    poll_interval_seconds: float | None = Field(
+        default=None, description="Time between two polls of the feed."
+    )
+    next_poll_at: datetime | None = Field(
+        default=None, description="Earliest time at which the feed should be polled."
+    )
+    consecutive_errors: int = Field(
+        default=0, description="Number of failed polls since the last successful one."
+    )
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    class Settings:
+        name = "feed_states"
+
+
+class CrawlLease(Document):
+    """
+    Expiring claim of a crawler instance on a source, so that overlapping runs
+    and scaled-out instances do not crawl the same source at the same time.
+    """
+
+    key: Annotated[str, Indexed(unique=True)] = Field(
+        ..., description="What the lease is held on, the name of a source."
+    )
+    owner: str = Field(..., description="Crawler instance holding the lease.")
+    acquired_at: datetime = Field(
+        default_factory=lambda: datetime.now(UTC),
+        description="When the current owner claimed the lease.",
+    )
+    expires_at: datetime = Field(
+        ...,
+        description="When the lease may be taken over, pushed back by heartbeats.",
+    )
+
+    class Settings:
+        name = "crawl_leases"
 
 
 class Article(TimeStampedModel):
@@ -105,15 +201,29 @@ class Article(TimeStampedModel):
         default="unknown_please_fill",
         description="The crawler which generated this article",
     )
-    image_url : str = Field(
+    image_url: str = Field(
         default="",
         description="Link associated with the article, extratced and set alongside the other fields of the article.",
     )
+    minhash: bytes | None = Field(
+        default=None, description="MinHash signature of the content."
+    )
+    minhash_bands: Annotated[list[int], Indexed()] = Field(
+        default_factory=list,
+        description="Hashes of the signature bands, for near-duplicate lookup.",
+    )
+    duplicate_of: UUIDstr | None = Field(
+        default=None,
+        description="Canonical article this one is a near-duplicate of.",
+    )
+
     class Config:
         arbitrary_types_allowed = True
 
     class Settings:
         name = "articles"
+        # crawlers load the urls of the articles stored since their last run
+        indexes = [IndexModel([("created_at", ASCENDING)])]
 
 
 class AggregatedStory(TimeStampedModel):
@@ -142,3 +252,29 @@ class AggregatedStory(TimeStampedModel):
 
     class Settings:
         name = "stories"
+        # one story per window for the time based aggregator, which upserts its
+        # stories on this key; stories created through the API share keys
+        indexes = [
+            IndexModel(
+                [("aggregator", ASCENDING), ("aggregation_key", ASCENDING)],
+                name=STORY_WINDOW_INDEX,
+                unique=True,
+                partialFilterExpression={"aggregator": "TimeBasedAggregator"},
+            )
+        ]
+
+
+class AggregatorState(TimeStampedModel):
+    """Per-aggregator progress, so that runs only aggregate the new articles."""
+
+    aggregator: Annotated[str, Indexed(unique=True)] = Field(
+        ..., description="The aggregator this state belongs to"
+    )
+    watermark: datetime | None = Field(
+        default=None,
+        description="created_at of the newest article already aggregated, the "
+        "next run reads the articles stored after it.",
+    )
+
+    class Settings:
+        name = "aggregator_states"
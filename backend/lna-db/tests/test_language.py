@@ -0,0 +1,96 @@
+import unittest
+from unittest.mock import patch
+
+from lna_db.core import language
+from lna_db.core.language import (
+    LexiconClassifier,
+    detect_language,
+    detect_languages,
+    lexicon_classifier,
+)
+from lna_db.core.types import Language
+
+
+class TestDetectLanguage(unittest.TestCase):
+    """Test the script based language detection."""
+
+    def test_script_fast_path(self) -> None:
+        """Arabic and plain Latin text never reach langdetect."""
+        with patch.object(language, "_langdetect") as fallback:
+            self.assertEqual(detect_language("انفجار في مرفأ بيروت"), Language.ARABIC)
+            self.assertEqual(
+                detect_language("Lebanon elects a new president"), Language.ENGLISH
+            )
+            self.assertEqual(detect_language("عاجل: شبكة 5G في لبنان"), Language.ARABIC)
+        fallback.assert_not_called()
+
+    def test_short_text_is_unknown(self) -> None:
+        self.assertEqual(detect_language(""), Language.UNKNOWN)
+        self.assertEqual(detect_language("123 - !"), Language.UNKNOWN)
+        self.assertEqual(detect_language("ok"), Language.UNKNOWN)
+
+    def test_lexicon_path(self) -> None:
+        """Latin text the lexicons can decide never reaches langdetect."""
+        with patch.object(language, "_langdetect") as fallback:
+            self.assertEqual(
+                detect_language(
+                    "Le président libanais a reçu une délégation à Beyrouth"
+                ),
+                Language.FRENCH,
+            )
+            # unaccented French is not taken for English
+            self.assertEqual(
+                detect_language("Le gouvernement et la banque centrale de la Syrie"),
+                Language.FRENCH,
+            )
+        fallback.assert_not_called()
+
+    def test_ambiguous_text_falls_back(self) -> None:
+        """Accented text without lexicon words goes to langdetect, deterministic."""
+        text = "Déclaration présidentielle: élection législative anticipée"
+        results = {detect_language(text) for _ in range(5)}
+        self.assertEqual(len(results), 1)
+
+    def test_batch(self) -> None:
+        texts = ["الخبر الأول", "Breaking news", "الخبر الأول", "x"]
+        with patch.object(
+            language, "detect_language", wraps=language.detect_language
+        ) as detect:
+            languages = detect_languages(texts)
+        self.assertEqual(
+            languages,
+            [Language.ARABIC, Language.ENGLISH, Language.ARABIC, Language.UNKNOWN],
+        )
+        self.assertEqual(detect.call_count, 3)
+
+
+class TestLexiconClassifier(unittest.TestCase):
+    """Test the lexicon word counts."""
+
+    def test_counts_every_token(self) -> None:
+        """A stray English word does not decide a mostly Arabic text."""
+        text = "قال الوزير the إن الحكومة في بيروت"
+        scores = lexicon_classifier.scores(text)
+        self.assertEqual(scores[Language.ENGLISH], 1)
+        self.assertEqual(scores[Language.ARABIC], 3)
+        self.assertEqual(lexicon_classifier.classify(text), Language.ARABIC)
+
+    def test_undecided(self) -> None:
+        classifier = LexiconClassifier(
+            {Language.ENGLISH: ["the"], Language.FRENCH: ["le"]}, min_hits=2
+        )
+        self.assertEqual(classifier.classify("the cat"), Language.UNKNOWN)
+        self.assertEqual(classifier.classify("the le the le"), Language.UNKNOWN)
+        self.assertEqual(classifier.classify("The THE le"), Language.ENGLISH)
+
+    def test_classify_many(self) -> None:
+        texts = [
+            "The army and the government of Lebanon",
+            "Les élections et le parlement",
+            "The army and the government of Lebanon",
+            "",
+        ]
+        self.assertEqual(
+            lexicon_classifier.classify_many(texts),
+            [Language.ENGLISH, Language.FRENCH, Language.ENGLISH, Language.UNKNOWN],
+        )
@@ -0,0 +1,78 @@
+import unittest
+from datetime import datetime, timedelta
+from uuid import UUID
+
+from beanie import init_beanie
+from bson import Binary
+from lna_db.db.migrations import merge_duplicate_stories
+from lna_db.models.news import AggregatedStory
+from mongomock_motor import AsyncMongoMockClient
+from pymongo.errors import DuplicateKeyError
+
+START = datetime(2025, 3, 25)
+
+
+def ids(*numbers: int) -> list[Binary]:
+    # the stories as beanie stores them, with standard binary UUIDs
+    return [Binary.from_uuid(UUID(int=n)) for n in numbers]
+
+
+def story(aggregator: str, key: str, summary: str, n: int) -> dict:
+    return {
+        "uuid": ids(n)[0],
+        "title": "title",
+        "summary": summary,
+        "language": "en",
+        "publish_date": START,
+        "article_ids": ids(100 + n, 100),
+        "aggregator": aggregator,
+        "aggregation_key": key,
+        "source_ids": ids(200),
+        "created_at": START + timedelta(minutes=n),
+        "updated_at": START + timedelta(minutes=n),
+    }
+
+
+class TestMergeDuplicateStories(unittest.IsolatedAsyncioTestCase):
+    """Test the merge that lets the unique window index be built."""
+
+    async def asyncSetUp(self) -> None:
+        self.db = AsyncMongoMockClient().get_database("test_database")
+        self.stories = self.db["stories"]
+        # the index as the first version of the stories collection built it
+        await self.stories.create_index(
+            [("aggregator", 1), ("aggregation_key", 1)], unique=False
+        )
+
+    async def test_duplicate_windows_are_merged(self) -> None:
+        """The oldest story of a window keeps the articles and summaries of all."""
+        await self.stories.insert_many(
+            [
+                story("TimeBasedAggregator", "w1", "second", 2),
+                story("TimeBasedAggregator", "w1", "first", 1),
+                story("TimeBasedAggregator", "w1", "first", 3),
+                story("TimeBasedAggregator", "w2", "other", 4),
+                story("manual_create", "w1", "api", 5),
+                story("manual_create", "", "api", 6),
+            ]
+        )
+
+        self.assertEqual(await merge_duplicate_stories(self.stories), 2)  # type: ignore
+
+        merged = await self.stories.find_one(
+            {"aggregator": "TimeBasedAggregator", "aggregation_key": "w1"}
+        )
+        self.assertEqual(merged["uuid"], ids(1)[0])
+        self.assertEqual(merged["summary"], "first\n\nsecond")
+        self.assertEqual(merged["article_ids"], ids(101, 100, 102, 103))
+        self.assertEqual(merged["source_ids"], ids(200))
+        self.assertEqual(await self.stories.count_documents({}), 4)
+        self.assertNotIn(
+            "aggregator_1_aggregation_key_1", await self.stories.index_information()
+        )
+
+        # the window index can be built now, and the merge is not run again
+        await init_beanie(database=self.db, document_models=[AggregatedStory])  # type: ignore
+        with self.assertRaises(DuplicateKeyError):
+            await self.stories.insert_one(story("TimeBasedAggregator", "w2", "dup", 7))
+        self.assertEqual(await merge_duplicate_stories(self.stories), 0)  # type: ignore